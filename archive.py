@@ -0,0 +1,409 @@
+"""
+Columnar archive for cold price history.
+
+Raw prices rows older than a cutoff are moved out of Postgres into one
+set of NumPy column files per product under PRICE_ARCHIVE_DIR (default
+./price_archive):
+
+    <product_id>/<generation>/date.npy          datetime64[s]
+    <product_id>/<generation>/retailer_id.npy   int16
+    <product_id>/<generation>/price_per_oz.npy  float64
+
+sorted by date. price_per_oz is kept at the precision of the prices
+column, so moving a row to the archive doesn't change what the
+dashboard and API return for it. Reads memory-map the files, so a product's history is
+never copied into Python objects. Files are never modified in place:
+appending writes a new generation, and manifest.json, replaced
+atomically, says which generation is current. A crash mid-archive leaves
+the previous state intact.
+
+Archiving works a whole monthly partition at a time: its rows are
+appended to the archive and the partition is detached, then dropped once
+the archive has been read back and checked against it. `run` needs
+PRICE_ARCHIVE_DIR set to an existing persistent or shared directory.
+The daily rollups
+in price_daily are kept, so the dashboard and savings totals don't
+change.
+
+    python archive.py run [--keep-months 12]
+    python archive.py status
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import date, datetime
+
+import numpy as np
+
+ARCHIVE_DIR = os.getenv("PRICE_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          "price_archive"))
+
+COLUMNS = {"date": "datetime64[s]", "retailer_id": "int16", "price_per_oz": "float64"}
+
+def _empty():
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+class PriceArchive:
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifest_mtime = None
+        self._maps = {}  # (product_id, generation) -> columns
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def manifest(self):
+        """The current manifest, reloaded when another process has replaced it."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return {"cutoff": None, "pending": [], "products": {}}
+        with self._lock:
+            if mtime != self._manifest_mtime:
+                with open(self.manifest_path) as f:
+                    self._manifest = json.load(f)
+                self._manifest_mtime = mtime
+            return self._manifest
+
+    @property
+    def cutoff(self):
+        """Everything before this datetime has been archived; None if nothing has."""
+        cutoff = self.manifest()["cutoff"]
+        return datetime.fromisoformat(cutoff) if cutoff else None
+
+    def _load(self, product_id, generation):
+        key = (product_id, generation)
+        with self._lock:
+            columns = self._maps.get(key)
+            if columns is None:
+                path = os.path.join(self.directory, str(product_id), str(generation))
+                columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                           for name in COLUMNS}
+                # generations written before price_per_oz was float64 are
+                # widened once here (a copy); the next append rewrites them
+                columns = {name: col if col.dtype == COLUMNS[name] else col.astype(COLUMNS[name])
+                           for name, col in columns.items()}
+                self._maps = {k: v for k, v in self._maps.items() if k[0] != product_id}
+                self._maps[key] = columns
+            return columns
+
+    def read(self, product_id, since=None, until=None):
+        """
+        The archived columns for one product with since <= date < until, as
+        read-only memory-mapped arrays (slices, not copies).
+        """
+        entry = self.manifest()["products"].get(str(product_id))
+        if entry is None:
+            return _empty()
+        columns = self._load(product_id, entry["generation"])
+        dates = columns["date"]
+        lo = 0 if since is None else np.searchsorted(dates, np.datetime64(since, "s"), side="left")
+        hi = len(dates) if until is None else np.searchsorted(dates, np.datetime64(until, "s"), side="left")
+        return {name: col[lo:hi] for name, col in columns.items()}
+
+    def read_page(self, product_id, since=None, until=None, retailer_ids=None, after=None, limit=1000):
+        """
+        Up to limit archived points of one product with since <= date <
+        until (and of retailer_ids, if given) after the (epoch seconds,
+        retailer_id) key `after`, ordered by date and then retailer_id.
+        The start is found with searchsorted and only windows of about
+        limit rows are read from there, so a page costs O(limit) rather
+        than the rest of the product's history.
+        """
+        columns = self.read(product_id, since, until)
+        dates = columns["date"]
+        lo = 0
+        if after is not None:
+            lo = int(np.searchsorted(dates, np.datetime64(after[0], "s"), side="left"))
+        wanted = np.asarray(sorted(retailer_ids)) if retailer_ids is not None else None
+        windows, found = [], 0
+        while lo < len(dates) and found < limit:
+            # end a window after every row of its last second, so a second's
+            # retailers are never split across windows
+            hi = int(np.searchsorted(dates, dates[min(lo + limit, len(dates)) - 1], side="right"))
+            window = {name: np.asarray(col[lo:hi]) for name, col in columns.items()}
+            keep = np.ones(hi - lo, dtype=bool)
+            if wanted is not None:
+                keep &= np.isin(window["retailer_id"], wanted)
+            if after is not None:
+                d, r = window["date"].astype("int64"), window["retailer_id"]
+                keep &= (d > after[0]) | ((d == after[0]) & (r > after[1]))
+            windows.append({name: col[keep] for name, col in window.items()})
+            found += int(keep.sum())
+            lo = hi
+        if not windows:
+            return _empty()
+        return _page_order({name: np.concatenate([w[name] for w in windows]) for name in COLUMNS}, limit)
+
+    def _write_manifest(self, manifest):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def append(self, batches, partition=None, cutoff=None):
+        """
+        Add {product_id: columns} to the archive as new generations and
+        commit them in one manifest update, advancing the cutoff and
+        marking the partition they came from as pending removal.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = json.loads(json.dumps(self.manifest()))  # copy
+        retired = []
+        for product_id, new in batches.items():
+            entry = manifest["products"].get(str(product_id))
+            old = self.read(product_id) if entry else _empty()
+            generation = entry["generation"] + 1 if entry else 1
+            merged = {name: np.concatenate([old[name], np.asarray(new[name], dtype=dtype)])
+                      for name, dtype in COLUMNS.items()}
+            order = np.argsort(merged["date"], kind="stable")
+            path = os.path.join(self.directory, str(product_id), str(generation))
+            os.makedirs(path, exist_ok=True)
+            for name in COLUMNS:
+                with open(os.path.join(path, f"{name}.npy"), "wb") as f:
+                    np.save(f, merged[name][order])
+                    f.flush()
+                    os.fsync(f.fileno())
+            manifest["products"][str(product_id)] = {
+                "generation": generation,
+                "rows": int(len(order)),
+                "first": str(merged["date"][order[0]]) if len(order) else None,
+                "last": str(merged["date"][order[-1]]) if len(order) else None,
+            }
+            if entry:
+                retired.append(os.path.join(self.directory, str(product_id), str(entry["generation"])))
+        if partition and partition not in manifest["pending"]:
+            manifest["pending"].append(partition)
+        if cutoff and (manifest["cutoff"] is None or cutoff.isoformat() > manifest["cutoff"]):
+            manifest["cutoff"] = cutoff.isoformat()
+        self._write_manifest(manifest)
+        # open maps of a retired generation stay valid until they are dropped
+        for path in retired:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def clear_pending(self, partition):
+        """The partition has been dropped from Postgres."""
+        manifest = json.loads(json.dumps(self.manifest()))
+        if partition in manifest["pending"]:
+            manifest["pending"].remove(partition)
+            self._write_manifest(manifest)
+
+    def status(self):
+        manifest = self.manifest()
+        return {
+            "cutoff": manifest["cutoff"],
+            "pending": manifest["pending"],
+            "products": len(manifest["products"]),
+            "rows": sum(p["rows"] for p in manifest["products"].values()),
+        }
+
+_archive = None
+_archive_lock = threading.Lock()
+
+def get_archive():
+    """The process-wide PriceArchive over ARCHIVE_DIR."""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = PriceArchive()
+        return _archive
+
+def merge(archived, live):
+    """
+    Concatenate archived and live columns, oldest first. When one side is
+    empty the other is returned as is, so an all-archive read stays a
+    memory map.
+    """
+    if not len(live["date"]):
+        return archived
+    live = {name: np.asarray(live[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+    if not len(archived["date"]):
+        return live
+    merged = {name: np.concatenate([archived[name], live[name]]) for name in COLUMNS}
+    if live["date"][0] < archived["date"][-1]:  # old rows that were still in prices_default
+        order = np.argsort(merged["date"], kind="stable")
+        merged = {name: col[order] for name, col in merged.items()}
+    return merged
+
+def _page_order(columns, limit):
+    """The first limit rows of columns by (date, retailer_id)."""
+    order = np.lexsort((columns["retailer_id"], columns["date"]))[:limit]
+    return {name: col[order] for name, col in columns.items()}
+
+def merge_page(archived, live, limit):
+    """
+    One page from an archive page and a live page (each already the first
+    limit rows of its side after the same key): the first limit rows of
+    both by (date, retailer_id).
+    """
+    live = {name: np.asarray(live[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+    if not len(archived["date"]):
+        return _page_order(live, limit)
+    return _page_order({name: np.concatenate([archived[name], live[name]]) for name in COLUMNS}, limit)
+
+def _month_partitions(cursor):
+    """(name, month start) of every monthly prices partition, oldest first."""
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'prices'::regclass AND c.relname ~ '^prices_[0-9]{4}_[0-9]{2}$'
+        ORDER BY c.relname
+    """)
+    return [(name, date(int(name[7:11]), int(name[12:14]), 1)) for (name,) in cursor.fetchall()]
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+class ArchiveError(Exception):
+    pass
+
+def _partition_columns(conn, name, chunk_size):
+    """{product_id: columns} of every row in a prices partition, attached or not."""
+    batches = {}
+    with conn.cursor(name=f"archive_{name}") as cursor:  # server-side, streamed
+        cursor.itersize = chunk_size
+        cursor.execute(f"SELECT product_id, date, retailer_id, price_per_oz FROM {name}")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for product_id, when, retailer_id, ppo in rows:
+                cols = batches.setdefault(product_id, ([], [], []))
+                cols[0].append(when)
+                cols[1].append(retailer_id)
+                cols[2].append(ppo)
+    conn.commit()
+    return {
+        product_id: {"date": np.array(dates, dtype="datetime64[s]"),
+                     "retailer_id": np.asarray(retailer_ids, dtype=COLUMNS["retailer_id"]),
+                     "price_per_oz": np.asarray(ppos, dtype=COLUMNS["price_per_oz"])}
+        for product_id, (dates, retailer_ids, ppos) in batches.items()
+    }
+
+def _sorted(columns):
+    order = np.lexsort((columns["price_per_oz"], columns["retailer_id"], columns["date"]))
+    return {name: np.asarray(col)[order] for name, col in columns.items()}
+
+def verify_partition(conn, directory, name, month, chunk_size=50000):
+    """
+    Whether the archive at `directory`, read back from disk by a fresh
+    reader, holds exactly the rows of the (detached) partition `name` for
+    its month: the same products, and for each the same dates, retailers
+    and prices.
+    """
+    expected = _partition_columns(conn, name, chunk_size)
+    reader = PriceArchive(directory)
+    since, until = month, _next_month(month)
+    products = {int(p) for p in reader.manifest()["products"]} | set(expected)
+    for product_id in products:
+        got = _sorted(reader.read(product_id, since, until))
+        want = _sorted(expected.get(product_id, _empty()))
+        if any(not np.array_equal(got[col], want[col]) for col in COLUMNS):
+            logging.error(f"Archive copy of {name} differs for product {product_id}: "
+                          f"{len(got['date'])} rows archived, {len(want['date'])} in the partition")
+            return False
+    return True
+
+def _exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s)", (name,))
+    return cursor.fetchone()[0] is not None
+
+def _detach_and_drop(conn, archive, name, month, attached, chunk_size):
+    if attached:
+        with conn.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE prices DETACH PARTITION {name}")
+        conn.commit()
+    if not verify_partition(conn, archive.directory, name, month, chunk_size):
+        raise ArchiveError(f"{name} was detached but its archived copy doesn't match; it was kept. "
+                           f"Reattach it with ALTER TABLE prices ATTACH PARTITION {name} FOR VALUES "
+                           f"FROM ('{month}') TO ('{_next_month(month)}')")
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {name}")
+    conn.commit()
+    archive.clear_pending(name)
+    logging.info(f"Verified the archived copy of {name} and dropped it")
+
+def archive_prices(conn, archive, before, chunk_size=50000):
+    """
+    Archive every monthly prices partition that ends on or before `before`,
+    oldest first. Returns the rows archived.
+
+    The archive directory must already exist: it has to be persistent (or
+    shared with every host that serves reads), and a missing mount would
+    otherwise be papered over by a fresh local directory. Each partition is
+    detached, not dropped, once its rows are written; it is dropped only
+    after verify_partition has read the archive back from that directory.
+    A partition that fails verification is left detached, and pending in
+    the manifest, and ArchiveError is raised; a later run retries the
+    check before archiving anything new.
+    """
+    if not os.path.isdir(archive.directory):
+        raise ArchiveError(f"Archive directory {archive.directory} does not exist; set PRICE_ARCHIVE_DIR "
+                           f"to a persistent or shared location")
+    with conn.cursor() as cursor:
+        pending = [name for name in archive.manifest()["pending"] if _exists(cursor, name)]
+        partitions = _month_partitions(cursor)
+    conn.commit()
+    for name in list(archive.manifest()["pending"]):
+        if name not in pending:
+            archive.clear_pending(name)
+    # left behind by an earlier run: detached (or, before a crash, still
+    # attached) and already in the archive, so only the check remains
+    attached = {name for name, _ in partitions}
+    for name in pending:
+        month = date(int(name[7:11]), int(name[12:14]), 1)
+        _detach_and_drop(conn, archive, name, month, attached=name in attached, chunk_size=chunk_size)
+    archived = 0
+    for name, month in partitions:
+        if name in pending:
+            continue
+        end = _next_month(month)
+        if end > before:
+            break
+        batches = _partition_columns(conn, name, chunk_size)
+        archive.append(batches, partition=name, cutoff=datetime.combine(end, datetime.min.time()))
+        rows = sum(len(cols["date"]) for cols in batches.values())
+        archived += rows
+        logging.info(f"Archived {rows} rows from {name}")
+        _detach_and_drop(conn, archive, name, month, attached=True, chunk_size=chunk_size)
+    return archived
+
+def _months_ago(today, months):
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from database.connect_db import connect_with_retry
+
+    parser = argparse.ArgumentParser(description="Move cold price history into the columnar archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="archive, verify and drop monthly partitions older than the cutoff")
+    run.add_argument("--keep-months", type=int, default=int(os.getenv("PRICE_ARCHIVE_KEEP_MONTHS", "12")),
+                     help="whole months of raw history to keep live (default 12)")
+    sub.add_parser("status", help="show what the archive holds")
+    args = parser.parse_args()
+
+    load_dotenv()
+    directory = os.getenv("PRICE_ARCHIVE_DIR")
+    if args.command == "run" and not directory:
+        parser.error("set PRICE_ARCHIVE_DIR to the persistent or shared archive directory")
+    archive = PriceArchive(directory or ARCHIVE_DIR)
+    if args.command == "status":
+        print(json.dumps(archive.status(), indent=2))
+    else:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        conn = connect_with_retry(os.getenv("DATABASE_URL"))
+        try:
+            before = _months_ago(date.today(), args.keep_months)
+            print(f"Archived {archive_prices(conn, archive, before)} rows from before {before}.")
+        finally:
+            conn.close()
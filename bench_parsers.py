@@ -0,0 +1,99 @@
+"""
+Offline parser benchmark and selector regression check.
+
+Runs every retailer parser over the recorded fixture corpus (see
+`scraper.py --record`), checks each page still parses to the recorded
+price, and reports pages/sec and allocations per page. Needs no network.
+Exits non-zero if any fixture fails to parse or parses to a different price.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+from catalog import load_catalog
+from corpus import load_fixtures
+from parsers import parse_page, ParseError
+
+def check_fixture(entry, html, expected):
+    """Return None if the page parses as recorded, otherwise a failure message."""
+    try:
+        record = parse_page(html, entry)
+    except ParseError as e:
+        return f"parse failed: {e}"
+    if expected is None:
+        return None
+    for field in ("price", "price_per_oz"):
+        if abs(float(record[field]) - float(expected[field])) > 0.005:
+            return f"{field} {record[field]} != recorded {expected[field]}"
+    return None
+
+def measure_allocations(entry, html):
+    """(blocks, bytes) allocated by one parse, and peak bytes in use."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        try:
+            parse_page(html, entry)
+        except ParseError:
+            pass
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(max(s.count_diff, 0) for s in stats)
+    return blocks, peak
+
+def run(fixtures_dir=None, iterations=50, catalog_path=None):
+    fixtures = list(load_fixtures(load_catalog(catalog_path), fixtures_dir))
+    if not fixtures:
+        # an empty corpus checks nothing, so it must not pass
+        print("FAIL no fixtures found; record some with `python scraper.py --record fixtures`.")
+        return 1
+
+    failures = []
+    per_retailer = defaultdict(lambda: {"pages": 0, "seconds": 0.0, "blocks": 0, "peak": 0})
+    for entry, html, expected in fixtures:
+        problem = check_fixture(entry, html, expected)
+        if problem:
+            failures.append(f"{entry['retailer']} / {entry['product']}: {problem}")
+            continue
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            try:
+                parse_page(html, entry)
+            except ParseError:
+                pass
+        elapsed = time.perf_counter() - start
+        blocks, peak = measure_allocations(entry, html)
+
+        stats = per_retailer[entry['retailer']]
+        stats["pages"] += iterations
+        stats["seconds"] += elapsed
+        stats["blocks"] = max(stats["blocks"], blocks)
+        stats["peak"] = max(stats["peak"], peak)
+
+    print(f"{'retailer':<10} {'pages/sec':>10} {'allocs/page':>12} {'peak KB':>9}")
+    total_pages = total_seconds = 0
+    for retailer, stats in sorted(per_retailer.items()):
+        rate = stats["pages"] / stats["seconds"] if stats["seconds"] else 0.0
+        print(f"{retailer:<10} {rate:>10.1f} {stats['blocks']:>12} {stats['peak'] / 1024:>9.0f}")
+        total_pages += stats["pages"]
+        total_seconds += stats["seconds"]
+    if total_seconds:
+        print(f"{'all':<10} {total_pages / total_seconds:>10.1f}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", default=None, help="fixture directory (default: fixtures/)")
+    parser.add_argument("--iterations", type=int, default=50, help="parses per fixture")
+    parser.add_argument("--catalog", default=None, help="catalog file (default: catalog.json)")
+    args = parser.parse_args()
+    sys.exit(run(args.fixtures, args.iterations, args.catalog))
@@ -0,0 +1,84 @@
+"""
+Cold-start benchmark for the web app.
+
+Each run is a fresh interpreter that imports plot, builds the app with
+create_app(warm=False) and serves one request through the test client,
+so the numbers are what a newly forked (or non-preloaded) gunicorn
+worker pays before its first response. Reports the median and worst
+run, and the modules that take longest to import. With --max-ms, exits
+non-zero when the median time to first response exceeds it, so a heavy
+import sneaking back onto the startup path fails the check.
+
+    python bench_startup.py --runs 5 --max-ms 400
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import plot
+t1 = time.perf_counter()
+app = plot.create_app(warm=False)
+t2 = time.perf_counter()
+status = app.test_client().get({path!r}).status_code
+t3 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "create_app": t2 - t1, "first_response": t3 - t2,
+                  "total": t3 - t0, "status": status}}))
+"""
+
+def run_once(path, env):
+    out = subprocess.run([sys.executable, "-c", PROBE.format(path=path)], env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def slowest_imports(env, top=10):
+    """(cumulative ms, module) for the slowest imports under `import plot`."""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import plot"], env=env,
+                         capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in err.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]) / 1000, parts[2].rstrip()))
+    # top-level imports only (the indent shows nesting)
+    shallow = [(ms, name.strip()) for ms, name in rows if len(name) - len(name.lstrip()) <= 3]
+    return sorted(shallow, reverse=True)[:top]
+
+def run(runs=5, path="/health", max_ms=None):
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as scratch:
+        # without a DATABASE_URL, time against a throwaway SQLite file
+        env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(scratch, "bench.db"))
+        results = [run_once(path, env) for _ in range(runs)]
+        imports = slowest_imports(env)
+    print(f"{'phase':<16}{'median':>10}{'worst':>10}")
+    for phase in ("import", "create_app", "first_response", "total"):
+        values = [r[phase] * 1000 for r in results]
+        print(f"{phase:<16}{statistics.median(values):>8.1f}ms{max(values):>8.1f}ms")
+    print("\nslowest imports under `import plot`:")
+    for ms, name in imports:
+        print(f"  {ms:8.1f}ms  {name}")
+
+    median_total = statistics.median(r["total"] * 1000 for r in results)
+    if any(r["status"] >= 500 for r in results):
+        print(f"\nFAIL: {path} answered {results[-1]['status']}")
+        return 1
+    if max_ms is not None and median_total > max_ms:
+        print(f"\nFAIL: median time to first response {median_total:.0f}ms > {max_ms:.0f}ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure web app import and time to first response")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time (default 5)")
+    parser.add_argument("--path", default="/health", help="the first request to serve (default /health)")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="fail if the median time to first response is above this")
+    args = parser.parse_args()
+    sys.exit(run(args.runs, args.path, args.max_ms))
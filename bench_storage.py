@@ -0,0 +1,109 @@
+"""
+Storage backend benchmark.
+
+Runs the same workload against SQLite (a scratch file) and, with
+--postgres URL, against Postgres (in a scratch schema that is dropped
+afterwards): batched price inserts, the dashboard's product list and
+daily history reads (price_daily), the savings ledger and expense
+create/list/update/delete.
+Reports throughput and p50/p95 latency per operation.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from database.storage import PostgresStorage, SQLiteStorage
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def _row(name, seconds, per=1):
+    seconds = sorted(seconds)
+    p50 = statistics.median(seconds) * 1000
+    p95 = seconds[int(0.95 * (len(seconds) - 1))] * 1000
+    rate = per * len(seconds) / sum(seconds) if sum(seconds) else 0.0
+    return f"  {name:<16} {rate:>12.0f}/s {p50:>9.2f} ms {p95:>9.2f} ms"
+
+def workload(storage, runs=50, products=20, retailers=4, reads=200, expenses=200):
+    print(f"  {'operation':<16} {'throughput':>14} {'p50':>12} {'p95':>12}")
+    batch = [{"product": f"Product {p}", "company": f"Retailer {r}", "url": "https://example.com",
+              "price": 40.0 + p, "price_per_oz": 0.25 + r / 100, "pack_size": "12 cans"}
+             for p in range(products) for r in range(retailers)]
+    inserts = [_timed(storage.insert_prices, batch, f"bench-{i}")[0] for i in range(runs)]
+    print(_row("insert_prices", inserts, per=len(batch)) + " (rows)")
+
+    names = [_timed(storage.products) for _ in range(reads)]
+    print(_row("products", [t for t, _ in names]))
+    product_names = names[0][1]
+    history = [_timed(storage.price_history, product_names[i % len(product_names)])[0] for i in range(reads)]
+    print(_row("price_history", history))
+    print(_row("savings_ledger", [_timed(storage.savings_ledger)[0] for _ in range(reads)]))
+
+    expense = {"item_name": "Nulo Turkey", "brand": "Nulo", "url": None, "company": "Chewy",
+               "item_type": "food", "qty": 2, "total_before_tax": 45.0, "cashback_pct": 5.0,
+               "cashback_engine": "card", "total_after_cashback": 42.75,
+               "date_purchased": date.today(), "notes": None}
+    created = [_timed(storage.create_expense, expense) for _ in range(expenses)]
+    print(_row("create_expense", [t for t, _ in created]))
+    print(_row("list_expenses", [_timed(storage.list_expenses)[0] for _ in range(max(1, reads // 10))]))
+    print(_row("update_expense", [_timed(storage.update_expense, i, dict(expense, qty=3))[0]
+                                  for _, i in created]))
+    print(_row("delete_expense", [_timed(storage.delete_expense, i)[0] for _, i in created]))
+
+def bench_sqlite(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteStorage(os.path.join(tmp, "bench.db"))
+        print("sqlite")
+        workload(storage, args.runs, args.products, args.retailers, args.reads, args.expenses)
+        storage.close()
+
+def bench_postgres(args):
+    from database.connect_db import connect_with_retry
+    from database.migrate import migrate
+    from database.pool import ConnectionPool
+
+    schema = f"bench_{os.getpid()}"
+
+    def connect(url):
+        conn = connect_with_retry(url)
+        with conn.cursor() as cur:
+            cur.execute(f"SET search_path TO {schema}")
+        conn.commit()
+        return conn
+
+    admin = connect_with_retry(args.postgres)
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}")
+    admin.commit()
+    pool = ConnectionPool(args.postgres, minconn=1, maxconn=2, connect=connect)
+    try:
+        conn = connect(args.postgres)
+        migrate(conn)
+        conn.close()
+        print("postgres")
+        workload(PostgresStorage(pool), args.runs, args.products, args.retailers, args.reads, args.expenses)
+    finally:
+        pool.closeall()
+        with admin.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.commit()
+        admin.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--postgres", metavar="URL", default=None,
+                        help="also benchmark this Postgres (work happens in a scratch schema)")
+    parser.add_argument("--runs", type=int, default=50, help="scrape runs inserted")
+    parser.add_argument("--products", type=int, default=20, help="products per run")
+    parser.add_argument("--retailers", type=int, default=4, help="retailers per product")
+    parser.add_argument("--reads", type=int, default=200, help="iterations of each read")
+    parser.add_argument("--expenses", type=int, default=200, help="expenses created, updated and deleted")
+    args = parser.parse_args()
+    bench_sqlite(args)
+    if args.postgres:
+        bench_postgres(args)
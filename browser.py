@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import requests
+import undetected_chromedriver as uc
+from undetected_chromedriver.patcher import Patcher
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+
+CACHE_DIR = Path(os.getenv("SCRAPER_CACHE_DIR") or Path.home() / ".cache" / "pricetracker")
+VERSION_CACHE = CACHE_DIR / "chrome_version.json"
+DRIVER_DIR = CACHE_DIR / "drivers"
+PROFILE_DIR = CACHE_DIR / "profiles"
+STARTUP_METRICS = CACHE_DIR / "startup_metrics.jsonl"
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/142.0.0.0 Safari/537.36"
+)
+
+CHROME_CANDIDATES = [
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+    "/Applications/Google Chrome Beta.app/Contents/MacOS/Google Chrome Beta",
+    "/Applications/Google Chrome Canary.app/Contents/MacOS/Google Chrome Canary",
+]
+CHROME_COMMANDS = ["google-chrome", "chrome", "chromium", "chromium-browser"]
+
+# uc patches chromedriver binaries on disk, so two workers starting (or
+# patching) at the same moment can clobber each other.
+_start_lock = threading.Lock()
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def _write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def _chrome_executables():
+    for exe in CHROME_CANDIDATES:
+        if os.path.exists(exe):
+            yield exe
+    for cmd in CHROME_COMMANDS:
+        exe = shutil.which(cmd)
+        if exe:
+            yield exe
+
+def detect_chrome():
+    """
+    Return (executable, build, major) for the installed Chrome, e.g.
+    ("/usr/bin/google-chrome", "142.0.7444.59", 142), or (None, None, None).
+    The version is cached on disk keyed by the executable's size and mtime,
+    so we only shell out to `chrome --version` after Chrome changes.
+    """
+    cache = _read_json(VERSION_CACHE, {})
+    for exe in _chrome_executables():
+        try:
+            st = os.stat(exe)
+        except OSError:
+            continue
+        key = f"{st.st_size}:{int(st.st_mtime)}"
+        hit = cache.get(exe)
+        if hit and hit.get("key") == key:
+            return exe, hit["build"], hit["major"]
+        try:
+            out = subprocess.check_output([exe, "--version"], stderr=subprocess.STDOUT, timeout=15).decode()
+        except Exception:
+            continue
+        m = re.search(r'(\d+(?:\.\d+)+)', out)
+        if not m:
+            continue
+        build = m.group(1)
+        major = int(build.split(".")[0])
+        cache[exe] = {"key": key, "build": build, "major": major}
+        _write_json(VERSION_CACHE, cache)
+        return exe, build, major
+    return None, None, None
+
+def get_chrome_major_version():
+    """Return installed Chrome major version (int) or None if not found."""
+    return detect_chrome()[2]
+
+def patched_driver_path(build, major):
+    """
+    Path to a uc-patched chromedriver for this Chrome build, downloading and
+    patching it only the first time a build is seen. Must hold _start_lock.
+    """
+    path = DRIVER_DIR / f"chromedriver-{build}"
+    if path.exists():
+        return str(path)
+    DRIVER_DIR.mkdir(parents=True, exist_ok=True)
+    patcher = Patcher(version_main=major)
+    patcher.auto()
+    tmp = path.with_suffix(".tmp")
+    shutil.copy2(patcher.executable_path, tmp)
+    os.replace(tmp, path)
+    logging.info(f"Cached patched chromedriver for Chrome {build} at {path}")
+    return str(path)
+
+def record_startup(mode, seconds, build=None):
+    """Log driver startup time and append it to the startup metrics file."""
+    logging.info(f"Browser startup ({mode}) took {seconds:.2f}s")
+    try:
+        STARTUP_METRICS.parent.mkdir(parents=True, exist_ok=True)
+        with open(STARTUP_METRICS, "a") as f:
+            f.write(json.dumps({
+                "ts": datetime.now().isoformat(timespec="seconds"),
+                "mode": mode,
+                "build": build,
+                "seconds": round(seconds, 3),
+            }) + "\n")
+    except OSError as e:
+        logging.warning(f"Could not record startup metric: {e}")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _devtools_alive(port):
+    try:
+        return requests.get(f"http://127.0.0.1:{port}/json/version", timeout=1).ok
+    except requests.RequestException:
+        return False
+
+class BrowserManager:
+    """
+    Owns Chrome startup for one scraper worker slot.
+
+    mode "fresh" (default) starts a new uc.Chrome per run, but reuses the
+    cached Chrome version, the cached patched driver and a persistent
+    profile, so cookies and the HTTP cache survive between runs.
+    mode "persistent" keeps a long-lived Chrome per slot running in the
+    background and attaches to it over its DevTools port on later runs;
+    quitting the driver then ends the session but leaves the browser up.
+    """
+
+    def __init__(self, slot=0, mode=None):
+        self.slot = slot
+        self.mode = mode or os.getenv("SCRAPER_BROWSER", "fresh")
+        self.profile_dir = PROFILE_DIR / f"worker-{slot}"
+        self.state_path = CACHE_DIR / f"browser-{slot}.json"
+
+    def start(self):
+        """Return a ready WebDriver and record how long startup took."""
+        started = time.monotonic()
+        exe, build, major = detect_chrome()
+        with _start_lock:
+            driver_path = None
+            if build:
+                try:
+                    driver_path = patched_driver_path(build, major)
+                except Exception as e:
+                    logging.warning(f"Could not cache chromedriver for Chrome {build}: {e}")
+            if self.mode == "persistent" and exe and driver_path:
+                driver = self._attach(exe, build, driver_path)
+            else:
+                driver = self._fresh(major, driver_path)
+        record_startup(self.mode, time.monotonic() - started, build)
+        return driver
+
+    def _fresh(self, major, driver_path):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+
+        def options():
+            opts = uc.ChromeOptions()
+            opts.add_argument(f"user-agent={USER_AGENT}")
+            # lets page_profile read per-page transfer sizes from the perf log
+            opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+            # opts.add_argument("--headless=new")  # modern headless mode
+            return opts
+
+        try:
+            if major:
+                logging.info(f"Detected Chrome major version: {major}")
+            return uc.Chrome(options=options(), version_main=major,
+                             driver_executable_path=driver_path,
+                             user_data_dir=str(self.profile_dir))
+        except Exception as e:
+            logging.warning(f"Failed creating Chrome with version_main={major}: {e}; retrying without version_main")
+            return uc.Chrome(options=options(), user_data_dir=str(self.profile_dir))
+
+    def _attach(self, exe, build, driver_path):
+        state = _read_json(self.state_path, {})
+        port = state.get("port")
+        if state.get("build") != build or not port or not _devtools_alive(port):
+            port = self._launch(exe, build)
+        options = webdriver.ChromeOptions()
+        options.debugger_address = f"127.0.0.1:{port}"
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        return webdriver.Chrome(service=Service(driver_path), options=options)
+
+    def _launch(self, exe, build):
+        """Start a detached long-lived Chrome for this slot and return its port."""
+        self.stop()
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        port = free_port()
+        proc = subprocess.Popen(
+            [exe,
+             f"--remote-debugging-port={port}",
+             f"--user-data-dir={self.profile_dir}",
+             f"--user-agent={USER_AGENT}",
+             "--no-first-run",
+             "--no-default-browser-check",
+             "--window-size=1920,1080"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,  # outlive this scraper run
+        )
+        deadline = time.monotonic() + 15
+        while not _devtools_alive(port):
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"Chrome did not open DevTools on port {port}")
+            time.sleep(0.2)
+        _write_json(self.state_path, {"pid": proc.pid, "port": port, "build": build})
+        logging.info(f"Launched long-lived Chrome {build} (pid {proc.pid}) on port {port}")
+        return port
+
+    def stop(self):
+        """Shut down this slot's long-lived browser, if one is running."""
+        state = _read_json(self.state_path, {})
+        pid = state.get("pid")
+        if pid:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        try:
+            self.state_path.unlink()
+        except FileNotFoundError:
+            pass
+
+def stop_all():
+    """Shut down every long-lived browser started by BrowserManager."""
+    for state_path in CACHE_DIR.glob("browser-*.json"):
+        slot = state_path.stem.split("-", 1)[1]
+        BrowserManager(slot=slot).stop()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Manage the scraper's long-lived browsers")
+    parser.add_argument("command", choices=["stop", "version"])
+    args = parser.parse_args()
+    if args.command == "stop":
+        stop_all()
+    else:
+        print(detect_chrome())
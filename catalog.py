@@ -0,0 +1,63 @@
+import json
+import os
+from pathlib import Path
+from collections import OrderedDict
+
+DEFAULT_CATALOG_PATH = Path(__file__).parent / "catalog.json"
+
+REQUIRED_FIELDS = ("product", "retailer", "url", "pack_size", "pack_count", "unit_size")
+
+# a product's "savings" metadata: expenses whose item_name matches
+# expense_pattern (a LIKE pattern) are purchases of pack_count x unit_size,
+# optionally only those of one item_type
+SAVINGS_FIELDS = ("expense_pattern", "pack_count", "unit_size")
+
+def load_catalog(path=None):
+    """
+    Load the product x retailer catalog.
+    Returns a list of entry dicts. Each entry is merged with its product's
+    metadata (alert_name, alert_price_per_oz, savings) and gets its retailer's page
+    load profile as "load_profile", so scrapers only need the entry.
+    path defaults to $CATALOG_PATH or catalog.json next to this file.
+    """
+    path = Path(path or os.getenv("CATALOG_PATH") or DEFAULT_CATALOG_PATH)
+    with open(path) as f:
+        data = json.load(f)
+
+    products = data.get("products", {})
+    retailers = data.get("retailers", {})
+    entries = []
+    for i, entry in enumerate(data.get("entries", [])):
+        missing = [k for k in REQUIRED_FIELDS if entry.get(k) in (None, "")]
+        if missing:
+            raise ValueError(f"catalog entry {i} is missing {', '.join(missing)}")
+        if not (entry.get("selector") or entry.get("selectors")):
+            # "selectors" is an ordered fallback chain, tried first to last
+            raise ValueError(f"catalog entry {i} needs a selector or selectors")
+        merged = dict(products.get(entry["product"], {}))
+        merged.update(entry)
+        merged.setdefault("alert_name", entry["product"])
+        merged.setdefault("alert_price_per_oz", None)
+        merged.setdefault("load_profile", retailers.get(entry["retailer"], {}).get("load_profile", {}))
+        entries.append(merged)
+    return entries
+
+def savings_meta(entries):
+    """{product: its "savings" metadata} for every product in entries that has some."""
+    meta = {}
+    for entry in entries:
+        savings = entry.get("savings")
+        if not savings:
+            continue
+        missing = [k for k in SAVINGS_FIELDS if savings.get(k) in (None, "")]
+        if missing:
+            raise ValueError(f"savings metadata of {entry['product']} is missing {', '.join(missing)}")
+        meta[entry["product"]] = savings
+    return meta
+
+def group_by_retailer(entries):
+    """Group entries so every page of one retailer can share a warm driver session."""
+    groups = OrderedDict()
+    for entry in entries:
+        groups.setdefault(entry["retailer"], []).append(entry)
+    return groups
@@ -0,0 +1,384 @@
+import asyncio
+import json
+import logging
+import subprocess
+import time
+import urllib.request
+from contextlib import nullcontext
+
+import websockets
+
+from browser import PROFILE_DIR, USER_AGENT, detect_chrome, free_port
+from page_profile import blocked_urls
+from health import PROBE, SKIP, classify_failure
+from parsers import parse_page, selector_chain
+
+# JS returning the first non-empty innerText among the given class names
+_PRICE_READY_JS = """
+(() => {
+  for (const cls of %s) {
+    const el = document.getElementsByClassName(cls)[0];
+    if (el && el.innerText && el.innerText.trim()) return true;
+  }
+  return false;
+})()
+"""
+
+# JS summing what the page fetched, from its navigation and resource timing
+_TRANSFER_BYTES_JS = """
+performance.getEntriesByType('navigation')
+  .concat(performance.getEntriesByType('resource'))
+  .reduce((n, e) => n + (e.transferSize || 0), 0)
+"""
+
+class CDPError(Exception):
+    """A DevTools command came back with an error."""
+
+class CDPBrowser:
+    """
+    One headless Chrome driven over the DevTools Protocol. Every tab is a
+    flattened target session multiplexed over the browser's single
+    websocket, so many pages load concurrently inside one browser process.
+    """
+
+    def __init__(self, headless=True):
+        self.headless = headless
+        self.process = None
+        self.ws = None
+        self._next_id = 0
+        self._pending = {}
+        self._reader = None
+
+    async def start(self, timeout=15):
+        exe = detect_chrome()[0]
+        if not exe:
+            raise RuntimeError("Chrome not found")
+        port = free_port()
+        profile = PROFILE_DIR / "cdp"
+        profile.mkdir(parents=True, exist_ok=True)
+        args = [exe,
+                f"--remote-debugging-port={port}",
+                f"--user-data-dir={profile}",
+                f"--user-agent={USER_AGENT}",
+                "--no-first-run",
+                "--no-default-browser-check",
+                "--window-size=1920,1080"]
+        if self.headless:
+            args.append("--headless=new")
+        self.process = subprocess.Popen(args, stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + timeout
+        ws_url = None
+        while ws_url is None:
+            try:
+                ws_url = await asyncio.to_thread(self._ws_url, port)
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"Chrome did not open DevTools on port {port}")
+                await asyncio.sleep(0.2)
+        self.ws = await websockets.connect(ws_url, max_size=None)
+        self._reader = asyncio.create_task(self._read_loop())
+
+    @staticmethod
+    def _ws_url(port):
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/version", timeout=1) as resp:
+            return json.load(resp)["webSocketDebuggerUrl"]
+
+    async def _read_loop(self):
+        try:
+            async for raw in self.ws:
+                message = json.loads(raw)
+                future = self._pending.pop(message.get("id"), None)
+                if future is None or future.done():
+                    continue  # an event; tabs poll instead of subscribing
+                if "error" in message:
+                    future.set_exception(CDPError(message["error"].get("message")))
+                else:
+                    future.set_result(message.get("result", {}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(CDPError("browser connection closed"))
+            self._pending.clear()
+
+    async def send(self, method, params=None, session_id=None, timeout=30):
+        """Send one DevTools command (optionally to a tab session) and await its result."""
+        self._next_id += 1
+        message = {"id": self._next_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._next_id] = future
+        await self.ws.send(json.dumps(message))
+        return await asyncio.wait_for(future, timeout)
+
+    async def new_page(self):
+        target = await self.send("Target.createTarget", {"url": "about:blank"})
+        attached = await self.send("Target.attachToTarget",
+                                   {"targetId": target["targetId"], "flatten": True})
+        return CDPPage(self, target["targetId"], attached["sessionId"])
+
+    async def close(self):
+        if self.ws is not None:
+            try:
+                await self.send("Browser.close", timeout=5)
+            except Exception:
+                pass
+            await self.ws.close()
+        if self._reader is not None:
+            self._reader.cancel()
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+class CDPPage:
+    """One tab of a CDPBrowser."""
+
+    def __init__(self, browser, target_id, session_id):
+        self.browser = browser
+        self.target_id = target_id
+        self.session_id = session_id
+
+    async def send(self, method, params=None, timeout=30):
+        return await self.browser.send(method, params, self.session_id, timeout)
+
+    async def evaluate(self, expression):
+        result = await self.send("Runtime.evaluate", {"expression": expression, "returnByValue": True})
+        return result.get("result", {}).get("value")
+
+    async def goto(self, url, load_profile=None):
+        await self.send("Network.enable")
+        await self.send("Network.setBlockedURLs", {"urls": blocked_urls(load_profile)})
+        await self.send("Page.enable")
+        result = await self.send("Page.navigate", {"url": url})
+        if result.get("errorText"):
+            raise CDPError(f"navigation failed: {result['errorText']}")
+
+    async def wait_for_price(self, class_names, timeout=15, poll=0.2):
+        """Poll until one of class_names has readable text; raises TimeoutError."""
+        expression = _PRICE_READY_JS % json.dumps(list(class_names))
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if await self.evaluate(expression):
+                    return
+            except CDPError:
+                pass  # context torn down mid-navigation; try again
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"no price element among {class_names}")
+            await asyncio.sleep(poll)
+
+    async def wait_for_network_idle(self, quiet=0.5, timeout=10, poll=0.1):
+        expression = "[document.readyState, performance.getEntriesByType('resource').length]"
+        start = last_change = time.monotonic()
+        last_count = None
+        while time.monotonic() - start < timeout:
+            try:
+                value = await self.evaluate(expression)
+            except CDPError:
+                value = None  # context torn down mid-navigation; try again
+            if not value:
+                await asyncio.sleep(poll)
+                continue
+            state, count = value
+            now = time.monotonic()
+            if count != last_count:
+                last_count, last_change = count, now
+            elif state == "complete" and now - last_change >= quiet:
+                return
+            await asyncio.sleep(poll)
+
+    async def content(self):
+        return await self.evaluate("document.documentElement.outerHTML")
+
+    async def transfer_bytes(self):
+        """
+        Bytes the page fetched, from its resource timing (which undercounts
+        cross-origin responses), or None if the page can't say.
+        """
+        try:
+            return int(await self.evaluate(_TRANSFER_BYTES_JS))
+        except Exception:
+            return None
+
+    async def close(self):
+        try:
+            await self.browser.send("Target.closeTarget", {"targetId": self.target_id})
+        except Exception:
+            pass
+
+def _stage(metrics, name, entry):
+    if metrics is None:
+        return nullcontext()
+    return metrics.stage(name, entry['retailer'], entry['product'])
+
+async def _scrape_page(page, entry, timeout, metrics, health):
+    """Load and parse the entry's page in a tab; returns (html, record), record None on failure."""
+    html = None
+    try:
+        with _stage(metrics, "driver_get", entry):
+            await page.goto(entry['url'], entry.get('load_profile'))
+        with _stage(metrics, "wait_for_element", entry):
+            if entry.get('size_option'):
+                selector = f"input[name='size'][value='{entry['size_option']}']"
+                deadline = time.monotonic() + timeout
+                while not await page.evaluate(
+                        f"(() => {{ const el = document.querySelector({json.dumps(selector)});"
+                        f" if (el) el.click(); return !!el; }})()"):
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"no size option {entry['size_option']}")
+                    await asyncio.sleep(0.2)
+                await page.wait_for_network_idle()
+            await page.wait_for_price(selector_chain(entry), timeout)
+            if entry.get('fraction_selector'):
+                await page.wait_for_price([entry['fraction_selector']], 2)
+        html = await page.content()
+        with _stage(metrics, "parse", entry):
+            record = parse_page(html, entry)
+    except Exception as e:
+        if html is None:
+            try:
+                html = await page.content()
+            except Exception:
+                pass
+        kind = classify_failure(e, html, entry)
+        if health is not None:
+            health.record_failure(entry, kind, e)
+        logging.error(f"CDP scrape of {entry['product']} from {entry['retailer']} failed ({kind}): {e}")
+        return html, None
+    if health is not None:
+        health.record_success(entry, record.get('selector'))
+    return html, record
+
+async def scrape_tab(browser, entry, semaphore, timeout=15, metrics=None, health=None,
+                     page_stats=None, record_fixture=None):
+    """
+    Scrape one catalog entry in its own tab; returns a price record or None.
+    Failures are classified and recorded in `health` if one is given. Like
+    the Selenium path, the page's timing and size are appended to
+    `page_stats` and the page is passed to record_fixture(entry, html,
+    record), failures included, when those are given.
+    """
+    async with semaphore:
+        page = await browser.new_page()
+        started = time.monotonic()
+        try:
+            html, record = await _scrape_page(page, entry, timeout, metrics, health)
+            time_to_price = time.monotonic() - started
+            fetched = await page.transfer_bytes() if page_stats is not None else None
+        finally:
+            await page.close()
+    if record_fixture is not None and html is not None:
+        record_fixture(entry, html, record)
+    if page_stats is not None:
+        page_stats.append({
+            'retailer': entry['retailer'],
+            'product': entry['product'],
+            'ok': record is not None,
+            'time_to_price_s': round(time_to_price, 3),
+            'bytes': fetched,
+        })
+        size = f"{fetched / 1024:.0f} KB" if fetched is not None else "unknown size"
+        logging.info(f"{entry['retailer']} page: {size}, price after {time_to_price:.2f}s")
+    return record
+
+def _outcome(entry, result, health):
+    """(entry, record) for one gathered entry; an exception becomes a failed record."""
+    if not isinstance(result, BaseException):
+        return result
+    if not isinstance(result, Exception):
+        raise result  # cancelled
+    kind = classify_failure(result, None, entry)
+    if health is not None:
+        health.record_failure(entry, kind, result)
+    logging.error(f"CDP scrape of {entry['product']} from {entry['retailer']} failed ({kind}): {result}")
+    return entry, None
+
+async def scrape_catalog_async(entries, concurrency=5, limiter=None, http_first=None,
+                               timeout=15, metrics=None, health=None, probe_timeout=3,
+                               page_stats=None, record_fixture=None):
+    """
+    Scrape every entry concurrently in tabs of one headless browser, at most
+    `concurrency` tabs at a time. http_first(entry), if given, is tried in a
+    thread before opening a tab. With a HealthStore, a retailer whose circuit
+    is open gets one probe at probe_timeout and its other pages wait for the
+    probe's outcome. An entry that raises (Chrome failing to start, a tab
+    that can't be opened) is recorded as a failure in `health` and comes
+    back without a record; the rest are unaffected. Returns (entry, record)
+    pairs in catalog order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    browser = None
+    startup_error = None
+    browser_lock = asyncio.Lock()
+
+    async def get_browser():
+        nonlocal browser, startup_error
+        async with browser_lock:
+            if startup_error is not None:
+                raise startup_error  # don't relaunch a Chrome that wouldn't start for every tab
+            if browser is None:
+                started = time.monotonic()
+                candidate = CDPBrowser()
+                try:
+                    await candidate.start()
+                except Exception as e:
+                    startup_error = e
+                    await candidate.close()
+                    raise
+                browser = candidate
+                if metrics is not None:
+                    metrics.record("driver_startup", time.monotonic() - started)
+        return browser
+
+    probes = {}  # retailer -> Event set once its circuit probe has finished
+
+    async def one(entry):
+        if limiter is not None:
+            # once per entry, covering the HTTP tier and the tab it may fall
+            # back to; the politeness wait happens before taking a tab slot
+            await asyncio.to_thread(limiter.acquire, entry['url'])
+        if http_first is not None:
+            record = await asyncio.to_thread(http_first, entry)
+            if record is not None:
+                logging.info(f"{entry['retailer']} {entry['product']} served by http tier")
+                return entry, record
+        tab_timeout = timeout
+        probe = None
+        if health is not None:
+            retailer = entry['retailer']
+            gate = health.gate(retailer)
+            if gate == PROBE:
+                probe = probes[retailer] = asyncio.Event()
+                tab_timeout = probe_timeout
+                logging.info(f"Probing {retailer} with {probe_timeout:.0f}s timeout: circuit open")
+            elif gate == SKIP:
+                if retailer in probes:
+                    await probes[retailer].wait()
+                if health.is_open(retailer):
+                    logging.info(f"Skipping {retailer} {entry['product']}: circuit open")
+                    return entry, None
+        try:
+            record = await scrape_tab(await get_browser(), entry, semaphore, tab_timeout, metrics, health,
+                                      page_stats, record_fixture)
+        finally:
+            if probe is not None:
+                probe.set()
+        logging.info(f"{entry['retailer']} {entry['product']} served by cdp tier")
+        return entry, record
+
+    try:
+        results = await asyncio.gather(*(one(entry) for entry in entries), return_exceptions=True)
+        return [_outcome(entry, result, health) for entry, result in zip(entries, results)]
+    finally:
+        if browser is not None:
+            await browser.close()
+
+def scrape_catalog(entries, concurrency=5, **kwargs):
+    """Synchronous entry point for scrape_catalog_async."""
+    return asyncio.run(scrape_catalog_async(entries, concurrency, **kwargs))
@@ -0,0 +1,61 @@
+import json
+import os
+import re
+from pathlib import Path
+
+DEFAULT_FIXTURES_DIR = Path(__file__).parent / "fixtures"
+EXPECTED_FILE = "expected.json"
+
+def fixture_key(entry):
+    """Stable "<retailer>/<product-slug>" name for an entry's fixture."""
+    slug = re.sub(r'[^a-z0-9]+', '-', entry['product'].lower()).strip('-')
+    return f"{entry['retailer'].lower()}/{slug}"
+
+def save_fixture(fixtures_dir, entry, html, record):
+    """
+    Write the rendered page to <fixtures_dir>/<retailer>/<product-slug>.html
+    and store what the parser read from it in expected.json (null when the
+    scrape failed). Returns the html path.
+    """
+    fixtures_dir = Path(fixtures_dir or DEFAULT_FIXTURES_DIR)
+    key = fixture_key(entry)
+    path = fixtures_dir / f"{key}.html"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(html, encoding="utf-8")
+
+    expected_path = fixtures_dir / EXPECTED_FILE
+    try:
+        expected = json.loads(expected_path.read_text())
+    except (OSError, ValueError):
+        expected = {}
+    expected[key] = record
+    tmp = expected_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(expected, indent=2, sort_keys=True))
+    os.replace(tmp, expected_path)
+    return path
+
+def fixture_paths(fixtures_dir, entry):
+    """
+    The entry's recorded page, <product-slug>.html, followed by any kept
+    variants of it, <product-slug>--<variant>.html (e.g. a retailer's old
+    markup that the selector chain must still parse), as (key, path).
+    """
+    key = fixture_key(entry)
+    path = Path(fixtures_dir) / f"{key}.html"
+    paths = [path] if path.exists() else []
+    paths += sorted(path.parent.glob(f"{path.stem}--*.html"))
+    return [(f"{entry['retailer'].lower()}/{p.stem}", p) for p in paths]
+
+def load_fixtures(entries, fixtures_dir=None):
+    """
+    Yield (entry, html, expected_record) for every recorded fixture of the
+    catalog entries. expected_record is None if nothing was recorded for it.
+    """
+    fixtures_dir = Path(fixtures_dir or DEFAULT_FIXTURES_DIR)
+    try:
+        expected = json.loads((fixtures_dir / EXPECTED_FILE).read_text())
+    except (OSError, ValueError):
+        expected = {}
+    for entry in entries:
+        for key, path in fixture_paths(fixtures_dir, entry):
+            yield entry, path.read_text(encoding="utf-8"), expected.get(key)
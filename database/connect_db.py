@@ -12,10 +12,13 @@ def connect_with_retry(url, retries=10, delay=3):
     """
     Retry database connection with exponential backoff.
     Useful when database is cold-starting on Railway.
+    SSL is required unless PGSSLMODE says otherwise (e.g. "disable" for a
+    local Postgres in development and tests).
     """
+    sslmode = os.getenv("PGSSLMODE", "require")
     for i in range(retries):
         try:
-            conn = psycopg2.connect(url, sslmode="require", connect_timeout=10)
+            conn = psycopg2.connect(url, sslmode=sslmode, connect_timeout=10)
             return conn
         except OperationalError as e:
             if i < retries - 1:
@@ -1,21 +1,9 @@
-import sqlite3
+import sys
 
-conn = sqlite3.connect("pricetracker.db")
+from database.storage import SQLiteStorage
 
-cursor = conn.cursor()
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS prices (
-               id INTEGER PRIMARY KEY AUTOINCREMENT,
-               product TEXT NOT NULL,
-               company TEXT NOT NULL, 
-               url TEXT NOT NULL,
-               date DATETIME NOT NULL,
-               price FLOAT NOT NULL,
-               price_per_oz FLOAT NOT NULL,
-               pack_size TEXT NOT NULL
-               )
-''')
-
-conn.commit()
-conn.close()
\ No newline at end of file
+# Create (or bring up to date) a local SQLite database for the SQLite
+# storage backend: python -m database.create_db [path]
+path = sys.argv[1] if len(sys.argv) > 1 else "pricetracker.db"
+SQLiteStorage(path).close()
+print(f"{path} is ready.")
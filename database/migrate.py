@@ -0,0 +1,127 @@
+"""
+Versioned schema migrations.
+
+Migrations are the NNNN_name.sql files in database/migrations, applied in
+version order, each in its own transaction. Applied versions are recorded
+in schema_migrations, so running this again only applies what is new:
+
+    python -m database.migrate            # apply pending migrations, add partitions
+    python -m database.migrate --status   # list applied and pending
+"""
+import hashlib
+import os
+import re
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from database.connect_db import connect_with_retry
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# any constant works; it just keeps two runners from migrating at once
+LOCK_ID = 7143001
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+"""
+
+def load_migrations(directory=None):
+    """[(version, name, sql)] sorted by version."""
+    migrations = []
+    for path in sorted(Path(directory or MIGRATIONS_DIR).glob("*.sql")):
+        m = re.match(r"(\d+)_(.+)\.sql$", path.name)
+        if not m:
+            raise ValueError(f"migration file {path.name} is not named NNNN_name.sql")
+        migrations.append((int(m.group(1)), m.group(2), path.read_text()))
+    versions = [v for v, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("two migration files share a version number")
+    return sorted(migrations)
+
+def _checksum(sql):
+    return hashlib.sha256(sql.encode()).hexdigest()[:16]
+
+def applied_versions(conn):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE_SQL)
+        cur.execute("SELECT version, checksum FROM schema_migrations")
+        applied = dict(cur.fetchall())
+    conn.commit()
+    return applied
+
+def migrate(conn, directory=None, target=None):
+    """Apply pending migrations up to target (default: all). Returns the versions applied."""
+    migrations = load_migrations(directory)
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_ID,))
+    conn.commit()
+    try:
+        applied = applied_versions(conn)
+        done = []
+        for version, name, sql in migrations:
+            if target is not None and version > target:
+                break
+            if version in applied:
+                if applied[version] != _checksum(sql):
+                    print(f"warning: migration {version:04d}_{name} changed after it was applied")
+                continue
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (version, name, _checksum(sql)),
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                print(f"Migration {version:04d}_{name} failed; nothing from it was applied.")
+                raise
+            print(f"Applied {version:04d}_{name}")
+            done.append(version)
+        return done
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_ID,))
+        conn.commit()
+
+def maintain(conn, months_ahead=3):
+    """Create monthly prices partitions through months_ahead; safe to run daily."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regproc('ensure_price_partitions') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return 0
+        cur.execute("SELECT ensure_price_partitions(%s)", (months_ahead,))
+        created = cur.fetchone()[0]
+    conn.commit()
+    return created
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--target", type=int, default=None, help="stop after this version")
+    args = parser.parse_args()
+
+    load_dotenv()
+    conn = connect_with_retry(os.getenv("DATABASE_URL"))
+    try:
+        if args.status:
+            applied = applied_versions(conn)
+            for version, name, _ in load_migrations():
+                print(f"{version:04d}_{name:<30} {'applied' if version in applied else 'pending'}")
+        else:
+            done = migrate(conn, target=args.target)
+            if not done:
+                print("Schema is up to date.")
+            created = maintain(conn)
+            if created:
+                print(f"Created {created} prices partitions.")
+    finally:
+        conn.close()
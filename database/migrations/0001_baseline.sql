@@ -0,0 +1,33 @@
+-- Tables the app already expects. IF NOT EXISTS so databases created before
+-- migrations existed (by hand, create_expense.py or transfer_db.py) adopt
+-- this baseline without changes.
+
+CREATE TABLE IF NOT EXISTS prices (
+    id SERIAL PRIMARY KEY,
+    product TEXT NOT NULL,
+    company TEXT NOT NULL,
+    url TEXT NOT NULL,
+    date TIMESTAMP NOT NULL,
+    price DOUBLE PRECISION NOT NULL,
+    price_per_oz DOUBLE PRECISION NOT NULL,
+    pack_size TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id SERIAL PRIMARY KEY,
+    item_name TEXT NOT NULL,
+    brand TEXT NOT NULL,
+    url TEXT,
+    company TEXT NOT NULL,
+    item_type TEXT CHECK (item_type IN ('food','litter','toys','snacks')),
+    total_before_tax NUMERIC(10,2),
+    cashback_pct NUMERIC(5,2) DEFAULT 0,
+    cashback_engine TEXT,
+    total_after_cashback NUMERIC(10,2),
+    date_purchased DATE,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- plot.py reads and writes qty, which create_expense.py never created
+ALTER TABLE expenses ADD COLUMN IF NOT EXISTS qty INTEGER DEFAULT 1;
@@ -0,0 +1,7 @@
+-- dashboard: WHERE product = %s ORDER BY date, grouped by company
+CREATE INDEX IF NOT EXISTS prices_product_company_date_idx
+    ON prices (product, company, date);
+
+-- savings and expense filters: by item type and company, newest purchases first
+CREATE INDEX IF NOT EXISTS expenses_type_company_date_idx
+    ON expenses (item_type, company, date_purchased);
@@ -0,0 +1,78 @@
+-- Turn prices into a table range-partitioned by month on date, so queries
+-- for recent history only touch recent partitions however much history
+-- accumulates. Rows outside every monthly partition land in prices_default.
+
+CREATE OR REPLACE FUNCTION ensure_price_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    first_month DATE;
+    last_month DATE;
+    month DATE;
+    part TEXT;
+    created INTEGER := 0;
+BEGIN
+    SELECT date_trunc('month', coalesce(min(date), now()))::date INTO first_month FROM prices;
+    last_month := (date_trunc('month', now()) + make_interval(months => months_ahead))::date;
+    month := first_month;
+    WHILE month <= last_month LOOP
+        part := 'prices_' || to_char(month, 'YYYY_MM');
+        IF to_regclass(part) IS NULL THEN
+            -- move any rows already caught by the default partition, then attach
+            EXECUTE format('CREATE TABLE %I (LIKE prices INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+            EXECUTE format('INSERT INTO %I SELECT * FROM prices_default WHERE date >= %L AND date < %L',
+                           part, month, (month + interval '1 month')::date);
+            EXECUTE format('DELETE FROM prices_default WHERE date >= %L AND date < %L',
+                           month, (month + interval '1 month')::date);
+            EXECUTE format('ALTER TABLE prices ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           part, month, (month + interval '1 month')::date);
+            created := created + 1;
+        END IF;
+        month := (month + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- the new table takes over the old id sequence, whatever it was called
+DO $$
+DECLARE
+    seq TEXT := pg_get_serial_sequence('prices', 'id');
+BEGIN
+    IF seq IS NULL THEN
+        CREATE SEQUENCE IF NOT EXISTS prices_id_seq;
+        PERFORM setval('prices_id_seq', coalesce((SELECT max(id) FROM prices), 0) + 1, false);
+    ELSIF seq::regclass IS DISTINCT FROM to_regclass('prices_id_seq') THEN
+        EXECUTE format('ALTER SEQUENCE %s RENAME TO prices_id_seq', seq);
+    END IF;
+END $$;
+
+ALTER TABLE prices RENAME TO prices_unpartitioned;
+ALTER INDEX IF EXISTS prices_product_company_date_idx RENAME TO prices_unpartitioned_pcd_idx;
+ALTER SEQUENCE prices_id_seq OWNED BY NONE;
+
+-- the partition key has to be part of the primary key
+CREATE TABLE prices (
+    id INTEGER NOT NULL DEFAULT nextval('prices_id_seq'),
+    product TEXT NOT NULL,
+    company TEXT NOT NULL,
+    url TEXT NOT NULL,
+    date TIMESTAMP NOT NULL,
+    price DOUBLE PRECISION NOT NULL,
+    price_per_oz DOUBLE PRECISION NOT NULL,
+    pack_size TEXT NOT NULL,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+
+ALTER SEQUENCE prices_id_seq OWNED BY prices.id;
+
+CREATE TABLE prices_default PARTITION OF prices DEFAULT;
+
+INSERT INTO prices_default (id, product, company, url, date, price, price_per_oz, pack_size)
+SELECT id, product, company, url, date, price, price_per_oz, pack_size FROM prices_unpartitioned;
+
+DROP TABLE prices_unpartitioned;
+
+-- split history out of the default partition into monthly ones
+SELECT ensure_price_partitions(3);
+
+CREATE INDEX prices_product_company_date_idx ON prices (product, company, date);
@@ -0,0 +1,30 @@
+-- One row per product, retailer and day, kept current by the scraper in the
+-- same transaction as the raw inserts (rollups.py), so the dashboard and
+-- savings page read a few rows per day instead of scanning prices.
+
+CREATE TABLE IF NOT EXISTS price_daily (
+    product TEXT NOT NULL,
+    company TEXT NOT NULL,
+    day DATE NOT NULL,
+    min_price_per_oz DOUBLE PRECISION NOT NULL,
+    max_price_per_oz DOUBLE PRECISION NOT NULL,
+    sum_price_per_oz DOUBLE PRECISION NOT NULL,
+    sample_count INTEGER NOT NULL,
+    avg_price_per_oz DOUBLE PRECISION GENERATED ALWAYS AS (sum_price_per_oz / sample_count) STORED,
+    last_price DOUBLE PRECISION NOT NULL,
+    last_price_per_oz DOUBLE PRECISION NOT NULL,
+    last_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (product, company, day)
+);
+
+-- initial backfill from existing history
+INSERT INTO price_daily (product, company, day, min_price_per_oz, max_price_per_oz, sum_price_per_oz,
+                         sample_count, last_price, last_price_per_oz, last_at)
+SELECT product, company, date::date,
+       min(price_per_oz), max(price_per_oz), sum(price_per_oz), count(*),
+       (array_agg(price ORDER BY date DESC))[1],
+       (array_agg(price_per_oz ORDER BY date DESC))[1],
+       max(date)
+FROM prices
+GROUP BY product, company, date::date
+ON CONFLICT (product, company, day) DO NOTHING;
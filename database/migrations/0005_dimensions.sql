@@ -0,0 +1,105 @@
+-- Move the repeated product, retailer and URL text out of prices into
+-- dimension tables with small integer keys. prices keeps only the keys,
+-- the timestamp and the two prices; price_daily is rekeyed the same way.
+
+CREATE TABLE products (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE retailers (
+    id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- a product as sold by one retailer: the page scraped and the pack it prices
+CREATE TABLE listings (
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    retailer_id SMALLINT NOT NULL REFERENCES retailers(id),
+    url TEXT NOT NULL,
+    pack_size TEXT NOT NULL,
+    PRIMARY KEY (product_id, retailer_id)
+);
+
+INSERT INTO products (name) SELECT DISTINCT product FROM prices ORDER BY 1;
+INSERT INTO retailers (name) SELECT DISTINCT company FROM prices ORDER BY 1;
+
+-- the most recent URL and pack size seen for each pair
+INSERT INTO listings (product_id, retailer_id, url, pack_size)
+SELECT DISTINCT ON (p.product, p.company) pr.id, r.id, p.url, p.pack_size
+FROM prices p
+JOIN products pr ON pr.name = p.product
+JOIN retailers r ON r.name = p.company
+ORDER BY p.product, p.company, p.date DESC;
+
+-- slim fact table; widest columns first so rows carry no alignment padding
+ALTER SEQUENCE prices_id_seq OWNED BY NONE;
+
+CREATE TABLE prices_slim (
+    date TIMESTAMP NOT NULL,
+    price DOUBLE PRECISION NOT NULL,
+    price_per_oz DOUBLE PRECISION NOT NULL,
+    id INTEGER NOT NULL DEFAULT nextval('prices_id_seq'),
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    retailer_id SMALLINT NOT NULL REFERENCES retailers(id),
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+
+CREATE TABLE prices_slim_default PARTITION OF prices_slim DEFAULT;
+
+INSERT INTO prices_slim (date, price, price_per_oz, id, product_id, retailer_id)
+SELECT p.date, p.price, p.price_per_oz, p.id, pr.id, r.id
+FROM prices p
+JOIN products pr ON pr.name = p.product
+JOIN retailers r ON r.name = p.company;
+
+DROP TABLE prices;
+ALTER TABLE prices_slim RENAME TO prices;
+ALTER TABLE prices_slim_default RENAME TO prices_default;
+ALTER TABLE prices RENAME CONSTRAINT prices_slim_pkey TO prices_pkey;
+ALTER SEQUENCE prices_id_seq OWNED BY prices.id;
+
+-- everything landed in the default partition; split it back out by month,
+-- reaching far enough ahead to cover any future-dated row, and refuse to
+-- go on if anything is still left in the default rather than lose it
+DO $$
+DECLARE
+    last_month DATE;
+BEGIN
+    SELECT date_trunc('month', coalesce(max(date), now()))::date INTO last_month FROM prices;
+    PERFORM ensure_price_partitions(greatest(3, (extract(year FROM age(last_month, date_trunc('month', now())))
+                                                 * 12 + extract(month FROM age(last_month, date_trunc('month', now()))))::int));
+    IF EXISTS (SELECT 1 FROM prices_default) THEN
+        RAISE EXCEPTION 'prices_default still holds % rows after partitioning',
+            (SELECT count(*) FROM prices_default);
+    END IF;
+END $$;
+
+CREATE INDEX prices_product_retailer_date_idx ON prices (product_id, retailer_id, date);
+
+CREATE TABLE price_daily_slim (
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    retailer_id SMALLINT NOT NULL REFERENCES retailers(id),
+    day DATE NOT NULL,
+    min_price_per_oz DOUBLE PRECISION NOT NULL,
+    max_price_per_oz DOUBLE PRECISION NOT NULL,
+    sum_price_per_oz DOUBLE PRECISION NOT NULL,
+    sample_count INTEGER NOT NULL,
+    avg_price_per_oz DOUBLE PRECISION GENERATED ALWAYS AS (sum_price_per_oz / sample_count) STORED,
+    last_price DOUBLE PRECISION NOT NULL,
+    last_price_per_oz DOUBLE PRECISION NOT NULL,
+    last_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (product_id, retailer_id, day)
+);
+
+INSERT INTO price_daily_slim (product_id, retailer_id, day, min_price_per_oz, max_price_per_oz,
+                              sum_price_per_oz, sample_count, last_price, last_price_per_oz, last_at)
+SELECT pr.id, r.id, d.day, d.min_price_per_oz, d.max_price_per_oz,
+       d.sum_price_per_oz, d.sample_count, d.last_price, d.last_price_per_oz, d.last_at
+FROM price_daily d
+JOIN products pr ON pr.name = d.product
+JOIN retailers r ON r.name = d.company;
+
+DROP TABLE price_daily;
+ALTER TABLE price_daily_slim RENAME TO price_daily;
+ALTER TABLE price_daily RENAME CONSTRAINT price_daily_slim_pkey TO price_daily_pkey;
@@ -0,0 +1,12 @@
+-- A counter per kind of data, bumped in the same transaction as every
+-- write that changes it. The dashboard's response cache keys on it, so a
+-- cached page is reused until the next scrape lands.
+
+CREATE TABLE data_versions (
+    name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+INSERT INTO data_versions (name, version)
+SELECT 'prices', coalesce(max(id), 0) FROM prices;
@@ -0,0 +1,14 @@
+-- /expenses pages newest first by purchase date (the day it was entered
+-- when there is none), then id, and each page resumes with a row
+-- comparison against the last row shown. An index expression must be
+-- immutable, and a date coalesced with a timestamptz depends on TimeZone,
+-- so the entry day is taken in UTC.
+CREATE INDEX IF NOT EXISTS expenses_sort_key_idx
+    ON expenses ((COALESCE(date_purchased, (created_at AT TIME ZONE 'UTC')::date)) DESC, id DESC);
+
+-- the same order within one item type or one company, for filtered pages
+CREATE INDEX IF NOT EXISTS expenses_type_sort_key_idx
+    ON expenses (item_type, (COALESCE(date_purchased, (created_at AT TIME ZONE 'UTC')::date)) DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS expenses_company_sort_key_idx
+    ON expenses (company, (COALESCE(date_purchased, (created_at AT TIME ZONE 'UTC')::date)) DESC, id DESC);
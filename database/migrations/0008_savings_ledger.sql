@@ -0,0 +1,31 @@
+-- Per-product savings metadata, loaded from the "savings" object of each
+-- product in catalog.json (python savings.py sync, and every scrape run):
+-- which expenses count as purchases of the product, and how much one
+-- purchased pack holds, in the unit its price_per_oz is quoted in.
+CREATE TABLE product_savings (
+    product_id INTEGER PRIMARY KEY REFERENCES products (id),
+    expense_pattern TEXT NOT NULL,   -- ILIKE pattern for expenses.item_name
+    item_type TEXT,                  -- and the expense's item_type, when set
+    pack_count DOUBLE PRECISION NOT NULL,
+    unit_size DOUBLE PRECISION NOT NULL
+);
+
+-- Running totals behind /savings, one row per product. The market side
+-- is folded in with every price insert (alongside price_daily), the
+-- purchase side with every expense create, edit and delete, so the page
+-- reads one row per product instead of aggregating history.
+CREATE TABLE savings_ledger (
+    product_id INTEGER PRIMARY KEY REFERENCES products (id),
+    market_sum DOUBLE PRECISION NOT NULL DEFAULT 0,   -- sum of price_per_oz over every price point
+    market_count BIGINT NOT NULL DEFAULT 0,
+    purchase_count INTEGER NOT NULL DEFAULT 0,
+    packs_bought BIGINT NOT NULL DEFAULT 0,
+    oz_bought DOUBLE PRECISION NOT NULL DEFAULT 0,
+    spent NUMERIC(12,2) NOT NULL DEFAULT 0
+);
+
+-- the purchase side starts once product_savings has been synced
+INSERT INTO savings_ledger (product_id, market_sum, market_count)
+SELECT product_id, sum(sum_price_per_oz), sum(sample_count)
+FROM price_daily
+GROUP BY product_id;
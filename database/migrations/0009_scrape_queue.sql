@@ -0,0 +1,46 @@
+-- The scrape job queue (job_queue.py) and the idempotency keys of every
+-- price write (price_buffer.py). IF NOT EXISTS so databases where
+-- `python job_queue.py init` or a price flush already created them upgrade
+-- in place.
+CREATE TABLE IF NOT EXISTS scrape_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    product TEXT NOT NULL,
+    retailer TEXT NOT NULL,
+    run_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued','running','done','failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    leased_by TEXT,
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    finished_at TIMESTAMP WITH TIME ZONE,
+    UNIQUE (product, retailer, run_date)
+);
+
+CREATE INDEX IF NOT EXISTS scrape_jobs_claimable_idx
+    ON scrape_jobs (available_at, id) WHERE status IN ('queued','running');
+
+CREATE TABLE IF NOT EXISTS scrape_results (
+    id BIGSERIAL PRIMARY KEY,
+    job_id BIGINT NOT NULL REFERENCES scrape_jobs(id) ON DELETE CASCADE,
+    attempt INTEGER NOT NULL,
+    worker TEXT NOT NULL,
+    ok BOOLEAN NOT NULL,
+    price NUMERIC(10,2),
+    price_per_oz NUMERIC(10,2),
+    selector TEXT,
+    error_kind TEXT,
+    error TEXT,
+    seconds REAL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS scrape_results_job_idx ON scrape_results (job_id);
+
+CREATE TABLE IF NOT EXISTS price_ingest_keys (
+    key TEXT PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
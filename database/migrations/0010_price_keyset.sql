@@ -0,0 +1,5 @@
+-- /api/prices range pages are keyed by (product, date to the second,
+-- retailer): with this index a page seeks to its key and reads only the
+-- rows it returns, instead of the rest of the product's history.
+CREATE INDEX IF NOT EXISTS prices_product_second_retailer_idx
+    ON prices (product_id, date_trunc('second', date), retailer_id);
@@ -0,0 +1,216 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+from database.connect_db import connect_with_retry
+
+class PoolTimeout(Exception):
+    """No connection became free within the checkout timeout."""
+
+class ConnectionPool:
+    """
+    A small thread-safe pool of psycopg2 connections for one process, built
+    on connect_with_retry.
+
+    Checkout hands back an idle connection when there is one (a hit), opens
+    a new one while the pool is below maxconn (a miss), and otherwise waits
+    up to checkout_timeout for one to be returned (a wait). A connection
+    that has sat idle for more than check_after seconds is pinged with
+    SELECT 1 before it is handed out, and replaced if the ping fails.
+    """
+
+    def __init__(self, url, minconn=1, maxconn=4, checkout_timeout=10.0, check_after=30.0,
+                 connect=None):
+        self.url = url
+        self.minconn = minconn
+        self.maxconn = max(maxconn, minconn, 1)
+        self.checkout_timeout = checkout_timeout
+        self.check_after = check_after
+        self.pid = os.getpid()
+        self._connect = connect or connect_with_retry
+        self._idle = deque()  # (conn, returned_at), most recently returned last
+        self._open = 0
+        self._cond = threading.Condition()
+        self._latencies = deque(maxlen=1000)
+        self.counters = {"checkouts": 0, "hits": 0, "misses": 0, "waits": 0,
+                         "timeouts": 0, "discarded": 0}
+
+    def warm(self, n=None):
+        """Open connections until n (default minconn) are idle; for startup."""
+        n = min(self.minconn if n is None else n, self.maxconn)
+        while True:
+            with self._cond:
+                if len(self._idle) >= n or self._open >= self.maxconn:
+                    return
+                self._open += 1
+            try:
+                conn = self._connect(self.url)
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def _healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if idle_for < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._open -= 1
+            self.counters["discarded"] += 1
+            self._cond.notify()
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        waited = False
+        while True:
+            with self._cond:
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    hit = True
+                elif self._open < self.maxconn:
+                    self._open += 1
+                    conn, hit = None, False
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters["timeouts"] += 1
+                        raise PoolTimeout(f"no connection free after {self.checkout_timeout:.0f}s")
+                    waited = True
+                    self._cond.wait(remaining)
+                    continue
+            if hit:
+                if not self._healthy(conn, time.monotonic() - returned_at):
+                    self._discard(conn)
+                    continue
+            else:
+                try:
+                    conn = self._connect(self.url)
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+            with self._cond:
+                self.counters["checkouts"] += 1
+                self.counters["hits" if hit else "misses"] += 1
+                if waited:
+                    self.counters["waits"] += 1
+                self._latencies.append(time.monotonic() - start)
+            return conn
+
+    def putconn(self, conn, broken=False):
+        if not broken and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()  # never hand out a connection mid-transaction
+            except psycopg2.Error:
+                broken = True
+        if broken or conn.closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of the block. Uncommitted
+        work is rolled back when the block ends; a connection that failed
+        at the network level is closed instead of returned.
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+        except psycopg2.OperationalError:
+            self.putconn(conn, broken=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def stats(self):
+        with self._cond:
+            latencies = sorted(self._latencies)
+            stats = dict(self.counters, open=self._open, idle=len(self._idle),
+                         maxconn=self.maxconn, pid=self.pid)
+        if latencies:
+            stats["checkout_ms"] = {
+                "p50": round(latencies[len(latencies) // 2] * 1000, 2),
+                "p95": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2),
+            }
+        return stats
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool(url=None):
+    """
+    The process-wide pool. Sizes come from DB_POOL_MIN (default 1) and
+    DB_POOL_SIZE (default 4), per process: each gunicorn worker forks its
+    own pool, so size it to the worker's --threads, not the whole server.
+    A pool inherited across a fork is dropped, never shared with the parent.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool(
+                url or os.getenv("DATABASE_URL"),
+                minconn=int(os.getenv("DB_POOL_MIN", "1")),
+                maxconn=int(os.getenv("DB_POOL_SIZE", "4")),
+                checkout_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+                check_after=float(os.getenv("DB_POOL_CHECK_AFTER", "30")),
+            )
+        return _pool
+
+def warm_pool_in_background(url=None):
+    """Open the pool's first connections off the request path."""
+    pool = get_pool(url)
+
+    def warm():
+        try:
+            pool.warm()
+        except Exception as e:
+            logging.warning(f"Connection pool warm-up failed: {e}")
+
+    threading.Thread(target=warm, name="db-pool-warmup", daemon=True).start()
+    return pool
@@ -0,0 +1,981 @@
+"""
+Storage backends for the app and the scraper.
+
+Storage is the interface plot.py and run_scraper use for price inserts,
+price history, expense CRUD and the savings ledger. PostgresStorage
+is the production backend (the DATABASE_URL Postgres, through the
+connection pool); SQLiteStorage keeps everything in one local file for
+single-box deployments and for running without a network database.
+get_storage() picks the backend from DATABASE_URL: a sqlite:///path URL
+selects SQLite, anything else Postgres.
+"""
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, datetime, time, timedelta, timezone
+
+EXPENSE_FIELDS = ("item_name", "brand", "url", "company", "item_type", "qty",
+                  "total_before_tax", "cashback_pct", "cashback_engine",
+                  "total_after_cashback", "date_purchased", "notes")
+
+EXPENSE_COLUMNS = ("id", "item_name", "brand", "qty", "url", "company", "item_type",
+                   "total_before_tax", "cashback_pct", "cashback_engine",
+                   "total_after_cashback", "date_purchased", "notes", "created_at")
+
+# /expenses shows this many purchases per page
+EXPENSE_PAGE_SIZE = 50
+
+# the /expenses company filter offers what was actually entered, which
+# includes stores that aren't scraped retailers
+EXPENSE_COMPANIES_SQL = "SELECT DISTINCT company FROM expenses WHERE company <> '' ORDER BY company"
+
+# the order /expenses pages in: purchase date, or the day the expense was
+# entered when it has none (in UTC, so Postgres can index it), then id
+PG_EXPENSE_SORT_KEY = "COALESCE(date_purchased, (created_at AT TIME ZONE 'UTC')::date)"
+SQLITE_EXPENSE_SORT_KEY = "COALESCE(date_purchased, date(created_at))"
+
+class Storage(ABC):
+    """What the app needs from a database. Every backend implements all of it."""
+
+    @abstractmethod
+    def insert_prices(self, records, run_key=None):
+        """Write scraped price records in one batch; returns the newly written ones."""
+
+    @abstractmethod
+    def products(self):
+        """Sorted names of every product with price history."""
+
+    @abstractmethod
+    def price_history(self, product, since=None, until=None):
+        """
+        The price_daily rollup of product for every day overlapping
+        [since, until): day (datetime64[s], at midnight), retailer_id, and
+        the day's min_price_per_oz and max_price_per_oz, as NumPy arrays
+        ordered by day. Covers archived history too, since rollups are
+        never archived; one row per retailer per day however often it
+        was scraped.
+        """
+
+    @abstractmethod
+    def retailers(self):
+        """{retailer_id: name} for every retailer."""
+
+    @abstractmethod
+    def product_id(self, product):
+        """The products dimension id for a product name, or None."""
+
+    @abstractmethod
+    def live_points(self, product_id, since=None, until=None):
+        """Raw points still in the prices table, as date, retailer_id and price_per_oz lists."""
+
+    def price_points(self, product, since=None, until=None):
+        """
+        Every raw price point for product with since <= date < until, as
+        date (datetime64[s]), retailer_id and price_per_oz NumPy arrays,
+        oldest first. History moved to the columnar archive is read from
+        its memory maps and merged with the rows still in prices.
+        """
+        return self.product_points(self.product_id(product), since, until)
+
+    def product_points(self, product_id, since=None, until=None):
+        """price_points() by products dimension id."""
+        from archive import get_archive, merge
+        archived = get_archive().read(product_id, since, until)
+        return merge(archived, self.live_points(product_id, since, until))
+
+    @abstractmethod
+    def live_page(self, product_id, since=None, until=None, retailer_ids=None, after=None, limit=1000):
+        """
+        Up to limit points still in the prices table for product_id with
+        since <= date < until (and of retailer_ids, if given), ordered by
+        date truncated to the second and then retailer_id, after the
+        (epoch seconds, retailer_id) key `after`. Returned as date,
+        retailer_id and price_per_oz lists; the seek and the limit run in
+        SQL on an index, so a page reads O(limit) rows.
+        """
+
+    def product_page(self, product_id, since=None, until=None, retailer_ids=None, after=None, limit=1000):
+        """
+        One keyset page of product_points(): up to limit points ordered by
+        (date, retailer_id) after the `after` key, archive included, with
+        each side read only as far as the page needs.
+        """
+        from archive import get_archive, merge_page
+        archived = get_archive().read_page(product_id, since, until, retailer_ids, after, limit)
+        return merge_page(archived, self.live_page(product_id, since, until, retailer_ids, after, limit), limit)
+
+    @abstractmethod
+    def product_names(self):
+        """{product_id: name} for every product."""
+
+    @abstractmethod
+    def latest_price_id(self):
+        """The highest prices id written so far (0 if none): the cursor for points_after."""
+
+    @abstractmethod
+    def points_after(self, after_id, product_ids, retailer_ids=None, since=None, until=None, limit=1000):
+        """
+        Up to limit live points with id > after_id for the given products
+        (and retailers, if given) with since <= date < until, in id order,
+        as id, product_id, retailer_id, date and price_per_oz lists. New
+        scrapes always land here, never in the archive.
+        """
+
+    @abstractmethod
+    def data_version(self):
+        """
+        (version, updated_at) of the price data: a counter bumped by every
+        write that changes price history, and when that last happened.
+        """
+
+    @abstractmethod
+    def list_expenses(self, item_type=None, company=None, start=None, end=None, after=None,
+                      limit=EXPENSE_PAGE_SIZE):
+        """
+        One page of expenses, newest first by purchase date (the day it was
+        entered when there is none) and then id, optionally only of one
+        item_type or company with start <= date <= end. after is the
+        previous page's next key. Returns {"expenses": rows, "next": the
+        (date, id) key to pass as after, or None on the last page,
+        "totals": count, qty, before_tax and after_cashback summed over
+        the page}.
+        """
+
+    @abstractmethod
+    def expense_companies(self):
+        """Sorted names of every company an expense has been entered for."""
+
+    @abstractmethod
+    def get_expense(self, expense_id):
+        """The expense as a dict, or None."""
+
+    @abstractmethod
+    def create_expense(self, data):
+        """Insert an expense from a dict of EXPENSE_FIELDS; returns its id."""
+
+    @abstractmethod
+    def update_expense(self, expense_id, data):
+        """Replace an expense's EXPENSE_FIELDS from a dict, moving it in the savings ledger."""
+
+    @abstractmethod
+    def delete_expense(self, expense_id):
+        """Delete an expense and take it out of the savings ledger."""
+
+    @abstractmethod
+    def savings_ledger(self):
+        """
+        The savings ledger row of every product, by name: market_sum and
+        market_count over every price point, and purchase_count,
+        packs_bought, oz_bought and spent over its purchases. counted is
+        whether the product has savings metadata, without which no
+        expense counts toward it.
+        """
+
+    @abstractmethod
+    def sync_savings_meta(self, meta):
+        """
+        Store {product name: savings metadata} (see catalog.savings_meta)
+        as the product_savings table, rebuilding the ledger if it changed.
+        Returns whether it did.
+        """
+
+    @abstractmethod
+    def rebuild_savings(self):
+        """Recompute the whole savings ledger from price_daily and expenses."""
+
+def _day_range(since, until):
+    """The days overlapping [since, until), as [first, stop) dates (None for unbounded)."""
+    first = since.date() if since else None
+    stop = None
+    if until:
+        stop = until.date() if until.time() == time.min else until.date() + timedelta(days=1)
+    return first, stop
+
+def _daily_columns(rows):
+    import numpy as np
+    days, retailer_ids, mins, maxs = zip(*rows) if rows else ((), (), (), ())
+    return {"day": np.array(days, dtype="datetime64[D]").astype("datetime64[s]"),
+            "retailer_id": np.array(retailer_ids, dtype="int16"),
+            "min_price_per_oz": np.array(mins, dtype="float64"),
+            "max_price_per_oz": np.array(maxs, dtype="float64")}
+
+def _after_params(after):
+    """A range page's (epoch seconds, retailer_id) key as (naive UTC datetime, retailer_id)."""
+    if after is None:
+        return None, None
+    return datetime(1970, 1, 1) + timedelta(seconds=after[0]), after[1]
+
+def _expense_params(data):
+    return tuple((data.get(k) or 1) if k == "qty" else data.get(k) for k in EXPENSE_FIELDS)
+
+def _expense_filters(sort_key, mark, item_type=None, company=None, start=None, end=None, after=None):
+    """
+    The WHERE clause and params for a page of expenses. Only the filters
+    given appear in the SQL, so each combination is a constant statement
+    the planner can match to an index.
+    """
+    clauses, params = [], []
+    if item_type:
+        clauses.append(f"item_type = {mark}")
+        params.append(item_type)
+    if company:
+        clauses.append(f"company = {mark}")
+        params.append(company)
+    if start:
+        clauses.append(f"{sort_key} >= {mark}")
+        params.append(start)
+    if end:
+        clauses.append(f"{sort_key} <= {mark}")
+        params.append(end)
+    if after:
+        # (sort_key, id) < after, spelled out so SQLite can seek the index on sort_key too
+        clauses.append(f"{sort_key} <= {mark} AND ({sort_key} < {mark} OR id < {mark})")
+        params.extend([after[0], after[0], after[1]])
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def _expense_page_sql(sort_key, where, mark):
+    """(rows, totals) statements for a page: the rows, and the sums over the same rows."""
+    page = f"""
+        SELECT {", ".join(EXPENSE_COLUMNS)}, {sort_key} AS sort_date
+        FROM expenses {where}
+        ORDER BY {sort_key} DESC, id DESC
+        LIMIT {mark}
+    """
+    totals = f"""
+        SELECT COUNT(*), SUM(qty), SUM(total_before_tax), SUM(total_after_cashback)
+        FROM ({page}) page
+    """
+    return page, totals
+
+def _expense_page(rows, totals, limit):
+    # rows holds one extra row when there is a next page
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "expenses": rows,
+        "next": (rows[-1]["sort_date"], rows[-1]["id"]) if more else None,
+        "totals": {
+            "count": int(totals[0] or 0),
+            "qty": int(totals[1] or 0),
+            "before_tax": float(totals[2] or 0),
+            "after_cashback": float(totals[3] or 0),
+        },
+    }
+
+def _ledger_row(row):
+    return dict(row, counted=bool(row["counted"]), market_sum=float(row["market_sum"]),
+                market_count=int(row["market_count"]), purchase_count=int(row["purchase_count"]),
+                packs_bought=int(row["packs_bought"]), oz_bought=float(row["oz_bought"]),
+                spent=float(row["spent"]))
+
+class PostgresStorage(Storage):
+    """The Postgres schema from database/migrations, through a ConnectionPool."""
+
+    def __init__(self, pool=None, url=None):
+        self.url = url
+        self._pool = pool
+
+    @property
+    def pool(self):
+        if self._pool is not None:
+            return self._pool
+        # looked up on every use: get_pool() hands each forked worker its own
+        from database.pool import get_pool
+        return get_pool(self.url)
+
+    def _all(self, sql, params=()):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                cols = [d[0] for d in cur.description]
+                return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    def insert_prices(self, records, run_key=None):
+        from price_buffer import PriceWriteBuffer
+        from database.connect_db import connect_with_retry
+        with self.pool.connection() as conn:
+            buffer = PriceWriteBuffer(conn, run_key=run_key, connect=lambda: connect_with_retry(self.pool.url))
+            try:
+                written = []
+                for record in records:
+                    written += buffer.add(record)
+                return written + buffer.flush()
+            finally:
+                if buffer.conn is not conn:
+                    buffer.conn.close()  # a replacement opened after the pooled one dropped
+
+    def products(self):
+        return [r["name"] for r in self._all("SELECT name FROM products ORDER BY name")]
+
+    def price_history(self, product, since=None, until=None):
+        first, stop = _day_range(since, until)
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT d.day, d.retailer_id, d.min_price_per_oz, d.max_price_per_oz
+                    FROM price_daily d
+                    JOIN products p ON p.id = d.product_id
+                    WHERE p.name = %s
+                      AND d.day >= COALESCE(%s, '-infinity'::date)
+                      AND d.day < COALESCE(%s, 'infinity'::date)
+                    ORDER BY d.day, d.retailer_id
+                """, (product, first, stop))
+                return _daily_columns(cur.fetchall())
+
+    def retailers(self):
+        return {r["id"]: r["name"] for r in self._all("SELECT id, name FROM retailers")}
+
+    def data_version(self):
+        rows = self._all("SELECT version, updated_at FROM data_versions WHERE name = 'prices'")
+        return (rows[0]["version"], rows[0]["updated_at"]) if rows else (0, None)
+
+    def product_id(self, product):
+        rows = self._all("SELECT id FROM products WHERE name = %s", (product,))
+        return rows[0]["id"] if rows else None
+
+    def live_points(self, product_id, since=None, until=None):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT date, retailer_id, price_per_oz FROM prices
+                    WHERE product_id = %s
+                      AND date >= COALESCE(%s, '-infinity'::timestamp)
+                      AND date < COALESCE(%s, 'infinity'::timestamp)
+                    ORDER BY date
+                """, (product_id, since, until))
+                rows = cur.fetchall()
+        dates, retailer_ids, ppos = zip(*rows) if rows else ((), (), ())
+        return {"date": dates, "retailer_id": retailer_ids, "price_per_oz": ppos}
+
+    def live_page(self, product_id, since=None, until=None, retailer_ids=None, after=None, limit=1000):
+        after_at, after_retailer = _after_params(after)
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                # date_trunc('second', date) matches prices_product_second_retailer_idx
+                cur.execute("""
+                    SELECT date, retailer_id, price_per_oz FROM prices
+                    WHERE product_id = %(product_id)s
+                      AND date >= COALESCE(%(since)s, '-infinity'::timestamp)
+                      AND date < COALESCE(%(until)s, 'infinity'::timestamp)
+                      AND (%(retailer_ids)s::integer[] IS NULL OR retailer_id = ANY(%(retailer_ids)s))
+                      AND (%(after_at)s::timestamp IS NULL
+                           OR (date >= %(after_at)s  -- implied, but lets older partitions be pruned
+                               AND date_trunc('second', date) >= %(after_at)s
+                               AND (date_trunc('second', date) > %(after_at)s OR retailer_id > %(after_retailer)s)))
+                    ORDER BY date_trunc('second', date), retailer_id
+                    LIMIT %(limit)s
+                """, {"product_id": product_id, "since": since, "until": until,
+                      "retailer_ids": list(retailer_ids) if retailer_ids is not None else None,
+                      "after_at": after_at, "after_retailer": after_retailer, "limit": limit})
+                rows = cur.fetchall()
+        dates, retailer_ids, ppos = zip(*rows) if rows else ((), (), ())
+        return {"date": dates, "retailer_id": retailer_ids, "price_per_oz": ppos}
+
+    def product_names(self):
+        return {r["id"]: r["name"] for r in self._all("SELECT id, name FROM products")}
+
+    def latest_price_id(self):
+        return self._all("SELECT COALESCE(MAX(id), 0) AS id FROM prices")[0]["id"]
+
+    def points_after(self, after_id, product_ids, retailer_ids=None, since=None, until=None, limit=1000):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id, product_id, retailer_id, date, price_per_oz FROM prices
+                    WHERE id > %(after_id)s
+                      AND product_id = ANY(%(product_ids)s)
+                      AND (%(retailer_ids)s::integer[] IS NULL OR retailer_id = ANY(%(retailer_ids)s))
+                      AND date >= COALESCE(%(since)s, '-infinity'::timestamp)
+                      AND date < COALESCE(%(until)s, 'infinity'::timestamp)
+                    ORDER BY id
+                    LIMIT %(limit)s
+                """, {"after_id": after_id, "product_ids": list(product_ids),
+                      "retailer_ids": list(retailer_ids) if retailer_ids is not None else None,
+                      "since": since, "until": until, "limit": limit})
+                rows = cur.fetchall()
+        return dict(zip(("id", "product_id", "retailer_id", "date", "price_per_oz"),
+                        zip(*rows) if rows else ((), (), (), (), ())))
+
+    def list_expenses(self, item_type=None, company=None, start=None, end=None, after=None,
+                      limit=EXPENSE_PAGE_SIZE):
+        where, params = _expense_filters(PG_EXPENSE_SORT_KEY, "%s", item_type, company, start, end, after)
+        page, totals = _expense_page_sql(PG_EXPENSE_SORT_KEY, where, "%s")
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(page, params + [limit + 1])
+                cols = [d[0] for d in cur.description]
+                rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+                cur.execute(totals, params + [limit])
+                return _expense_page(rows, cur.fetchone(), limit)
+
+    def expense_companies(self):
+        return [r["company"] for r in self._all(EXPENSE_COMPANIES_SQL)]
+
+    def get_expense(self, expense_id):
+        rows = self._all(f"SELECT {', '.join(EXPENSE_COLUMNS)} FROM expenses WHERE id = %s", (expense_id,))
+        return rows[0] if rows else None
+
+    def create_expense(self, data):
+        import savings
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    INSERT INTO expenses ({", ".join(EXPENSE_FIELDS)})
+                    VALUES ({", ".join(["%s"] * len(EXPENSE_FIELDS))})
+                    RETURNING id
+                """, _expense_params(data))
+                new_id = cur.fetchone()[0]
+                cur.execute(savings.APPLY_EXPENSE_SQL, {"sign": 1, "id": new_id})
+            conn.commit()
+            return new_id
+
+    def update_expense(self, expense_id, data):
+        import savings
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(savings.LOCK_EXPENSE_SQL, (expense_id,))
+                cur.execute(savings.APPLY_EXPENSE_SQL, {"sign": -1, "id": expense_id})
+                cur.execute(f"""
+                    UPDATE expenses SET {", ".join(f"{k}=%s" for k in EXPENSE_FIELDS)}
+                    WHERE id=%s
+                """, _expense_params(data) + (expense_id,))
+                cur.execute(savings.APPLY_EXPENSE_SQL, {"sign": 1, "id": expense_id})
+            conn.commit()
+
+    def delete_expense(self, expense_id):
+        import savings
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(savings.LOCK_EXPENSE_SQL, (expense_id,))
+                cur.execute(savings.APPLY_EXPENSE_SQL, {"sign": -1, "id": expense_id})
+                cur.execute("DELETE FROM expenses WHERE id = %s", (expense_id,))
+            conn.commit()
+
+    def savings_ledger(self):
+        import savings
+        return [_ledger_row(r) for r in self._all(savings.LEDGER_SQL)]
+
+    def sync_savings_meta(self, meta):
+        import savings
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                changed = savings.sync_meta(cur, meta)
+            conn.commit()
+            return changed
+
+    def rebuild_savings(self):
+        import savings
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                savings.rebuild_ledger(cur)
+            conn.commit()
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS retailers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS listings (
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    retailer_id INTEGER NOT NULL REFERENCES retailers(id),
+    url TEXT NOT NULL,
+    pack_size TEXT NOT NULL,
+    PRIMARY KEY (product_id, retailer_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS prices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    retailer_id INTEGER NOT NULL REFERENCES retailers(id),
+    date DATETIME NOT NULL,
+    price FLOAT NOT NULL,
+    price_per_oz FLOAT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS prices_product_retailer_date_idx ON prices (product_id, retailer_id, date);
+CREATE INDEX IF NOT EXISTS prices_date_idx ON prices (date);
+CREATE INDEX IF NOT EXISTS prices_product_second_retailer_idx
+    ON prices (product_id, substr(date, 1, 19), retailer_id);
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT OR IGNORE INTO data_versions (name, version) SELECT 'prices', coalesce(max(id), 0) FROM prices;
+
+CREATE TABLE IF NOT EXISTS price_ingest_keys (
+    key TEXT PRIMARY KEY,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS price_daily (
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    retailer_id INTEGER NOT NULL REFERENCES retailers(id),
+    day DATE NOT NULL,
+    min_price_per_oz REAL NOT NULL,
+    max_price_per_oz REAL NOT NULL,
+    sum_price_per_oz REAL NOT NULL,
+    sample_count INTEGER NOT NULL,
+    avg_price_per_oz REAL GENERATED ALWAYS AS (sum_price_per_oz / sample_count) STORED,
+    last_price REAL NOT NULL,
+    last_price_per_oz REAL NOT NULL,
+    last_at DATETIME NOT NULL,
+    PRIMARY KEY (product_id, retailer_id, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_name TEXT NOT NULL,
+    brand TEXT NOT NULL,
+    url TEXT,
+    company TEXT NOT NULL,
+    item_type TEXT CHECK (item_type IN ('food','litter','toys','snacks')),
+    qty INTEGER DEFAULT 1,
+    total_before_tax NUMERIC,
+    cashback_pct NUMERIC DEFAULT 0,
+    cashback_engine TEXT,
+    total_after_cashback NUMERIC,
+    date_purchased DATE,
+    notes TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS expenses_type_company_date_idx ON expenses (item_type, company, date_purchased);
+CREATE INDEX IF NOT EXISTS expenses_sort_key_idx
+    ON expenses (COALESCE(date_purchased, date(created_at)) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS expenses_type_sort_key_idx
+    ON expenses (item_type, COALESCE(date_purchased, date(created_at)) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS expenses_company_sort_key_idx
+    ON expenses (company, COALESCE(date_purchased, date(created_at)) DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS product_savings (
+    product_id INTEGER PRIMARY KEY REFERENCES products(id),
+    expense_pattern TEXT NOT NULL,
+    item_type TEXT,
+    pack_count REAL NOT NULL,
+    unit_size REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS savings_ledger (
+    product_id INTEGER PRIMARY KEY REFERENCES products(id),
+    market_sum REAL NOT NULL DEFAULT 0,
+    market_count INTEGER NOT NULL DEFAULT 0,
+    purchase_count INTEGER NOT NULL DEFAULT 0,
+    packs_bought INTEGER NOT NULL DEFAULT 0,
+    oz_bought REAL NOT NULL DEFAULT 0,
+    spent NUMERIC NOT NULL DEFAULT 0
+);
+"""
+
+SQLITE_UPSERT_DAILY = """
+    INSERT INTO price_daily (product_id, retailer_id, day, min_price_per_oz, max_price_per_oz,
+                             sum_price_per_oz, sample_count, last_price, last_price_per_oz, last_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (product_id, retailer_id, day) DO UPDATE SET
+        min_price_per_oz = MIN(min_price_per_oz, excluded.min_price_per_oz),
+        max_price_per_oz = MAX(max_price_per_oz, excluded.max_price_per_oz),
+        sum_price_per_oz = sum_price_per_oz + excluded.sum_price_per_oz,
+        sample_count = sample_count + excluded.sample_count,
+        last_price = CASE WHEN excluded.last_at >= last_at THEN excluded.last_price ELSE last_price END,
+        last_price_per_oz = CASE WHEN excluded.last_at >= last_at
+                                 THEN excluded.last_price_per_oz ELSE last_price_per_oz END,
+        last_at = MAX(last_at, excluded.last_at)
+"""
+
+# indexes files created by earlier versions may still carry, dropped on open
+# (expenses_sort_idx sorted on the raw timestamp; expenses_sort_key_idx replaced it)
+SQLITE_RETIRED_INDEXES = ("expenses_sort_idx",)
+
+# Files written before the dimension tables keep the product, company, url
+# and pack size on every prices row; SQLiteStorage converts them in place.
+SQLITE_UPGRADE_LEGACY = """
+DROP INDEX IF EXISTS prices_product_company_date_idx;
+DROP INDEX IF EXISTS prices_date_idx;
+DROP TABLE IF EXISTS price_daily;
+ALTER TABLE prices RENAME TO prices_legacy;
+""" + SQLITE_SCHEMA + """
+INSERT OR IGNORE INTO products (name) SELECT DISTINCT product FROM prices_legacy ORDER BY 1;
+INSERT OR IGNORE INTO retailers (name) SELECT DISTINCT company FROM prices_legacy ORDER BY 1;
+INSERT OR REPLACE INTO listings (product_id, retailer_id, url, pack_size)
+SELECT p.id, r.id, l.url, l.pack_size
+FROM prices_legacy l
+JOIN products p ON p.name = l.product
+JOIN retailers r ON r.name = l.company
+ORDER BY l.date;
+INSERT INTO prices (id, product_id, retailer_id, date, price, price_per_oz)
+SELECT l.id, p.id, r.id, l.date, l.price, l.price_per_oz
+FROM prices_legacy l
+JOIN products p ON p.name = l.product
+JOIN retailers r ON r.name = l.company;
+DROP TABLE prices_legacy;
+"""
+
+SQLITE_BACKFILL_DAILY = """
+    WITH ranked AS (
+        SELECT *, row_number() OVER (PARTITION BY product_id, retailer_id, date(date)
+                                     ORDER BY date DESC) AS rn
+        FROM prices
+    )
+    INSERT OR REPLACE INTO price_daily (product_id, retailer_id, day, min_price_per_oz, max_price_per_oz,
+                                        sum_price_per_oz, sample_count, last_price, last_price_per_oz,
+                                        last_at)
+    SELECT product_id, retailer_id, date(date), MIN(price_per_oz), MAX(price_per_oz),
+           SUM(price_per_oz), COUNT(*), MAX(CASE WHEN rn = 1 THEN price END),
+           MAX(CASE WHEN rn = 1 THEN price_per_oz END), MAX(date)
+    FROM ranked
+    GROUP BY product_id, retailer_id, date(date)
+"""
+
+# the savings ledger statements of savings.py, for SQLite (LIKE is
+# case-insensitive for ASCII, like ILIKE)
+SQLITE_ADD_MARKET = """
+    INSERT INTO savings_ledger (product_id, market_sum, market_count) VALUES (?, ?, ?)
+    ON CONFLICT (product_id) DO UPDATE SET
+        market_sum = savings_ledger.market_sum + excluded.market_sum,
+        market_count = savings_ledger.market_count + excluded.market_count
+"""
+
+SQLITE_PURCHASES = """
+    SELECT s.product_id, count(*) AS purchase_count, sum(coalesce(e.qty, 1)) AS packs_bought,
+           sum(coalesce(e.qty, 1) * s.pack_count * s.unit_size) AS oz_bought,
+           sum(e.total_after_cashback) AS spent
+    FROM expenses e
+    JOIN product_savings s ON s.product_id = (
+        SELECT m.product_id FROM product_savings m
+        WHERE e.item_name LIKE m.expense_pattern
+          AND (m.item_type IS NULL OR m.item_type = e.item_type)
+        ORDER BY m.product_id
+        LIMIT 1
+    )
+    WHERE e.total_after_cashback IS NOT NULL {where}
+    GROUP BY s.product_id
+"""
+
+SQLITE_APPLY_EXPENSE = """
+    INSERT INTO savings_ledger (product_id, purchase_count, packs_bought, oz_bought, spent)
+    SELECT product_id, :sign * purchase_count, :sign * packs_bought, :sign * oz_bought, :sign * spent
+    FROM ({purchases})
+    WHERE true
+    ON CONFLICT (product_id) DO UPDATE SET
+        purchase_count = savings_ledger.purchase_count + excluded.purchase_count,
+        packs_bought = savings_ledger.packs_bought + excluded.packs_bought,
+        oz_bought = savings_ledger.oz_bought + excluded.oz_bought,
+        spent = savings_ledger.spent + excluded.spent
+""".format(purchases=SQLITE_PURCHASES.format(where="AND e.id = :id"))
+
+# run on an emptied savings_ledger
+SQLITE_REBUILD_LEDGER = """
+    INSERT INTO savings_ledger (product_id, market_sum, market_count,
+                                purchase_count, packs_bought, oz_bought, spent)
+    SELECT p.id, coalesce(m.market_sum, 0), coalesce(m.market_count, 0),
+           coalesce(b.purchase_count, 0), coalesce(b.packs_bought, 0),
+           coalesce(b.oz_bought, 0), coalesce(b.spent, 0)
+    FROM products p
+    LEFT JOIN (
+        SELECT product_id, sum(sum_price_per_oz) AS market_sum, sum(sample_count) AS market_count
+        FROM price_daily
+        GROUP BY product_id
+    ) m ON m.product_id = p.id
+    LEFT JOIN ({purchases}) b ON b.product_id = p.id
+""".format(purchases=SQLITE_PURCHASES.format(where=""))
+
+def _to_date(value):
+    return date.fromisoformat(value[:10]) if isinstance(value, str) and value else value
+
+def _to_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) and value else value
+
+class SQLiteStorage(Storage):
+    """
+    Everything in one SQLite file, tuned for a single box: WAL so readers
+    never block the writer, synchronous=NORMAL (durable at each WAL
+    checkpoint rather than each commit), a larger page cache and mmap, and
+    the same indexes as the Postgres schema. Every statement is a constant
+    string, so sqlite3's per-connection statement cache keeps them
+    prepared. One connection per thread.
+    """
+
+    def __init__(self, path="pricetracker.db"):
+        self.path = path
+        self._local = threading.local()
+        self.create_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():  # never reuse one across a fork
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-32000")       # 32 MB
+            conn.execute("PRAGMA mmap_size=268435456")     # 256 MB
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create_schema(self):
+        conn = self._conn()
+        columns = [r[1] for r in conn.execute("PRAGMA table_info(prices)")]
+        # a file from before the savings ledger starts it from its history
+        has_ledger = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'savings_ledger'").fetchone()
+        if "product" in columns:
+            conn.executescript("BEGIN;" + SQLITE_UPGRADE_LEGACY + SQLITE_BACKFILL_DAILY + ";"
+                               + SQLITE_REBUILD_LEDGER + ";COMMIT;")
+        elif not has_ledger:
+            conn.executescript("BEGIN;" + SQLITE_SCHEMA + SQLITE_REBUILD_LEDGER + ";COMMIT;")
+        else:
+            conn.executescript(SQLITE_SCHEMA)
+        for name in SQLITE_RETIRED_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.commit()
+
+    def _listing_ids(self, conn, records):
+        """(product, company) -> (product_id, retailer_id), as resolve_listings does for Postgres."""
+        ids = {}
+        for r in records:
+            pair = (r['product'], r['company'])
+            if pair not in ids:
+                conn.execute("INSERT OR IGNORE INTO products (name) VALUES (?)", (r['product'],))
+                conn.execute("INSERT OR IGNORE INTO retailers (name) VALUES (?)", (r['company'],))
+                ids[pair] = conn.execute("""
+                    SELECT (SELECT id FROM products WHERE name = ?), (SELECT id FROM retailers WHERE name = ?)
+                """, pair).fetchone()
+            conn.execute("""
+                INSERT INTO listings (product_id, retailer_id, url, pack_size) VALUES (?, ?, ?, ?)
+                ON CONFLICT (product_id, retailer_id) DO UPDATE
+                SET url = excluded.url, pack_size = excluded.pack_size
+            """, ids[pair] + (r['url'], r['pack_size']))
+        return ids
+
+    def _all(self, sql, params=()):
+        cur = self._conn().execute(sql, params)
+        cols = [d[0] for d in cur.description]
+        return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    def insert_prices(self, records, run_key=None):
+        from price_buffer import PRICE_COLUMNS, default_run_key
+        from rollups import aggregate_daily
+        from savings import market_totals
+        run_key = run_key or default_run_key()
+        now = datetime.now()
+        conn = self._conn()
+        written = []
+        with conn:  # one transaction
+            for record in records:
+                key = f"{run_key}:{record['product']}:{record['company']}"
+                if conn.execute("INSERT OR IGNORE INTO price_ingest_keys (key) VALUES (?)", (key,)).rowcount:
+                    written.append(record)
+            ids = self._listing_ids(conn, written)
+            rows = [ids[(r['product'], r['company'])] + (now, r['price'], r['price_per_oz']) for r in written]
+            conn.executemany("""
+                INSERT INTO prices (product_id, retailer_id, date, price, price_per_oz)
+                VALUES (?, ?, ?, ?, ?)
+            """, [row[:2] + (now.isoformat(sep=" "),) + row[3:] for row in rows])
+            days = aggregate_daily(dict(zip(PRICE_COLUMNS, row)) for row in rows)
+            conn.executemany(SQLITE_UPSERT_DAILY, [
+                row[:2] + (row[2].isoformat(),) + row[3:9] + (row[9].isoformat(sep=" "),) for row in days
+            ])
+            conn.executemany(SQLITE_ADD_MARKET, market_totals(days))
+            if rows:
+                conn.execute("""
+                    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE name = 'prices'
+                """)
+        return written
+
+    def products(self):
+        return [r["name"] for r in self._all("SELECT name FROM products ORDER BY name")]
+
+    def price_history(self, product, since=None, until=None):
+        first, stop = _day_range(since, until)
+        rows = self._conn().execute("""
+            SELECT d.day, d.retailer_id, d.min_price_per_oz, d.max_price_per_oz
+            FROM price_daily d
+            JOIN products p ON p.id = d.product_id
+            WHERE p.name = :product
+              AND (:first IS NULL OR d.day >= :first) AND (:stop IS NULL OR d.day < :stop)
+            ORDER BY d.day, d.retailer_id
+        """, {"product": product, "first": first and first.isoformat(),
+              "stop": stop and stop.isoformat()}).fetchall()
+        return _daily_columns(rows)
+
+    def retailers(self):
+        return {r["id"]: r["name"] for r in self._all("SELECT id, name FROM retailers")}
+
+    def data_version(self):
+        rows = self._all("SELECT version, updated_at FROM data_versions WHERE name = 'prices'")
+        if not rows:
+            return 0, None
+        updated_at = _to_datetime(rows[0]["updated_at"]).replace(tzinfo=timezone.utc)  # CURRENT_TIMESTAMP is UTC
+        return rows[0]["version"], updated_at
+
+    def product_id(self, product):
+        rows = self._all("SELECT id FROM products WHERE name = ?", (product,))
+        return rows[0]["id"] if rows else None
+
+    def live_points(self, product_id, since=None, until=None):
+        rows = self._conn().execute("""
+            SELECT date, retailer_id, price_per_oz FROM prices
+            WHERE product_id = :product_id
+              AND (:since IS NULL OR date >= :since) AND (:until IS NULL OR date < :until)
+            ORDER BY date
+        """, {"product_id": product_id, "since": since and since.isoformat(sep=" "),
+              "until": until and until.isoformat(sep=" ")}).fetchall()
+        dates, retailer_ids, ppos = zip(*rows) if rows else ((), (), ())
+        return {"date": dates, "retailer_id": retailer_ids, "price_per_oz": ppos}
+
+    def live_page(self, product_id, since=None, until=None, retailer_ids=None, after=None, limit=1000):
+        after_at, after_retailer = _after_params(after)
+        retailer_ids = list(retailer_ids) if retailer_ids is not None else None
+        # substr(date, 1, 19) is the date to the second, as indexed by
+        # prices_product_second_retailer_idx; no row values, which SQLite
+        # doesn't seek an index with
+        rows = self._conn().execute(f"""
+            SELECT date, retailer_id, price_per_oz FROM prices
+            WHERE product_id = ?
+              AND (? IS NULL OR date >= ?) AND (? IS NULL OR date < ?)
+              {f"AND retailer_id IN ({', '.join('?' * len(retailer_ids))})" if retailer_ids is not None else ""}
+              AND (? IS NULL OR (substr(date, 1, 19) >= ? AND (substr(date, 1, 19) > ? OR retailer_id > ?)))
+            ORDER BY substr(date, 1, 19), retailer_id
+            LIMIT ?
+        """, (product_id, *([since and since.isoformat(sep=" ")] * 2), *([until and until.isoformat(sep=" ")] * 2),
+              *(retailer_ids or ()), *([after_at and after_at.isoformat(sep=" ")] * 3), after_retailer,
+              limit)).fetchall()
+        dates, retailer_ids, ppos = zip(*rows) if rows else ((), (), ())
+        return {"date": dates, "retailer_id": retailer_ids, "price_per_oz": ppos}
+
+    def product_names(self):
+        return {r["id"]: r["name"] for r in self._all("SELECT id, name FROM products")}
+
+    def latest_price_id(self):
+        return self._all("SELECT COALESCE(MAX(id), 0) AS id FROM prices")[0]["id"]
+
+    def points_after(self, after_id, product_ids, retailer_ids=None, since=None, until=None, limit=1000):
+        product_ids = list(product_ids)
+        retailer_ids = list(retailer_ids) if retailer_ids is not None else None
+        rows = self._conn().execute(f"""
+            SELECT id, product_id, retailer_id, date, price_per_oz FROM prices
+            WHERE id > ?
+              AND product_id IN ({", ".join("?" * len(product_ids))})
+              {f"AND retailer_id IN ({', '.join('?' * len(retailer_ids))})" if retailer_ids is not None else ""}
+              AND (? IS NULL OR date >= ?) AND (? IS NULL OR date < ?)
+            ORDER BY id
+            LIMIT ?
+        """, (after_id, *product_ids, *(retailer_ids or ()),
+              *([since and since.isoformat(sep=" ")] * 2), *([until and until.isoformat(sep=" ")] * 2),
+              limit)).fetchall()
+        return dict(zip(("id", "product_id", "retailer_id", "date", "price_per_oz"),
+                        zip(*rows) if rows else ((), (), (), (), ())))
+
+    def _expense(self, row):
+        row["date_purchased"] = _to_date(row.get("date_purchased"))
+        row["created_at"] = _to_datetime(row.get("created_at"))
+        return row
+
+    def list_expenses(self, item_type=None, company=None, start=None, end=None, after=None,
+                      limit=EXPENSE_PAGE_SIZE):
+        where, params = _expense_filters(SQLITE_EXPENSE_SORT_KEY, "?", item_type, company, start, end, after)
+        params = [v.isoformat() if isinstance(v, date) else v for v in params]
+        page, totals = _expense_page_sql(SQLITE_EXPENSE_SORT_KEY, where, "?")
+        rows = [self._expense(r) for r in self._all(page, params + [limit + 1])]
+        for row in rows:
+            row["sort_date"] = _to_date(row["sort_date"])
+        return _expense_page(rows, self._conn().execute(totals, params + [limit]).fetchone(), limit)
+
+    def expense_companies(self):
+        return [r["company"] for r in self._all(EXPENSE_COMPANIES_SQL)]
+
+    def get_expense(self, expense_id):
+        rows = self._all(f"SELECT {', '.join(EXPENSE_COLUMNS)} FROM expenses WHERE id = ?", (expense_id,))
+        return self._expense(rows[0]) if rows else None
+
+    def _params(self, data):
+        return tuple(v.isoformat() if isinstance(v, date) else v for v in _expense_params(data))
+
+    def create_expense(self, data):
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(f"""
+                INSERT INTO expenses ({", ".join(EXPENSE_FIELDS)})
+                VALUES ({", ".join(["?"] * len(EXPENSE_FIELDS))})
+            """, self._params(data))
+            conn.execute(SQLITE_APPLY_EXPENSE, {"sign": 1, "id": cur.lastrowid})
+        return cur.lastrowid
+
+    def update_expense(self, expense_id, data):
+        conn = self._conn()
+        with conn:
+            conn.execute(SQLITE_APPLY_EXPENSE, {"sign": -1, "id": expense_id})
+            conn.execute(f"""
+                UPDATE expenses SET {", ".join(f"{k}=?" for k in EXPENSE_FIELDS)}
+                WHERE id=?
+            """, self._params(data) + (expense_id,))
+            conn.execute(SQLITE_APPLY_EXPENSE, {"sign": 1, "id": expense_id})
+
+    def delete_expense(self, expense_id):
+        conn = self._conn()
+        with conn:
+            conn.execute(SQLITE_APPLY_EXPENSE, {"sign": -1, "id": expense_id})
+            conn.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
+
+    def savings_ledger(self):
+        import savings  # the same statement works here
+        return [_ledger_row(r) for r in self._all(savings.LEDGER_SQL)]
+
+    def sync_savings_meta(self, meta):
+        from savings import META_COLUMNS, meta_rows
+        conn = self._conn()
+        with conn:
+            for name in meta:
+                conn.execute("INSERT OR IGNORE INTO products (name) VALUES (?)", (name,))
+            ids = dict(conn.execute(f"""
+                SELECT name, id FROM products WHERE name IN ({", ".join(["?"] * len(meta))})
+            """, list(meta))) if meta else {}
+            wanted = meta_rows(meta, ids)
+            current = conn.execute(f"SELECT product_id, {', '.join(META_COLUMNS)} FROM product_savings")
+            if {row[0]: tuple(row[1:]) for row in current} == wanted:
+                return False
+            conn.execute("DELETE FROM product_savings")
+            conn.executemany(f"""
+                INSERT INTO product_savings (product_id, {', '.join(META_COLUMNS)}) VALUES (?, ?, ?, ?, ?)
+            """, [(product_id,) + row for product_id, row in wanted.items()])
+            conn.execute("DELETE FROM savings_ledger")
+            conn.execute(SQLITE_REBUILD_LEDGER)
+        return True
+
+    def rebuild_savings(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM savings_ledger")
+            conn.execute(SQLITE_REBUILD_LEDGER)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage(url=None):
+    """
+    The process-wide storage backend for url (default $DATABASE_URL):
+    SQLite for sqlite:///path/to/file.db, Postgres otherwise.
+    """
+    global _storage
+    url = url or os.getenv("DATABASE_URL")
+    with _storage_lock:
+        if _storage is None:
+            if url and url.startswith("sqlite:///"):
+                _storage = SQLiteStorage(url[len("sqlite:///"):])
+            else:
+                _storage = PostgresStorage(url=url)
+        return _storage
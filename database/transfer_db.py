@@ -1,47 +1,303 @@
+"""
+Copy the SQLite price history into Postgres.
+
+Rows are streamed from SQLite with fetchmany in chunks and loaded with
+COPY FROM STDIN, so memory stays bounded however large the archive is.
+Each chunk is staged in a temporary table and moved into the slim prices
+fact table from there, adding any products, retailers and listings it
+names to the dimension tables. Postgres assigns the copied rows new ids
+from its own sequence, so they can't collide with ids production has
+already used; transfer_ids maps each source id to its new id.
+Each chunk is committed together with a checkpoint row in Postgres
+(transfer_checkpoints), so an interrupted transfer resumes where it
+stopped and never loads a chunk twice. --workers splits each table's id
+range over parallel workers. Finally the copied id range is verified
+with a row count and a checksum on both sides, reading the Postgres side
+through transfer_ids so rows that were there before are never counted.
+
+    python -m database.transfer_db --sqlite pricetracker.db --workers 4
+"""
+import argparse
+import csv
+import hashlib
+import io
+import os
 import sqlite3
-import psycopg2
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+
 from dotenv import load_dotenv
-import os
 
-DB_CONFIG = {
-    "hostname": os.getenv("hostname"),
-    "database": os.getenv("database"),
-    "port": os.getenv("port"),
-    "username": os.getenv("username"),
-    "password": os.getenv("password"),
+from database.connect_db import connect_with_retry
+
+# table -> columns read from the SQLite archive after id
+TABLES = {
+    "prices": ("product", "company", "url", "date", "price", "price_per_oz", "pack_size"),
+}
+
+# the same rows as they read back from Postgres, for verification; url and
+# pack_size live on the listing now, which keeps only the latest of each
+VERIFY_COLUMNS = {
+    "prices": ("product", "company", "date", "price", "price_per_oz"),
+}
+VERIFY_SQL = {
+    "prices": """
+        SELECT m.source_id, pr.name, r.name, p.date, p.price, p.price_per_oz
+        FROM transfer_ids m
+        JOIN prices p ON p.id = m.new_id
+        JOIN products pr ON pr.id = p.product_id
+        JOIN retailers r ON r.id = p.retailer_id
+        WHERE m.source = %s AND m.table_name = 'prices' AND m.source_id BETWEEN %s AND %s
+    """,
+}
+
+STAGE_SQL = {
+    "prices": """
+        CREATE TEMP TABLE IF NOT EXISTS stage_prices (
+            id INTEGER, product TEXT, company TEXT, url TEXT, date TIMESTAMP,
+            price DOUBLE PRECISION, price_per_oz DOUBLE PRECISION, pack_size TEXT,
+            new_id BIGINT
+        ) ON COMMIT DELETE ROWS
+    """,
 }
 
-load_dotenv()
-url = os.getenv("db_url")
-
-# SQLite connection
-try:
-    with sqlite3.connect("pricetracker.db") as sqlite_conn:
-        sqlite_cursor = sqlite_conn.cursor()
-        sqlite_cursor.execute("SELECT * FROM prices")
-        rows = sqlite_cursor.fetchall()
-except sqlite3.Error as e:
-    print(f"Error connecting to SQLite: {e}")
-    raise  
-
-# PostgreSQL connection
-try:
-    with psycopg2.connect(url, sslmode="require") as pg_conn:
-        with pg_conn.cursor() as pg_cursor:
-            for row in rows:
-                pg_cursor.execute('''
-                    INSERT INTO "PriceTracker" (product, company, url, date, price, price_per_oz, pack_size)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ''', row[1:])
-            pg_conn.commit() 
-            print("Data migrated successfully!")
-        
-     
-except psycopg2.OperationalError as e:
-    print(f"Error connecting to PostgreSQL: {e}")
-    raise
-
-            
-except Exception as e:
-    print(f"Error migrating data: {e}")
+# run after each chunk is COPYed into stage_<table>, in the same transaction
+LOAD_SQL = {
+    "prices": """
+        -- fresh ids from the live sequence, in source id order
+        UPDATE stage_prices s SET new_id = n.new_id
+        FROM (
+            SELECT id, nextval(pg_get_serial_sequence('prices', 'id')) AS new_id
+            FROM (SELECT id FROM stage_prices ORDER BY id) ordered
+        ) n
+        WHERE s.id = n.id;
+        INSERT INTO transfer_ids (source, table_name, source_id, new_id)
+        SELECT %(source)s, 'prices', id, new_id FROM stage_prices;
+        INSERT INTO products (name) SELECT DISTINCT product FROM stage_prices
+        ON CONFLICT (name) DO NOTHING;
+        INSERT INTO retailers (name) SELECT DISTINCT company FROM stage_prices
+        ON CONFLICT (name) DO NOTHING;
+        -- the scraper keeps listings current; history only fills the gaps
+        INSERT INTO listings (product_id, retailer_id, url, pack_size)
+        SELECT DISTINCT ON (s.product, s.company) pr.id, r.id, s.url, s.pack_size
+        FROM stage_prices s
+        JOIN products pr ON pr.name = s.product
+        JOIN retailers r ON r.name = s.company
+        ORDER BY s.product, s.company, s.date DESC
+        ON CONFLICT (product_id, retailer_id) DO NOTHING;
+        INSERT INTO prices (id, product_id, retailer_id, date, price, price_per_oz)
+        SELECT s.new_id, pr.id, r.id, s.date, s.price, s.price_per_oz
+        FROM stage_prices s
+        JOIN products pr ON pr.name = s.product
+        JOIN retailers r ON r.name = s.company;
+    """,
+}
+
+CREATE_CHECKPOINTS_SQL = """
+CREATE TABLE IF NOT EXISTS transfer_checkpoints (
+    source TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    range_start BIGINT NOT NULL,
+    range_end BIGINT NOT NULL,
+    last_id BIGINT NOT NULL,
+    rows_copied BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    PRIMARY KEY (source, table_name, range_start)
+);
+
+-- source id -> the id Postgres gave the copied row
+CREATE TABLE IF NOT EXISTS transfer_ids (
+    source TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    source_id BIGINT NOT NULL,
+    new_id BIGINT NOT NULL,
+    PRIMARY KEY (source, table_name, source_id)
+);
+"""
+
+def _canonical(value):
+    """One text form per value, whether it came out of SQLite or Postgres."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    if isinstance(value, str):
+        try:
+            # SQLite keeps timestamps as text
+            return datetime.fromisoformat(value).isoformat(sep=" ")
+        except ValueError:
+            return value
+    if hasattr(value, "as_integer_ratio"):  # Decimal
+        return repr(round(float(value), 6))
+    return str(value)
+
+def _row_hash(row):
+    digest = hashlib.md5("\x1f".join(_canonical(v) for v in row).encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def _checksum(rows, fetch):
+    """(count, order-independent checksum) over a cursor, read in chunks."""
+    count = total = 0
+    while True:
+        chunk = fetch(rows)
+        if not chunk:
+            return count, total
+        count += len(chunk)
+        total = (total + sum(_row_hash(r) for r in chunk)) % (1 << 64)
+
+def id_ranges(sqlite_path, table, workers):
+    """Split the table's id span into `workers` contiguous (start, end) ranges."""
+    with sqlite3.connect(sqlite_path) as src:
+        lo, hi = src.execute(f"SELECT min(id), max(id) FROM {table}").fetchone()
+    if lo is None:
+        return []
+    step = -(-(hi - lo + 1) // workers)
+    return [(start, min(start + step - 1, hi)) for start in range(lo, hi + 1, step)]
+
+class Transfer:
+    def __init__(self, sqlite_path, pg_url, chunk_size=5000):
+        self.sqlite_path = sqlite_path
+        self.source = os.path.abspath(sqlite_path)
+        self.pg_url = pg_url
+        self.chunk_size = chunk_size
+
+    def _checkpoint(self, pg, table, start, end):
+        with pg.cursor() as cur:
+            cur.execute("""
+                INSERT INTO transfer_checkpoints (source, table_name, range_start, range_end, last_id)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (source, table_name, range_start) DO NOTHING
+            """, (self.source, table, start, end, start - 1))
+            cur.execute("""
+                SELECT last_id, rows_copied FROM transfer_checkpoints
+                WHERE source = %s AND table_name = %s AND range_start = %s
+            """, (self.source, table, start))
+            last_id, rows_copied = cur.fetchone()
+        pg.commit()
+        return last_id, rows_copied
+
+    def copy_range(self, table, start, end):
+        """Copy ids start..end of one table, resuming from its checkpoint. Returns rows copied now."""
+        columns = ("id",) + TABLES[table]
+        copy_sql = f"COPY stage_{table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        pg = connect_with_retry(self.pg_url)
+        src = sqlite3.connect(self.sqlite_path)
+        try:
+            with pg.cursor() as cur:
+                cur.execute(STAGE_SQL[table])
+            pg.commit()
+            last_id, done_before = self._checkpoint(pg, table, start, end)
+            if last_id >= end:
+                return 0
+            if last_id >= start:
+                print(f"{table} {start}-{end}: resuming after id {last_id} ({done_before} rows already copied)")
+            copied = 0
+            rows = src.execute(
+                f"SELECT {', '.join(columns)} FROM {table} WHERE id > ? AND id <= ? ORDER BY id",
+                (last_id, end))
+            while True:
+                chunk = rows.fetchmany(self.chunk_size)
+                if not chunk:
+                    break
+                buf = io.StringIO()
+                csv.writer(buf).writerows(chunk)
+                buf.seek(0)
+                with pg.cursor() as cur:
+                    cur.copy_expert(copy_sql, buf)
+                    cur.execute(LOAD_SQL[table], {"source": self.source})
+                    # the checkpoint commits with the chunk, so a crash can't double-load it
+                    cur.execute("""
+                        UPDATE transfer_checkpoints
+                        SET last_id = %s, rows_copied = rows_copied + %s, updated_at = now()
+                        WHERE source = %s AND table_name = %s AND range_start = %s
+                    """, (chunk[-1][0], len(chunk), self.source, table, start))
+                pg.commit()
+                copied += len(chunk)
+            return copied
+        finally:
+            src.close()
+            pg.close()
+
+    def verify(self, table, lo, hi):
+        """Compare row count and checksum of source ids lo..hi on both sides."""
+        columns = ", ".join(("id",) + VERIFY_COLUMNS[table])
+        with sqlite3.connect(self.sqlite_path) as src:
+            rows = src.execute(f"SELECT {columns} FROM {table} WHERE id BETWEEN ? AND ?", (lo, hi))
+            expected = _checksum(rows, lambda c: c.fetchmany(self.chunk_size))
+        pg = connect_with_retry(self.pg_url)
+        try:
+            with pg.cursor(name=f"verify_{table}") as cur:  # server-side, streamed
+                cur.itersize = self.chunk_size
+                cur.execute(VERIFY_SQL[table], (self.source, lo, hi))
+                actual = _checksum(cur, lambda c: c.fetchmany(self.chunk_size))
+            pg.commit()
+        finally:
+            pg.close()
+        return expected, actual
+
+    def finish(self, table):
+        """Refresh what is derived from the copied rows."""
+        if table != "prices":
+            return
+        pg = connect_with_retry(self.pg_url)
+        try:
+            # history older than the partitions lands in prices_default and
+            # bypassed the rollups; split it out and rebuild them
+            from database.migrate import maintain
+            from rollups import backfill
+            maintain(pg)
+            with pg.cursor() as cur:
+                cur.execute("SELECT to_regclass('price_daily') IS NOT NULL")
+                has_rollups = cur.fetchone()[0]
+            if has_rollups:
+                backfill(pg)
+        finally:
+            pg.close()
+
+def run(sqlite_path, pg_url, tables=None, workers=1, chunk_size=5000, verify=True):
+    transfer = Transfer(sqlite_path, pg_url, chunk_size)
+    pg = connect_with_retry(pg_url)
+    with pg.cursor() as cur:
+        cur.execute(CREATE_CHECKPOINTS_SQL)
+    pg.commit()
+    pg.close()
+
+    ok = True
+    for table in tables or TABLES:
+        ranges = id_ranges(sqlite_path, table, max(1, workers))
+        if not ranges:
+            print(f"{table}: nothing to copy")
+            continue
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="transfer") as pool:
+            copied = sum(pool.map(lambda r: transfer.copy_range(table, *r), ranges))
+        elapsed = time.monotonic() - started
+        print(f"{table}: {copied} rows in {elapsed:.1f}s ({copied / elapsed if elapsed else 0:.0f} rows/s)")
+        transfer.finish(table)
+        if verify:
+            expected, actual = transfer.verify(table, ranges[0][0], ranges[-1][1])
+            if expected == actual:
+                print(f"{table}: verified {expected[0]} rows, checksum {expected[1]:016x}")
+            else:
+                ok = False
+                print(f"{table}: MISMATCH sqlite {expected[0]} rows/{expected[1]:016x}, "
+                      f"postgres {actual[0]} rows/{actual[1]:016x}")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy the SQLite price history into Postgres")
+    parser.add_argument("--sqlite", default="pricetracker.db", help="SQLite file (default: pricetracker.db)")
+    parser.add_argument("--tables", nargs="+", choices=sorted(TABLES), default=None,
+                        help="tables to copy (default: all)")
+    parser.add_argument("--workers", type=int, default=1, help="parallel id-range workers per table")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per fetchmany/COPY chunk")
+    parser.add_argument("--no-verify", action="store_true", help="skip the count and checksum check")
+    args = parser.parse_args()
+
+    load_dotenv()
+    url = os.getenv("DATABASE_URL") or os.getenv("db_url")
+    ok = run(args.sqlite, url, args.tables, args.workers, args.chunk_size, not args.no_verify)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,21 @@
+"""
+gunicorn settings for the web app (see Procfile).
+
+The app is imported and built once in the master (preload_app) and the
+workers are forked from it, so they share the imported modules and
+templates copy-on-write instead of each importing them again. Nothing
+database-related is opened before the fork: each worker warms its own
+connection pool in the background right after it starts.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+wsgi_app = "plot:create_app(warm=False)"
+preload_app = True
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+
+def post_fork(server, worker):
+    import plot
+    plot.warm_connections()
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from selenium.common.exceptions import TimeoutException
+
+from http_fetch import Blocked, BLOCKED_MARKERS
+from parsers import ParseError, SelectorNotFound, parse_page
+
+HEALTH_PATH = Path(
+    os.getenv("SCRAPER_HEALTH_PATH")
+    or Path(os.getenv("SCRAPER_CACHE_DIR") or Path.home() / ".cache" / "pricetracker") / "retailer_health.json"
+)
+
+TIMEOUT = "timeout"
+SELECTOR_NOT_FOUND = "selector_not_found"
+PARSE_ERROR = "parse_error"
+BLOCKED = "blocked"
+ERROR = "error"
+
+# what scrape_group should do with a retailer's next page
+CLOSED, PROBE, SKIP = "closed", "probe", "skip"
+
+def classify_failure(exc, html=None, entry=None):
+    """
+    Sort a scrape failure into timeout, selector_not_found, parse_error,
+    blocked or error. html (the page as it was when the scrape gave up) lets
+    a timeout be told apart from a bot wall or a selector that no longer
+    exists on an otherwise loaded page.
+    """
+    if isinstance(exc, Blocked):
+        return BLOCKED
+    if html and any(marker in html[:20000].lower() for marker in BLOCKED_MARKERS):
+        return BLOCKED
+    if isinstance(exc, SelectorNotFound):
+        return SELECTOR_NOT_FOUND
+    if isinstance(exc, ParseError):
+        return PARSE_ERROR
+    if isinstance(exc, (TimeoutException, TimeoutError)):
+        if html and entry is not None:
+            try:
+                parse_page(html, entry)
+            except SelectorNotFound:
+                return SELECTOR_NOT_FOUND
+            except Exception:
+                pass
+        return TIMEOUT
+    return ERROR
+
+class HealthStore:
+    """
+    Per-retailer scrape health, persisted between runs.
+
+    Tracks consecutive failures (by kind) and the selector that last won for
+    each product. After `threshold` consecutive failures the retailer's
+    circuit opens: the next run sends one cheap, short-timeout probe for it
+    and skips its remaining pages unless the probe succeeds, so a broken
+    retailer stops costing full timeouts while healthy ones are untouched.
+    """
+
+    def __init__(self, path=None, threshold=None):
+        self.path = Path(path or HEALTH_PATH)
+        self.threshold = threshold or int(os.getenv("SCRAPER_CIRCUIT_THRESHOLD", "3"))
+        self._lock = threading.Lock()
+        self._probed = set()  # retailers already probed this run
+        try:
+            with open(self.path) as f:
+                self.retailers = json.load(f)
+        except (OSError, ValueError):
+            self.retailers = {}
+
+    def _state(self, retailer):
+        return self.retailers.setdefault(retailer, {
+            "consecutive_failures": 0,
+            "failures_by_kind": {},
+            "last_failure_kind": None,
+            "last_error": None,
+            "last_success": None,
+            "circuit_open_since": None,
+            "winning_selectors": {},
+        })
+
+    def is_open(self, retailer):
+        with self._lock:
+            return bool(self._state(retailer)["circuit_open_since"])
+
+    def gate(self, retailer):
+        """CLOSED to scrape normally, PROBE for one short attempt, or SKIP."""
+        with self._lock:
+            if not self._state(retailer)["circuit_open_since"]:
+                return CLOSED
+            if retailer in self._probed:
+                return SKIP
+            self._probed.add(retailer)
+            return PROBE
+
+    def record_success(self, entry, selector=None):
+        retailer = entry["retailer"]
+        with self._lock:
+            state = self._state(retailer)
+            if state["circuit_open_since"]:
+                logging.info(f"Circuit for {retailer} closed after a successful probe")
+            state["consecutive_failures"] = 0
+            state["circuit_open_since"] = None
+            state["last_success"] = datetime.now().isoformat(timespec="seconds")
+            if selector:
+                previous = state["winning_selectors"].get(entry["product"])
+                if previous and previous != selector:
+                    logging.warning(f"{retailer} {entry['product']}: price now read by fallback selector {selector}")
+                state["winning_selectors"][entry["product"]] = selector
+
+    def record_failure(self, entry, kind, error=None):
+        retailer = entry["retailer"]
+        with self._lock:
+            state = self._state(retailer)
+            state["consecutive_failures"] += 1
+            state["failures_by_kind"][kind] = state["failures_by_kind"].get(kind, 0) + 1
+            state["last_failure_kind"] = kind
+            state["last_error"] = str(error)[:300] if error else None
+            if state["consecutive_failures"] >= self.threshold and not state["circuit_open_since"]:
+                state["circuit_open_since"] = datetime.now().isoformat(timespec="seconds")
+                logging.warning(f"Circuit for {retailer} opened after {state['consecutive_failures']} "
+                                f"consecutive failures (last: {kind})")
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.retailers, indent=2, sort_keys=True)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(data)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save retailer health: {e}")
+
+    def reset(self, retailer):
+        """Forget a retailer's failures, e.g. after fixing its selectors."""
+        with self._lock:
+            self.retailers.pop(retailer, None)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Show or reset per-retailer scrape health")
+    parser.add_argument("--reset", metavar="RETAILER", help="close the circuit and clear failures for RETAILER")
+    args = parser.parse_args()
+    store = HealthStore()
+    if args.reset:
+        store.reset(args.reset)
+        store.save()
+    print(json.dumps(store.retailers, indent=2, sort_keys=True))
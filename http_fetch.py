@@ -0,0 +1,250 @@
+import json
+import logging
+import re
+import threading
+from urllib.parse import urlparse
+
+import requests
+from bs4 import BeautifulSoup
+
+from parsers import ParseError, parse_page
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/142.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# statuses and page markers that mean a bot wall rather than a product page
+BLOCKED_STATUSES = {403, 429, 503}
+BLOCKED_MARKERS = ("captcha", "robot check", "access denied", "px-captcha", "are you a human")
+
+# keys we trust to hold a price inside embedded state JSON
+STATE_PRICE_KEYS = ("price", "salePrice", "currentPrice", "finalPrice")
+# a product node's own price block, read one level down
+STATE_PRICE_BLOCKS = ("pricing", "prices", "priceInfo")
+# keys that identify the product a state node describes
+STATE_SKU_KEYS = ("sku", "partNumber", "productId", "itemId", "id")
+STATE_URL_KEYS = ("url", "canonicalUrl", "pdpUrl", "seoUrl", "href", "slug")
+
+# prices from different sources on one page agreeing to within this are the same price
+PRICE_TOLERANCE = 0.01
+
+_local = threading.local()
+
+class Blocked(Exception):
+    """The retailer answered with a bot wall instead of the product page."""
+
+def _session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        _local.session = session
+    return session
+
+def _to_price(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) if value > 0 else None
+    if isinstance(value, str):
+        m = re.search(r'(\d[\d,]*(?:\.\d+)?)', value)
+        if m:
+            price = float(m.group(1).replace(',', ''))
+            return price if price > 0 else None
+    return None
+
+def _offer_price(offers):
+    """Price from a schema.org offers value (Offer, AggregateOffer or a list)."""
+    if isinstance(offers, list):
+        for offer in offers:
+            price = _offer_price(offer)
+            if price:
+                return price
+        return None
+    if not isinstance(offers, dict):
+        return None
+    for key in ("price", "lowPrice"):
+        price = _to_price(offers.get(key))
+        if price:
+            return price
+    spec = offers.get("priceSpecification")
+    if isinstance(spec, list):
+        spec = spec[0] if spec else None
+    if isinstance(spec, dict):
+        return _to_price(spec.get("price"))
+    return None
+
+def _json_ld_price(soup):
+    for tag in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(tag.string or "")
+        except ValueError:
+            continue
+        stack = [data]
+        while stack:
+            node = stack.pop(0)
+            if isinstance(node, list):
+                stack.extend(node)
+            elif isinstance(node, dict):
+                types = node.get("@type")
+                types = types if isinstance(types, list) else [types]
+                if "Product" in types and "offers" in node:
+                    price = _offer_price(node["offers"])
+                    if price:
+                        return price
+                if "@graph" in node:
+                    stack.extend(node["@graph"])
+    return None
+
+def _meta_price(soup):
+    for prop in ("og:price:amount", "product:price:amount"):
+        tag = soup.find("meta", attrs={"property": prop}) or soup.find("meta", attrs={"name": prop})
+        if tag:
+            price = _to_price(tag.get("content"))
+            if price:
+                return price
+    return None
+
+def _slug(value):
+    return (urlparse(value).path or value).rstrip("/").rsplit("/", 1)[-1]
+
+def _is_entry_product(node, entry):
+    """Whether a state node is the catalog entry's product, by SKU or by URL."""
+    sku = entry.get("sku")
+    if sku and any(str(node.get(key)) == str(sku) for key in STATE_SKU_KEYS if key in node):
+        return True
+    slug = _slug(entry["url"])
+    return any(isinstance(node.get(key), str) and node[key] and _slug(node[key]) == slug
+               for key in STATE_URL_KEYS)
+
+def _find_state_product(node, entry):
+    """The shallowest dict in the state tree describing the entry's product."""
+    queue = [(node, 0)]
+    while queue:
+        node, depth = queue.pop(0)
+        if depth > 12:
+            continue
+        if isinstance(node, dict):
+            if _is_entry_product(node, entry):
+                return node
+            queue.extend((child, depth + 1) for child in node.values())
+        elif isinstance(node, list):
+            queue.extend((child, depth + 1) for child in node)
+    return None
+
+def _own_price(product):
+    """
+    A product node's price from its own keys or price block, never from
+    nested related products, bundles or shipping lines.
+    """
+    for node in [product] + [product[key] for key in STATE_PRICE_BLOCKS if isinstance(product.get(key), dict)]:
+        for key in STATE_PRICE_KEYS:
+            if key in node:
+                value = node[key]
+                if isinstance(value, dict):
+                    value = value.get("value") or value.get("amount")
+                price = _to_price(value)
+                if price:
+                    return price
+    return None
+
+def _state_price(soup, entry):
+    tag = soup.find("script", id="__NEXT_DATA__")
+    if not tag or not tag.string:
+        return None
+    try:
+        product = _find_state_product(json.loads(tag.string), entry)
+    except ValueError:
+        return None
+    return _own_price(product) if product else None
+
+def _selector_price(soup, entry):
+    """The pack price the entry's own selectors read, if the static page carries them."""
+    if entry.get("price_is_per_unit"):
+        return None  # a rounded $/unit scaled up won't match the pack price to the cent
+    try:
+        return parse_page(soup, entry)["price"]
+    except (ParseError, KeyError):
+        return None
+
+def _discount_applies(soup, entry):
+    discount = soup.find(id=entry["discount_id"]) if entry.get("discount_id") else None
+    return bool(discount and re.search(r"\d+%", discount.get_text()))
+
+def extract_structured_price(html, entry=None):
+    """
+    Find the product price in a page's structured data, trying JSON-LD,
+    then og/product price meta tags, then the entry's own product node in
+    embedded Next.js state. Every source found, and the entry's selector
+    price when the static page has it, must agree: a page where they
+    don't, or where the entry's sale message applies a discount, returns
+    (None, None) so the browser reads it instead.
+    Returns (price, source) or (None, None).
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    found = [(source, price) for source, price in (
+        ("json-ld", _json_ld_price(soup)),
+        ("meta", _meta_price(soup)),
+        ("state", _state_price(soup, entry) if entry else None),
+    ) if price]
+    if not found:
+        return None, None
+    if entry:
+        if _discount_applies(soup, entry):
+            logging.info(f"HTTP tier: {entry['retailer']} sale message applies a discount")
+            return None, None
+        selector = _selector_price(soup, entry)
+        if selector:
+            found.append(("selector", selector))
+    prices = [price for _, price in found]
+    if max(prices) - min(prices) > PRICE_TOLERANCE:
+        logging.info(f"HTTP tier: page prices disagree {dict(found)}")
+        return None, None
+    return found[0][1], found[0][0]
+
+def fetch_structured_price(url, timeout=10, entry=None):
+    """
+    GET url without a browser and return (price, source), or (None, None)
+    if the page has no usable structured price. Raises Blocked on a bot wall.
+    """
+    resp = _session().get(url, timeout=timeout)
+    if resp.status_code in BLOCKED_STATUSES:
+        raise Blocked(f"HTTP {resp.status_code}")
+    resp.raise_for_status()
+    head = resp.text[:20000].lower()
+    price, source = extract_structured_price(resp.text, entry)
+    if price is None and any(marker in head for marker in BLOCKED_MARKERS):
+        raise Blocked("bot challenge page")
+    return price, source
+
+def http_eligible(entry):
+    """
+    Entries that need page interaction (picking a size) can't be served by a
+    plain GET; the catalog can also opt an entry out with "http": false.
+    """
+    return entry.get("http", True) and not entry.get("size_option")
+
+def fetch_price_http(entry, timeout=10):
+    """
+    HTTP tier: return the pack price for a catalog entry from a plain GET, or
+    None so the caller can escalate to the browser.
+    """
+    if not http_eligible(entry):
+        return None
+    try:
+        price, source = fetch_structured_price(entry["url"], timeout=timeout, entry=entry)
+    except Blocked as e:
+        logging.info(f"HTTP tier blocked on {entry['retailer']}: {e}")
+        return None
+    except requests.RequestException as e:
+        logging.info(f"HTTP tier failed on {entry['retailer']}: {e}")
+        return None
+    if price is None:
+        logging.info(f"HTTP tier found no structured price on {entry['retailer']}")
+        return None
+    logging.info(f"HTTP tier read {entry['retailer']} price {price} from {source}")
+    return price
@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+METRICS_DIR = Path(os.getenv("SCRAPER_METRICS_DIR") or Path(__file__).parent / "metrics")
+
+def _quantile(values, q):
+    """Nearest-rank quantile of an already sorted list."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(q * (len(values) - 1)))))
+    return values[index]
+
+def _summarize(seconds):
+    seconds = sorted(seconds)
+    return {
+        "count": len(seconds),
+        "sum": round(sum(seconds), 4),
+        "p50": round(_quantile(seconds, 0.5), 4),
+        "p95": round(_quantile(seconds, 0.95), 4),
+        "max": round(seconds[-1], 4),
+    }
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+class RunMetrics:
+    """
+    Collects per-stage timings for one scraper run. Each sample is tagged
+    with the stage name and, where known, the retailer and product, so the
+    end-of-run summary can break time down per retailer and per product.
+    Thread-safe; concurrent workers record into the same instance.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+        self.started = time.monotonic()
+        self.started_at = datetime.now()
+
+    def record(self, stage, seconds, retailer=None, product=None, ok=True):
+        with self._lock:
+            self.samples.append({
+                "stage": stage,
+                "retailer": retailer,
+                "product": product,
+                "seconds": seconds,
+                "ok": ok,
+            })
+
+    @contextmanager
+    def stage(self, name, retailer=None, product=None):
+        """Time the enclosed block as one sample of stage `name`."""
+        start = time.monotonic()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            self.record(name, time.monotonic() - start, retailer, product, ok)
+
+    def summary(self):
+        """Run summary: totals per stage, per stage x retailer and per product."""
+        with self._lock:
+            samples = list(self.samples)
+        by_stage = defaultdict(list)
+        by_retailer = defaultdict(lambda: defaultdict(list))
+        by_product = defaultdict(lambda: defaultdict(list))
+        failures = defaultdict(int)
+        for s in samples:
+            by_stage[s["stage"]].append(s["seconds"])
+            if s["retailer"]:
+                by_retailer[s["retailer"]][s["stage"]].append(s["seconds"])
+            if s["product"]:
+                by_product[s["product"]][s["stage"]].append(s["seconds"])
+            if not s["ok"]:
+                failures[s["stage"]] += 1
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "run_seconds": round(time.monotonic() - self.started, 3),
+            "stages": {k: _summarize(v) for k, v in by_stage.items()},
+            "retailers": {r: {k: _summarize(v) for k, v in st.items()} for r, st in by_retailer.items()},
+            "products": {p: {k: _summarize(v) for k, v in st.items()} for p, st in by_product.items()},
+            "failures": dict(failures),
+        }
+
+    def prometheus(self, summary=None):
+        """The summary in Prometheus text exposition format."""
+        summary = summary or self.summary()
+        lines = [
+            "# HELP pricetracker_stage_seconds Time spent per scraper stage and retailer.",
+            "# TYPE pricetracker_stage_seconds summary",
+        ]
+        for retailer, stages in sorted(summary["retailers"].items()):
+            for stage, st in sorted(stages.items()):
+                labels = f'stage="{_label(stage)}",retailer="{_label(retailer)}"'
+                lines.append(f'pricetracker_stage_seconds{{{labels},quantile="0.5"}} {st["p50"]}')
+                lines.append(f'pricetracker_stage_seconds{{{labels},quantile="0.95"}} {st["p95"]}')
+                lines.append(f"pricetracker_stage_seconds_sum{{{labels}}} {st['sum']}")
+                lines.append(f"pricetracker_stage_seconds_count{{{labels}}} {st['count']}")
+        # run-wide totals, including stages not tied to a retailer (driver startup)
+        lines += [
+            "# HELP pricetracker_stage_total_seconds Time spent per scraper stage across all retailers.",
+            "# TYPE pricetracker_stage_total_seconds summary",
+        ]
+        for stage, st in sorted(summary["stages"].items()):
+            labels = f'stage="{_label(stage)}"'
+            lines.append(f'pricetracker_stage_total_seconds{{{labels},quantile="0.5"}} {st["p50"]}')
+            lines.append(f'pricetracker_stage_total_seconds{{{labels},quantile="0.95"}} {st["p95"]}')
+            lines.append(f"pricetracker_stage_total_seconds_sum{{{labels}}} {st['sum']}")
+            lines.append(f"pricetracker_stage_total_seconds_count{{{labels}}} {st['count']}")
+        lines += [
+            "# HELP pricetracker_stage_failures_total Failed stage executions in the last run.",
+            "# TYPE pricetracker_stage_failures_total gauge",
+        ]
+        for stage, count in sorted(summary["failures"].items()):
+            lines.append(f'pricetracker_stage_failures_total{{stage="{_label(stage)}"}} {count}')
+        lines += [
+            "# HELP pricetracker_run_seconds Wall time of the last scraper run.",
+            "# TYPE pricetracker_run_seconds gauge",
+            f"pricetracker_run_seconds {summary['run_seconds']}",
+            "# HELP pricetracker_last_run_timestamp_seconds When the last scraper run finished.",
+            "# TYPE pricetracker_last_run_timestamp_seconds gauge",
+            f"pricetracker_last_run_timestamp_seconds {int(time.time())}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, metrics_dir=None):
+        """
+        Write run_summary.json and scraper.prom, and append the summary to
+        runs.jsonl so p50/p95 can be tracked across runs.
+        """
+        metrics_dir = Path(metrics_dir or METRICS_DIR)
+        summary = self.summary()
+        try:
+            metrics_dir.mkdir(parents=True, exist_ok=True)
+            (metrics_dir / "run_summary.json").write_text(json.dumps(summary, indent=2))
+            # write-then-rename so a textfile collector never sees half a file
+            prom = metrics_dir / "scraper.prom"
+            tmp = prom.with_suffix(".prom.tmp")
+            tmp.write_text(self.prometheus(summary))
+            os.replace(tmp, prom)
+            with open(metrics_dir / "runs.jsonl", "a") as f:
+                f.write(json.dumps(summary) + "\n")
+        except OSError as e:
+            logging.warning(f"Could not write run metrics: {e}")
+        return summary
@@ -0,0 +1,172 @@
+"""
+Postgres-backed scrape job queue.
+
+The scheduler enqueues one job per (product, retailer) catalog entry per day.
+Workers (`python scraper.py --worker`) on any number of machines claim jobs
+with SELECT ... FOR UPDATE SKIP LOCKED, so no two workers get the same job
+and none wait on each other's locks. A claim is a lease: if the worker dies,
+the lease expires and another worker picks the job up. Failed attempts are
+retried with backoff up to max_attempts. Every attempt leaves a row in
+scrape_results. The tables are created by migration 0009
+(`python -m database.migrate`).
+"""
+import logging
+import os
+import socket
+from datetime import date
+
+LEASE_SECONDS = int(os.getenv("SCRAPE_JOB_LEASE", "300"))
+RETRY_DELAY = int(os.getenv("SCRAPE_JOB_RETRY_DELAY", "60"))
+MAX_ATTEMPTS = int(os.getenv("SCRAPE_JOB_MAX_ATTEMPTS", "3"))
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def enqueue_catalog(conn, entries, run_date=None, max_attempts=None):
+    """
+    Scheduler: queue one job per catalog entry for run_date (default today).
+    Entries that already have a job for that day are left alone, so running
+    the scheduler twice does not double the work. Returns the number queued.
+    """
+    run_date = run_date or date.today()
+    max_attempts = max_attempts or MAX_ATTEMPTS
+    queued = 0
+    with conn.cursor() as cursor:
+        for entry in entries:
+            cursor.execute('''
+                INSERT INTO scrape_jobs (product, retailer, run_date, max_attempts)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (product, retailer, run_date) DO NOTHING
+            ''', (entry['product'], entry['retailer'], run_date, max_attempts))
+            queued += cursor.rowcount
+    conn.commit()
+    return queued
+
+def claim_jobs(conn, worker, limit=1, lease_seconds=None):
+    """
+    Lease up to `limit` runnable jobs to `worker` and return them as dicts.
+    Runnable means queued and due, or running with an expired lease (its
+    worker died). Jobs whose expired lease used up the last attempt are
+    marked failed instead.
+    """
+    lease_seconds = lease_seconds or LEASE_SECONDS
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            UPDATE scrape_jobs
+            SET status = 'failed', finished_at = now(),
+                last_error = coalesce(last_error, 'lease expired')
+            WHERE status = 'running' AND lease_expires_at <= now()
+              AND attempts >= max_attempts
+        ''')
+        cursor.execute('''
+            WITH next AS (
+                SELECT id FROM scrape_jobs
+                WHERE attempts < max_attempts
+                  AND ((status = 'queued' AND available_at <= now())
+                       OR (status = 'running' AND lease_expires_at <= now()))
+                ORDER BY available_at, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE scrape_jobs j
+            SET status = 'running',
+                attempts = j.attempts + 1,
+                leased_by = %s,
+                lease_expires_at = now() + %s * interval '1 second'
+            FROM next
+            WHERE j.id = next.id
+            RETURNING j.id, j.product, j.retailer, j.run_date, j.attempts, j.max_attempts
+        ''', (limit, worker, lease_seconds))
+        columns = [c[0] for c in cursor.description]
+        jobs = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    conn.commit()
+    return jobs
+
+def extend_lease(conn, job, worker, lease_seconds=None):
+    """Push out the lease on a job this worker still holds. False if it was lost."""
+    lease_seconds = lease_seconds or LEASE_SECONDS
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            UPDATE scrape_jobs SET lease_expires_at = now() + %s * interval '1 second'
+            WHERE id = %s AND status = 'running' AND leased_by = %s
+        ''', (lease_seconds, job['id'], worker))
+        held = cursor.rowcount == 1
+    conn.commit()
+    return held
+
+def _add_result(cursor, job, worker, ok, record=None, error_kind=None, error=None, seconds=None):
+    record = record or {}
+    cursor.execute('''
+        INSERT INTO scrape_results
+            (job_id, attempt, worker, ok, price, price_per_oz, selector, error_kind, error, seconds)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ''', (job['id'], job['attempts'], worker, ok, record.get('price'), record.get('price_per_oz'),
+          record.get('selector'), error_kind, (str(error)[:1000] if error else None), seconds))
+
+def complete_job(cursor, job, worker, record, seconds=None):
+    """
+    Mark a job done and store its result row. Takes a cursor rather than a
+    connection so the caller can commit it together with the price insert.
+    """
+    _add_result(cursor, job, worker, True, record, seconds=seconds)
+    cursor.execute('''
+        UPDATE scrape_jobs
+        SET status = 'done', finished_at = now(), lease_expires_at = NULL, last_error = NULL
+        WHERE id = %s AND leased_by = %s
+    ''', (job['id'], worker))
+
+def fail_job(conn, job, worker, error_kind, error=None, seconds=None, retry=True):
+    """
+    Record a failed attempt. The job goes back on the queue after an
+    exponential backoff, or is marked failed once it is out of attempts.
+    Returns the job's new status.
+    """
+    final = not retry or job['attempts'] >= job['max_attempts']
+    delay = RETRY_DELAY * (2 ** (job['attempts'] - 1))
+    with conn.cursor() as cursor:
+        _add_result(cursor, job, worker, False, error_kind=error_kind, error=error, seconds=seconds)
+        cursor.execute('''
+            UPDATE scrape_jobs
+            SET status = %s,
+                available_at = now() + %s * interval '1 second',
+                finished_at = CASE WHEN %s THEN now() END,
+                lease_expires_at = NULL,
+                last_error = %s
+            WHERE id = %s AND leased_by = %s
+        ''', ('failed' if final else 'queued', delay, final,
+              f"{error_kind}: {error}"[:1000] if error else error_kind, job['id'], worker))
+    conn.commit()
+    return 'failed' if final else 'queued'
+
+def queue_status(conn, run_date=None):
+    """Job counts by status for run_date (default today)."""
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            SELECT status, count(*) FROM scrape_jobs WHERE run_date = %s GROUP BY status
+        ''', (run_date or date.today(),))
+        return dict(cursor.fetchall())
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from catalog import load_catalog
+    from database.connect_db import connect_with_retry
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Scrape job queue: schedule the catalog, show status")
+    sub = parser.add_subparsers(dest="command", required=True)
+    schedule = sub.add_parser("schedule", help="queue one job per catalog entry for today")
+    schedule.add_argument("--catalog", default=None, help="catalog file (default: $CATALOG_PATH or catalog.json)")
+    schedule.add_argument("--max-attempts", type=int, default=None,
+                          help="attempts per job (default: $SCRAPE_JOB_MAX_ATTEMPTS or 3)")
+    sub.add_parser("status", help="job counts by status for today")
+    args = parser.parse_args()
+
+    with connect_with_retry(os.getenv("DATABASE_URL")) as conn:
+        if args.command == "schedule":
+            queued = enqueue_catalog(conn, load_catalog(args.catalog), max_attempts=args.max_attempts)
+            print(f"Queued {queued} scrape jobs.")
+        else:
+            for status, count in sorted(queue_status(conn).items()):
+                print(f"{status:<8} {count}")
@@ -0,0 +1,95 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+from selenium.webdriver.support.ui import WebDriverWait
+
+# JS snippet: number of resources the page has fetched so far
+_RESOURCE_COUNT_JS = "return performance.getEntriesByType('resource').length"
+
+def wait_for_price(driver, locators, timeout=15, poll=0.2):
+    """
+    Wait until any of locators (a list of (By, value) pairs) is present with
+    non-empty text and return that element. Returns as soon as the price can
+    be read instead of sleeping a fixed amount first.
+    Raises selenium's TimeoutException if nothing readable shows up in time.
+    """
+    def readable(d):
+        for by, value in locators:
+            for el in d.find_elements(by, value):
+                if el.text.strip():
+                    return el
+        return False
+
+    return WebDriverWait(driver, timeout, poll_frequency=poll).until(readable)
+
+def wait_for_network_idle(driver, quiet=0.5, timeout=10, poll=0.1):
+    """
+    Wait until the page has finished loading and has not started a new
+    request for `quiet` seconds. Returns the seconds waited; never raises,
+    a page that never goes quiet just uses up the timeout.
+    """
+    start = time.monotonic()
+    last_count = None
+    last_change = start
+    while time.monotonic() - start < timeout:
+        try:
+            state = driver.execute_script("return document.readyState")
+            count = driver.execute_script(_RESOURCE_COUNT_JS)
+        except Exception:
+            break
+        now = time.monotonic()
+        if count != last_count:
+            last_count = count
+            last_change = now
+        elif state == "complete" and now - last_change >= quiet:
+            break
+        time.sleep(poll)
+    return time.monotonic() - start
+
+class DomainRateLimiter:
+    """
+    Token bucket per domain. Each domain gets `burst` requests up front and
+    then one more every `interval` seconds; a throttled request also waits a
+    random extra 0..`jitter` seconds so visits don't land on a fixed beat.
+    Thread-safe, so concurrent workers share the same per-domain budget.
+    """
+
+    def __init__(self, interval=8.0, burst=1, jitter=2.0):
+        self.interval = interval
+        self.burst = burst
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._buckets = {}  # domain -> [tokens, last_refill]
+        self._stats = {}    # domain -> {"requests": n, "throttled_s": seconds}
+
+    def acquire(self, url):
+        """Block until a request to url's domain is allowed. Returns seconds slept."""
+        domain = urlparse(url).netloc or url
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(domain, (float(self.burst), now))
+            if self.interval > 0:
+                tokens = min(float(self.burst), tokens + (now - last) / self.interval)
+            else:
+                tokens = float(self.burst)
+            # reserve a token now (possibly going negative) so concurrent
+            # callers queue up behind each other instead of all waking at once
+            tokens -= 1
+            wait = 0.0
+            if tokens < 0:
+                wait = -tokens * self.interval + random.uniform(0, self.jitter)
+            self._buckets[domain] = [tokens, now]
+            stats = self._stats.setdefault(domain, {"requests": 0, "throttled_s": 0.0})
+            stats["requests"] += 1
+            stats["throttled_s"] += wait
+
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def stats(self):
+        """Per-domain request counts and total seconds spent throttled."""
+        with self._lock:
+            return {d: dict(s) for d, s in self._stats.items()}
@@ -0,0 +1,75 @@
+import json
+import logging
+
+# URL patterns (Network.setBlockedURLs wildcard syntax) grouped by what they
+# load. A retailer's "allow" list in catalog.json names groups or individual
+# patterns to let through when a site needs them to render the price.
+BLOCK_GROUPS = {
+    # trailing * so query strings (image.jpg?w=200) still match
+    "images": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"],
+    "fonts": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "ads": [
+        "*doubleclick.net*", "*googlesyndication.com*", "*googleadservices.com*",
+        "*amazon-adsystem.com*", "*criteo.com*", "*adnxs.com*", "*taboola.com*",
+    ],
+    "analytics": [
+        "*google-analytics.com*", "*googletagmanager.com*", "*hotjar.com*",
+        "*segment.io*", "*segment.com/analytics*", "*optimizely.com*",
+        "*facebook.net*", "*bat.bing.com*", "*tiktok.com/i18n/pixel*",
+    ],
+    # not blocked by default: element text depends on CSS visibility
+    "stylesheets": ["*.css*"],
+}
+DEFAULT_BLOCK = ("images", "media", "fonts", "ads", "analytics")
+
+def blocked_urls(profile=None):
+    """
+    Patterns to block for a retailer's load profile:
+    {"block": [groups or patterns], "allow": [groups or patterns]}.
+    "block" defaults to DEFAULT_BLOCK; "allow" removes from it.
+    """
+    profile = profile or {}
+
+    def expand(names):
+        patterns = []
+        for name in names:
+            patterns.extend(BLOCK_GROUPS.get(name, [name]))
+        return patterns
+
+    allow = set(expand(profile.get("allow", [])))
+    block = expand(profile.get("block", DEFAULT_BLOCK))
+    return [p for p in dict.fromkeys(block) if p not in allow]
+
+def apply_load_profile(driver, profile=None):
+    """Block the profile's URL patterns for subsequent page loads in driver."""
+    urls = blocked_urls(profile)
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": urls})
+    except Exception as e:
+        logging.warning(f"Could not apply resource blocking: {e}")
+
+def drain_transfer_bytes(driver):
+    """
+    Bytes received over the network since the last call, summed from the
+    performance log's Network.loadingFinished events (needs the
+    goog:loggingPrefs performance capability). Falls back to the page's
+    resource timing, which undercounts cross-origin responses.
+    """
+    try:
+        total = 0
+        for entry in driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            if message.get("method") == "Network.loadingFinished":
+                total += message["params"].get("encodedDataLength", 0)
+        return int(total)
+    except Exception:
+        pass
+    try:
+        return int(driver.execute_script(
+            "return performance.getEntriesByType('navigation')"
+            ".concat(performance.getEntriesByType('resource'))"
+            ".reduce((n, e) => n + (e.transferSize || 0), 0)"))
+    except Exception:
+        return None
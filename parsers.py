@@ -0,0 +1,119 @@
+import re
+
+from bs4 import BeautifulSoup
+
+class ParseError(ValueError):
+    """The page was fetched but no price could be read from it."""
+
+class SelectorNotFound(ParseError):
+    """None of the entry's price selectors matched anything on the page."""
+
+def parse_price(text):
+    """Pull the first dollar amount out of a price element's text."""
+    m = re.search(r'(\d[\d,]*(?:\.\d+)?)', text or "")
+    if not m:
+        raise ParseError(f"no price in {text!r}")
+    return float(m.group(1).replace(',', ''))
+
+def build_record(entry, price):
+    """Turn a scraped price into a price record using the entry's pack math."""
+    units = float(entry['pack_count']) * float(entry['unit_size'])
+    if entry.get('price_is_per_unit'):
+        # the page shows a per-unit price (e.g. $/lb); scale it up to the pack
+        price_per_oz = price
+        price = price * units
+    else:
+        price_per_oz = price / units
+
+    return {
+        'product': entry['product'],
+        'company': entry['retailer'],
+        'price': round(price, 2),
+        'price_per_oz': round(price_per_oz, 2),
+        'pack_size': entry['pack_size'],
+        'url': entry['url']
+    }
+
+def _soup(html):
+    return html if isinstance(html, BeautifulSoup) else BeautifulSoup(html, "html.parser")
+
+def selector_chain(entry):
+    """
+    Price selectors to try in order: the entry's "selectors" list if it has
+    one, otherwise "selector" followed by "fallback_selector".
+    """
+    if entry.get('selectors'):
+        return list(entry['selectors'])
+    return [c for c in (entry.get('selector'), entry.get('fallback_selector')) if c]
+
+def _first_text(soup, class_name):
+    """Text of the first element with class_name (like By.CLASS_NAME), or None."""
+    el = soup.find(class_=class_name)
+    if el is None:
+        return None
+    return el.get_text("\n", strip=True)
+
+def _require_text(soup, class_name):
+    text = _first_text(soup, class_name)
+    if not text:
+        raise SelectorNotFound(f"no element with class {class_name}")
+    return text
+
+def _chain_text(soup, entry):
+    """(text, selector) for the first selector in the entry's chain that matches."""
+    chain = selector_chain(entry)
+    for class_name in chain:
+        text = _first_text(soup, class_name)
+        if text:
+            return text, class_name
+    raise SelectorNotFound(f"no element with class {' or '.join(chain)}")
+
+def _with_selector(record, selector):
+    # lets the health store remember which selector in the chain won
+    record['selector'] = selector
+    return record
+
+def parse_chewy(html, entry):
+    soup = _soup(html)
+    text, selector = _chain_text(soup, entry)
+    return _with_selector(build_record(entry, parse_price(text.splitlines()[-1])), selector)
+
+def parse_amazon(html, entry):
+    soup = _soup(html)
+    whole, selector = _chain_text(soup, entry)
+    fraction = _require_text(soup, entry['fraction_selector'])
+    price = int(parse_price(whole)) + int(parse_price(fraction)) * .01
+    return _with_selector(build_record(entry, price), selector)
+
+def parse_petco(html, entry):
+    soup = _soup(html)
+    text, selector = _chain_text(soup, entry)
+    price = parse_price(text)
+    # apply the "XX% off" sale message if the entry tracks one
+    if entry.get('discount_id'):
+        discount = soup.find(id=entry['discount_id'])
+        m = re.search(r'(\d+)%', discount.get_text()) if discount else None
+        if m:
+            price = price * (100 - int(m.group(1))) / 100.0
+    return _with_selector(build_record(entry, price), selector)
+
+def parse_petsmart(html, entry):
+    soup = _soup(html)
+    # the chain puts the sale price before the regular one
+    text, selector = _chain_text(soup, entry)
+    return _with_selector(build_record(entry, parse_price(text)), selector)
+
+# retailer name (as used in catalog.json) -> parser
+PARSERS = {
+    'PetSmart': parse_petsmart,
+    'Petco': parse_petco,
+    'Chewy': parse_chewy,
+    'Amazon': parse_amazon,
+}
+
+def parse_page(html, entry):
+    """Parse a rendered product page into a price record for entry."""
+    parser = PARSERS.get(entry['retailer'])
+    if parser is None:
+        raise ParseError(f"no parser registered for retailer {entry['retailer']}")
+    return parser(html, entry)
@@ -1,66 +1,99 @@
-import psycopg2
-import pandas as pd
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Blueprint, Flask, current_app, render_template, request, jsonify, redirect, url_for, make_response
+from werkzeug.http import is_resource_modified
 import os
 from dotenv import load_dotenv
+import hashlib
 import json
 import time
 from datetime import datetime
-from database.connect_db import connect_with_retry
+from database.pool import get_pool, warm_pool_in_background
+from database.storage import get_storage, PostgresStorage
+import response_cache
+# numpy (and downsample/price_api, which use it) is imported inside the
+# views that need it, so importing this module stays fast
 
 
 load_dotenv()
-url = os.getenv("DATABASE_URL")
-if not url:
-    raise RuntimeError("DATABASE_URL not set in environment")
 BASE_DIR = os.path.dirname(__file__)
-app = Flask(
-    __name__,
-    static_folder=os.path.join(BASE_DIR, "static"),
-    template_folder=os.path.join(BASE_DIR, "templates"),
-)
-print(f"Flask static_folder={app.static_folder}, template_folder={app.template_folder}")
-# ...existing code...
-
-#helper to insert an expense
-# new: helper to insert an expense
-def insert_expense(conn, data):
-    sql = """
-    INSERT INTO expenses
-    (item_name, brand, url, company, item_type, qty, total_before_tax, cashback_pct, cashback_engine, total_after_cashback, date_purchased, notes)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    RETURNING id
+# a deploy changes the pages without changing the data
+RELEASE = os.getenv("RAILWAY_GIT_COMMIT_SHA", "")
+# the chart card's width at the page's max-width; the page sends the real one
+DEFAULT_CHART_WIDTH = 1100
+
+bp = Blueprint("main", __name__)
+
+# set up by create_app
+storage = None
+# dashboard pages and fragments, keyed by the price data version
+page_cache = data_version = None
+
+def create_app(database_url=None, warm=True):
+    """
+    Build the app. Nothing here waits on the database: with warm=True a
+    background thread opens the first pooled connection. Under gunicorn
+    --preload the app is built once in the master and forked, so pass
+    warm=False there and let each worker warm its own pool after the fork
+    (see gunicorn.conf.py).
     """
-    with conn.cursor() as cur:
-        cur.execute(sql, (
-            data.get("item_name"),
-            data.get("brand"),
-            data.get("url"),
-            data.get("company"),
-            data.get("item_type"),
-            data.get("qty") or 1,
-            data.get("total_before_tax"),
-            data.get("cashback_pct"),
-            data.get("cashback_engine"),
-            data.get("total_after_cashback"),
-            data.get("date_purchased"),
-            data.get("notes"),
-        ))
-        inserted_id = cur.fetchone()[0]
-        conn.commit()
-        return inserted_id
-
-@app.route("/health")
+    global storage, page_cache, data_version
+    database_url = database_url or os.getenv("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL not set in environment")
+    app = Flask(
+        __name__,
+        static_folder=os.path.join(BASE_DIR, "static"),
+        template_folder=os.path.join(BASE_DIR, "templates"),
+    )
+    print(f"Flask static_folder={app.static_folder}, template_folder={app.template_folder}")
+
+    storage = get_storage(database_url)
+    page_cache, data_version = response_cache.from_env(storage.data_version)
+    app.register_blueprint(bp)
+    if warm:
+        warm_connections()
+    return app
+
+def warm_connections():
+    """Open this process's first database connection off the request path."""
+    if isinstance(storage, PostgresStorage):
+        warm_pool_in_background(storage.url)
+
+_app = None
+
+def __getattr__(name):
+    # `gunicorn plot:app` and other importers of plot.app get an app built on first use
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@bp.route("/health")
 def health():
     """Health check endpoint for Railway"""
     return jsonify({"status": "ok"}), 200
 
-@app.route("/expenses/new", methods=["GET"])
+@bp.route("/health/db")
+def db_pool_stats():
+    """Connection pool stats for this worker: hits, misses, waits, checkout latency"""
+    if not isinstance(storage, PostgresStorage):
+        return jsonify({"backend": "sqlite", "path": storage.path}), 200
+    return jsonify(get_pool().stats()), 200
+
+@bp.route("/health/cache")
+def cache_stats():
+    """Dashboard cache hits, misses and evictions for this worker"""
+    version, updated_at = data_version.current()
+    return jsonify(dict(page_cache.stats(), data_version=version,
+                        updated_at=updated_at.isoformat() if updated_at else None)), 200
+
+@bp.route("/expenses/new", methods=["GET"])
 def new_expense_form():
     # simple HTML form to add an expense; returns template
     return render_template("new_expense.html")
 
-@app.route("/api/expenses", methods=["POST"])
+@bp.route("/api/expenses", methods=["POST"])
 def create_expense():
     """
     Accepts JSON or form data:
@@ -123,81 +156,85 @@ def create_expense():
     }
 
     try:
-        with connect_with_retry(url) as conn:
-            new_id = insert_expense(conn, expense)
-            print(new_id, "CREATED")
-        app.logger.info(f"Successfully created expense {new_id}")
+        new_id = storage.create_expense(expense)
+        print(new_id, "CREATED")
+        current_app.logger.info(f"Successfully created expense {new_id}")
         if request.is_json:
             return jsonify({"status": "ok", "id": new_id}), 201
         else:
-            return redirect(url_for("list_expenses"))
+            return redirect(url_for("main.list_expenses"))
     except Exception as e:
-        app.logger.exception(f"Failed to create expense: {e}")
+        current_app.logger.exception(f"Failed to create expense: {e}")
         print('FAILED')
         if request.is_json:
              return jsonify({"error": str(e)}), 500
         else:
-             return redirect(url_for("list_expenses"))
+             return redirect(url_for("main.list_expenses"))
+
+EXPENSE_TYPES = ("food", "litter", "toys", "snacks")
+
+def _expense_after(token):
+    """The previous page's "next" token, 'YYYY-MM-DD.id', as a (date, id) key; None if absent or bad."""
+    try:
+        day, expense_id = token.split(".")
+        return datetime.strptime(day, "%Y-%m-%d").date(), int(expense_id)
+    except (AttributeError, ValueError):
+        return None
 
-@app.route("/expenses", methods=["GET"])
+@bp.route("/expenses", methods=["GET"])
 def list_expenses():
-    sql = """
-    SELECT id, item_name, brand, qty, company, item_type,
-           total_before_tax, cashback_pct, cashback_engine,
-           total_after_cashback, date_purchased, notes, created_at
-    FROM expenses
-    ORDER BY COALESCE(date_purchased, created_at) DESC
     """
+    One page of purchases, newest first. Query: item_type, company,
+    start/end (YYYY-MM-DD, both inclusive), after (the "next" token of
+    the page before).
+    """
+    start, end = _date_arg("start"), _date_arg("end")
+    filters = {
+        "item_type": request.args.get("item_type") if request.args.get("item_type") in EXPENSE_TYPES else None,
+        "company": request.args.get("company", "").strip() or None,
+        "start": start.date() if start else None,
+        "end": end.date() if end else None,
+    }
+    after = _expense_after(request.args.get("after"))
     try:
-        with connect_with_retry(url) as conn:
-            with conn.cursor() as cur:
-                cur.execute(sql)
-                cols = [d[0] for d in cur.description]
-                rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+        page = storage.list_expenses(after=after, **filters)
+        companies = storage.expense_companies()
     except Exception as e:
-        rows = []
-        app.logger.error(f"Failed to fetch expenses: {e}")
-
-    return render_template("expenses.html", expenses=rows)
-
-@app.route("/expenses/<int:expense_id>/delete", methods=["POST"])
+        page = {"expenses": [], "next": None, "totals": None}
+        companies = []
+        current_app.logger.error(f"Failed to fetch expenses: {e}")
+
+    # links keep the filters; None values are left out of the query string
+    next_url = None
+    if page["next"]:
+        day, expense_id = page["next"]
+        next_url = url_for("main.list_expenses", after=f"{day.isoformat()}.{expense_id}", **filters)
+    return render_template("expenses.html", expenses=page["expenses"], totals=page["totals"],
+                           filters=filters, item_types=EXPENSE_TYPES, companies=companies,
+                           next_url=next_url, first_url=url_for("main.list_expenses", **filters) if after else None)
+
+@bp.route("/expenses/<int:expense_id>/delete", methods=["POST"])
 def delete_expense(expense_id):
     """Delete an expense and redirect back to the transactions list."""
-    sql = "DELETE FROM expenses WHERE id = %s"
     try:
-        with connect_with_retry(url) as conn:
-            with conn.cursor() as cur:
-                cur.execute(sql, (expense_id,))
-            conn.commit()
+        storage.delete_expense(expense_id)
     except Exception as e:
-        app.logger.error(f"Failed to delete expense {expense_id}: {e}")
+        current_app.logger.error(f"Failed to delete expense {expense_id}: {e}")
         # simple UX: still redirect back to list so user isn't stuck
-    return redirect(url_for("list_expenses"))
+    return redirect(url_for("main.list_expenses"))
 
-@app.route("/expenses/<int:expense_id>/edit", methods=["GET", "POST"])
+@bp.route("/expenses/<int:expense_id>/edit", methods=["GET", "POST"])
 def edit_expense(expense_id):
     """Show edit form (GET) and apply updates (POST) for an expense."""
         
     if request.method == "GET":
-        sql = """
-        SELECT id, item_name, brand, qty, url, company, item_type,
-               total_before_tax, cashback_pct, cashback_engine,
-               total_after_cashback, date_purchased, notes, created_at
-        FROM expenses
-        WHERE id = %s
-        """
         try:
-            with connect_with_retry(url) as conn:
-                with conn.cursor() as cur:
-                    cur.execute(sql, (expense_id,))
-                    row = cur.fetchone()
-                    if not row:
-                        return redirect(url_for("list_expenses"))
-                    cols = [d[0] for d in cur.description]
-                    expense = dict(zip(cols, row))
+            expense = storage.get_expense(expense_id)
         except Exception as e:
-            app.logger.error(f"Failed loading expense {expense_id}: {e}")
-            return redirect(url_for("list_expenses"))
+            current_app.logger.error(f"Failed loading expense {expense_id}: {e}")
+            return redirect(url_for("main.list_expenses"))
+        if not expense:
+            return redirect(url_for("main.list_expenses"))
         return render_template("edit_expense.html", expense=expense)
 
     # POST -> apply update
@@ -230,181 +267,284 @@ def edit_expense(expense_id):
         try:
             date_purchased = datetime.strptime(date_str, "%Y-%m-%d").date()
         except ValueError:
-            return redirect(url_for("edit_expense", expense_id=expense_id))
-
-    update_sql = """
-    UPDATE expenses
-    SET item_name=%s, brand=%s, url=%s, company=%s, item_type=%s, qty=%s,
-        total_before_tax=%s, cashback_pct=%s, cashback_engine=%s,
-        total_after_cashback=%s, date_purchased=%s, notes=%s
-    WHERE id=%s
-    """
-    params = (
-        payload.get("item_name"),
-        payload.get("brand"),
-        payload.get("url"),
-        payload.get("company"),
-        payload.get("item_type") or "food",
-        qty,
-        total_before_tax,
-        cashback_pct,
-        payload.get("cashback_engine"),
-        total_after_cashback,
-        date_purchased,
-        payload.get("notes"),
-        expense_id,
-    )
+            return redirect(url_for("main.edit_expense", expense_id=expense_id))
+
+    expense = {
+        "item_name": payload.get("item_name"),
+        "brand": payload.get("brand"),
+        "url": payload.get("url"),
+        "company": payload.get("company"),
+        "item_type": payload.get("item_type") or "food",
+        "qty": qty,
+        "total_before_tax": total_before_tax,
+        "cashback_pct": cashback_pct,
+        "cashback_engine": payload.get("cashback_engine"),
+        "total_after_cashback": total_after_cashback,
+        "date_purchased": date_purchased,
+        "notes": payload.get("notes"),
+    }
     try:
-        with connect_with_retry(url) as conn:
-            with conn.cursor() as cur:
-                cur.execute(update_sql, params)
-            conn.commit()
+        storage.update_expense(expense_id, expense)
     except Exception as e:
-        app.logger.error(f"Failed updating expense {expense_id}: {e}")
-        return redirect(url_for("edit_expense", expense_id=expense_id))
+        current_app.logger.error(f"Failed updating expense {expense_id}: {e}")
+        return redirect(url_for("main.edit_expense", expense_id=expense_id))
 
-    return redirect(url_for("list_expenses"))
+    return redirect(url_for("main.list_expenses"))
 
-@app.route("/savings")
+@bp.route("/savings")
 def calculate_savings():
     """
-    Calculate total savings by comparing market average vs. purchase average.
+    What each product's purchases cost against what the same ounces would
+    have cost at the product's market average price per oz, from the
+    running totals in the savings ledger (see savings.py).
     """
     try:
-        with connect_with_retry(url) as conn:
-            with conn.cursor() as cur:
-                # Get average market price per oz from price scraping history
-                cur.execute("""
-                    SELECT AVG(price_per_oz) as market_avg
-                    FROM prices
-                    WHERE price_per_oz IS NOT NULL
-                """)
-                market_result = cur.fetchone()
-                market_avg = market_result[0] if market_result and market_result[0] else 0
-
-               # Get your actual purchases for cat food items
-                # SUM(qty) gives total packs purchased
-                cur.execute("""
-                    SELECT 
-                        COUNT(*) as purchase_count,
-                        SUM(total_after_cashback) as total_spent,
-                        AVG(total_after_cashback) as avg_purchase_price,
-                        SUM(qty) as total_packs
-                    FROM expenses
-                    WHERE item_type = 'food' 
-                      AND item_name ILIKE '%nulo%'
-                      AND total_after_cashback IS NOT NULL
-                """)
-                expense_result = cur.fetchone()
-                
-                purchase_count = int(expense_result[0]) if expense_result and expense_result[0] else 0
-                total_spent = float(expense_result[1]) if expense_result and expense_result[1] is not None else 0.0
-                avg_purchase_price = float(expense_result[2]) if expense_result and expense_result[2] is not None else 0.0
-                total_packs = int(expense_result[3]) if expense_result and expense_result[3] else 0
-
-                # assumptions: each pack = 12 cans, each can = 12.5 oz
-                cans_per_pack = 12.0
-                oz_per_can = 12.5
-
-                total_cans = total_packs * cans_per_pack
-                total_oz = total_cans * oz_per_can
-
-                # user's average price per oz across purchases
-                avg_price_per_oz = (total_spent / total_oz) if total_oz > 0 else 0.0
-                
-                # What you WOULD have paid at market average
-                market_cost = total_oz * market_avg
-                
-                # Savings = what you would have paid - what you actually paid
-                savings = market_cost - total_spent
-                savings_pct = (savings / market_cost * 100.0) if market_cost > 0 else 0.0
-
-        return render_template("savings.html", 
-            market_avg=round(market_avg, 3),
-            avg_purchase_price=round(avg_purchase_price, 2),
-            avg_price_per_oz=round(avg_price_per_oz, 3),
+        products = []
+        for row in storage.savings_ledger():
+            market_avg = row["market_sum"] / row["market_count"] if row["market_count"] else 0.0
+            oz, spent = row["oz_bought"], row["spent"]
+            # what you WOULD have paid at market average
+            market_cost = oz * market_avg
+            purchases = row["purchase_count"]
+            products.append({
+                "product": row["product"],
+                "counted": row["counted"],
+                "market_avg": round(market_avg, 3),
+                "avg_price_per_oz": round(spent / oz, 3) if oz > 0 else 0.0,
+                "avg_purchase_price": round(spent / purchases, 2) if purchases else 0.0,
+                "purchase_count": purchases,
+                "total_packs": row["packs_bought"],
+                "total_oz": round(oz, 1),
+                "total_spent": round(spent, 2),
+                "market_cost": round(market_cost, 2),
+                "savings": round(market_cost - spent, 2),
+                "savings_pct": round((market_cost - spent) / market_cost * 100.0, 1) if market_cost > 0 else 0.0,
+            })
+
+        bought = [p for p in products if p["purchase_count"]]
+        total_spent = sum(p["total_spent"] for p in bought)
+        market_cost = sum(p["market_cost"] for p in bought)
+        # savings = what you would have paid - what you actually paid
+        savings = market_cost - total_spent
+        savings_pct = (savings / market_cost * 100.0) if market_cost > 0 else 0.0
+
+        return render_template("savings.html",
+            products=products,
             total_spent=round(total_spent, 2),
             market_cost=round(market_cost, 2),
             savings=round(savings, 2),
             savings_pct=round(savings_pct, 1),
-            purchase_count=purchase_count,
-            total_oz=round(total_oz, 1),
-            total_packs=total_packs
+            purchase_count=sum(p["purchase_count"] for p in bought),
+            products_bought=len(bought),
         )
     except Exception as e:
-        app.logger.error(f"Failed to calculate savings: {e}")
+        current_app.logger.error(f"Failed to calculate savings: {e}")
         return render_template("error.html", message="Could not load savings data", code=500), 500
 
-@app.route("/")
-@app.route("/dashboard")
+def _daily_series(daily):
+    """
+    Per retailer, one point at each day's low and, when it differs, one at
+    its high: the chart of a day that the daily rollup can draw.
+    """
+    import numpy as np
+
+    series = {}
+    for retailer_id in np.unique(daily["retailer_id"]):
+        mask = daily["retailer_id"] == retailer_id
+        days, mins, maxs = (daily[k][mask] for k in ("day", "min_price_per_oz", "max_price_per_oz"))
+        day_of = np.repeat(np.arange(len(days)), np.where(mins != maxs, 2, 1))
+        prices = mins[day_of]
+        high = np.r_[False, day_of[1:] == day_of[:-1]]
+        prices[high] = maxs[day_of[high]]
+        series[retailer_id] = (days[day_of], prices)
+    return series
+
+def _raw_series(points):
+    import numpy as np
+
+    series = {}
+    for retailer_id in np.unique(points["retailer_id"]):
+        mask = points["retailer_id"] == retailer_id
+        series[retailer_id] = (points["date"][mask], points["price_per_oz"][mask])
+    return series
+
+def _traces(product, start, end, width):
+    """
+    Plotly traces JSON for one product: a line per retailer over [start,
+    end), min/max downsampled to what a chart `width` pixels wide can show.
+    Wide ranges, where a bucket spans a day or more, are drawn from each
+    day's low and high in price_daily, so the page never reads raw history
+    it would throw away. Zoomed in past that, the raw points (archive
+    included) are read so intraday moves show.
+    """
+    import numpy as np
+    from downsample import chart_buckets, minmax_indices
+
+    if not product:
+        return "[]"
+    buckets = chart_buckets(width)
+    day = np.timedelta64(1, "D")
+    series = None
+    if start is None or end is None or (end - start).days >= buckets:
+        daily = storage.price_history(product, since=start, until=end)
+        if not len(daily["day"]):
+            return "[]"
+        lo = np.datetime64(start, "s") if start else daily["day"][0]
+        hi = np.datetime64(end, "s") if end else daily["day"][-1] + day
+        if (hi - lo) >= buckets * day:
+            series = _daily_series(daily)
+    if series is None:
+        points = storage.price_points(product, since=start, until=end)
+        if not len(points["date"]):
+            return "[]"
+        lo = np.datetime64(start, "s") if start else points["date"][0]
+        hi = np.datetime64(end, "s") if end else points["date"][-1]
+        series = _raw_series(points)
+    names = storage.retailers()
+    # one bucket grid for every trace, so their points line up
+    lo, hi = lo.astype("int64"), hi.astype("int64")
+
+    traces = []
+    for retailer_id, (dates, prices) in series.items():
+        keep = minmax_indices(dates, prices, buckets, lo, hi)
+        traces.append({
+            "x": np.datetime_as_string(dates[keep], unit="s").tolist(),
+            "y": np.round(prices[keep].astype("float64"), 4).tolist(),
+            "mode": "lines+markers",
+            "name": names.get(int(retailer_id), str(retailer_id)),
+        })
+    traces.sort(key=lambda t: t["name"])
+    return json.dumps(traces)
+
+def _dashboard_page(selected_product, start, end, width, version):
+    products = page_cache.get_or_build(("products", version), storage.products)
+
+    # If no product selected, default to first one
+    if not selected_product or selected_product not in products:
+        selected_product = products[0] if products else None
+
+    traces = page_cache.get_or_build(("traces", version, selected_product, str(start), str(end), width),
+                                     lambda: _traces(selected_product, start, end, width))
+    return render_template("index.html", 
+                         traces=traces,
+                         products=products,
+                         selected_product=selected_product,
+                         start=start.date().isoformat() if start else "",
+                         end=end.date().isoformat() if end else "")
+
+def _date_arg(name):
+    try:
+        return datetime.strptime(request.args.get(name, ""), "%Y-%m-%d")
+    except ValueError:
+        return None
+
+@bp.route("/")
+@bp.route("/dashboard")
 def dashboard():
     # Get selected product from query params (default to first product)
     selected_product = request.args.get("product", None)
-    
+    # optional date range, and the chart's width in pixels (rounded so the cache stays small)
+    start, end = _date_arg("start"), _date_arg("end")
+    width = round(request.args.get("width", DEFAULT_CHART_WIDTH, type=int) or DEFAULT_CHART_WIDTH, -2)
+    view = (selected_product, str(start), str(end), width)
+
     try:
-        with connect_with_retry(url) as pg_conn:
-            # Fetch all available products
-            products_query = """
-                SELECT DISTINCT product
-                FROM prices
-                ORDER BY product
-            """
-            products_df = pd.read_sql(products_query, pg_conn)
-            products = products_df["product"].tolist()
-            
-            # If no product selected, default to first one
-            if not selected_product or selected_product not in products:
-                selected_product = products[0] if products else None
-            
-            # Fetch price data for selected product
-            if selected_product:
-                query = """
-                    SELECT date, company, price_per_oz, product
-                    FROM prices
-                    WHERE product = %s
-                    ORDER BY date
-                """
-                df = pd.read_sql(query, pg_conn, params=(selected_product,))
-            else:
-                df = pd.DataFrame()  # Empty if no products exist
-                
+        version, updated_at = data_version.current()
+        etag = hashlib.sha1(f"{RELEASE}:{version}:{view}".encode()).hexdigest()[:20]
+        if updated_at is not None:
+            updated_at = updated_at.replace(microsecond=0)  # HTTP dates have whole seconds
+        if not is_resource_modified(request.environ, etag=etag, last_modified=updated_at):
+            response = make_response("", 304)
+        else:
+            body = page_cache.get_or_build(("page", RELEASE, version) + view,
+                                           lambda: _dashboard_page(selected_product, start, end, width, version))
+            response = make_response(body)
     except Exception as e:
-        app.logger.error(f"Database connection failed: {e}")
+        current_app.logger.error(f"Database connection failed: {e}")
         return render_template("error.html", 
                              message="Database is starting up, please wait...", 
                              code=503), 503
 
-    # ensure date is datetime and sorted
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values(["company", "date"])
+    response.set_etag(etag)
+    if updated_at is not None:
+        response.last_modified = updated_at
+    response.cache_control.no_cache = True  # always revalidate; a 304 is cheap
+    return response
 
-    traces = []
-    for company, g in df.groupby("company"):
-        traces.append({
-            "x": g["date"].dt.strftime("%Y-%m-%d").tolist(),
-            "y": g["price_per_oz"].tolist(),
-            "mode": "lines+markers",
-            "name": str(company)
-        })
-    
-    return render_template("index.html", 
-                         traces=json.dumps(traces),
-                         products=products,
-                         selected_product=selected_product)
+@bp.route("/api/prices")
+def api_prices():
+    """
+    Price points as columnar JSON (see price_api.py).
+    Query: product (repeatable; default all), company (repeatable),
+    start/end (YYYY-MM-DD or ISO timestamp, end exclusive), limit,
+    after (the previous page's "next") or since (a previous "cursor").
+    """
+    import numpy as np
+    import price_api
+
+    args = request.args
+    try:
+        names = storage.product_names()
+        ids = {name: product_id for product_id, name in names.items()}
+        requested = args.getlist("product")
+        unknown = [p for p in requested if p not in ids]
+        if unknown:
+            return jsonify({"error": f"unknown product: {unknown[0]}"}), 404
+        product_ids = [ids[p] for p in requested] if requested else sorted(names)
+
+        retailers = storage.retailers()
+        companies = args.getlist("company")
+        retailer_ids = [rid for rid, name in retailers.items() if name in companies] if companies else None
+
+        start = price_api.parse_when(args.get("start"), "start")
+        end = price_api.parse_when(args.get("end"), "end")
+        limit = min(max(args.get("limit", price_api.DEFAULT_LIMIT, type=int) or 1, 1), price_api.MAX_LIMIT)
+
+        if args.get("since"):
+            since = args.get("since", type=int)
+            if since is None:
+                raise ValueError("since must be a cursor from a previous response")
+            columns, last_id = price_api.since_page(storage, since, product_ids, retailer_ids, start, end, limit)
+            cursor = last_id if last_id is not None else since
+            next_key, more = None, len(columns["date"]) == limit
+        else:
+            cursor = storage.latest_price_id()  # read first: a point written meanwhile is sent twice, never missed
+            after = price_api.parse_after(args["after"]) if args.get("after") else None
+            columns, next_key = price_api.range_page(storage, product_ids, retailer_ids, start, end, after, limit)
+            more = next_key is not None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Price API query failed: {e}")
+        return jsonify({"error": "database unavailable"}), 503
+
+    meta = {
+        "products": {int(p): names[int(p)] for p in np.unique(columns["product_id"])},
+        "retailers": {int(r): retailers.get(int(r)) for r in np.unique(columns["retailer_id"])},
+        "next": ".".join(map(str, next_key)) if next_key else None,
+        "more": more,
+        "cursor": cursor,
+    }
+    body = price_api.encode(columns, meta)
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        body = price_api.gzipped(body)
+        headers["Content-Encoding"] = "gzip"
+    return current_app.response_class(body, mimetype="application/json", headers=headers)
 
 # Custom error handlers
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(e):
     return render_template("error.html", message="Page not found", code=404), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(e):
     return render_template("error.html", message="Server error — we're working on it!", code=500), 500
 
-@app.errorhandler(503)
+@bp.app_errorhandler(503)
 def service_unavailable(e):
     return render_template("error.html", message="Service starting up, please wait...", code=503), 503
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
+    create_app().run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+Price points for /api/prices as columnar JSON.
+
+A page is one object with a column per field instead of an object per
+point; products and retailers are sent as ids with a name lookup:
+
+    {"products": {"3": "Nulo ..."}, "retailers": {"1": "Chewy"},
+     "count": 2,
+     "columns": {"product_id": [3, 3], "retailer_id": [1, 1],
+                 "date": [1717200000, 1717286400],      # epoch seconds, UTC-naive
+                 "price_per_oz": [0.4736, 0.4612]},
+     "next": "3.1717286400.1",                          # or null on the last page
+     "more": true,
+     "cursor": 300002}
+
+A range read (product, company, start, end) is ordered by product, date
+and retailer and paged by keyset: pass `next` back as `after`. Archived
+history is included. `cursor` is the newest price id when the read
+started. Pass it back as `since` to get only the points written after
+it, in id order. Those pages return the last id sent as `cursor`. Keep
+passing it back while `more` is true.
+
+The body is generated column by column in chunks, and gzipped on the fly
+when the client accepts it, so a large page never exists as one string.
+"""
+import json
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_LIMIT = 5000
+MAX_LIMIT = 50000
+FIELDS = ("product_id", "retailer_id", "date", "price_per_oz")
+CHUNK = 8192  # values serialized per yield
+
+def parse_after(token):
+    """'product_id.epoch.retailer_id' -> tuple of ints."""
+    try:
+        product_id, epoch, retailer_id = (int(p) for p in token.split("."))
+    except (AttributeError, ValueError):
+        raise ValueError("after must be a 'next' token from a previous page")
+    return product_id, epoch, retailer_id
+
+def parse_when(value, name):
+    """YYYY-MM-DD or an ISO timestamp; None when absent."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD or an ISO timestamp")
+
+def _empty_page():
+    return {f: np.empty(0, dtype="int64" if f != "price_per_oz" else "float64") for f in FIELDS}
+
+def range_page(storage, product_ids, retailer_ids=None, start=None, end=None, after=None,
+               limit=DEFAULT_LIMIT):
+    """
+    One keyset page of points ordered by (product_id, date, retailer_id),
+    starting after the `after` key. Returns (columns, next key or None).
+    Each product's points come from storage.product_page(), which seeks to
+    the key and reads at most one row more than the page has room for.
+    """
+    pages, taken, next_key = [], 0, None
+    for product_id in sorted(product_ids):
+        if after and product_id < after[0]:
+            continue
+        room = limit - taken
+        resume = after[1:] if after and product_id == after[0] else None
+        # one extra row says whether this product continues on the next page
+        points = storage.product_page(product_id, start, end, retailer_ids, resume, room + 1)
+        dates = points["date"][:room].astype("int64")
+        retailers = points["retailer_id"][:room].astype("int64")
+        if len(points["date"]) > room:
+            next_key = (product_id, int(dates[-1]), int(retailers[-1]))
+        if len(dates):
+            pages.append({
+                "product_id": np.full(len(dates), product_id, dtype="int64"),
+                "retailer_id": retailers,
+                "date": dates,
+                "price_per_oz": points["price_per_oz"][:room].astype("float64"),
+            })
+            taken += len(dates)
+        if next_key or taken >= limit:
+            if next_key is None and product_id != max(product_ids):
+                last = pages[-1]
+                next_key = (product_id, int(last["date"][-1]), int(last["retailer_id"][-1]))
+            break
+    if not pages:
+        return _empty_page(), None
+    return {f: np.concatenate([p[f] for p in pages]) for f in FIELDS}, next_key
+
+def since_page(storage, after_id, product_ids, retailer_ids=None, start=None, end=None,
+               limit=DEFAULT_LIMIT):
+    """Points written after price id after_id, in id order. Returns (columns, last id or None)."""
+    rows = storage.points_after(after_id, product_ids, retailer_ids, start, end, limit)
+    if not rows["id"]:
+        return _empty_page(), None
+    columns = {
+        "product_id": np.asarray(rows["product_id"], dtype="int64"),
+        "retailer_id": np.asarray(rows["retailer_id"], dtype="int64"),
+        "date": np.asarray(rows["date"], dtype="datetime64[s]").astype("int64"),
+        "price_per_oz": np.asarray(rows["price_per_oz"], dtype="float64"),
+    }
+    return columns, rows["id"][-1]
+
+def _values(column):
+    if column.dtype.kind == "f":
+        column = np.round(column, 4)
+    for i in range(0, len(column), CHUNK):
+        yield ("," if i else "") + json.dumps(column[i:i + CHUNK].tolist())[1:-1]
+
+def encode(columns, meta):
+    """Yield the JSON document for columns plus the meta fields, in pieces."""
+    yield "{" + ", ".join(f"{json.dumps(k)}: {json.dumps(v)}" for k, v in meta.items())
+    yield f', "count": {len(columns["date"])}, "columns": {{'
+    for i, field in enumerate(FIELDS):
+        yield f'{", " if i else ""}"{field}": ['
+        yield from _values(columns[field])
+        yield "]"
+    yield "}}"
+
+def gzipped(pieces, level=6):
+    """Gzip a stream of text pieces incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for piece in pieces:
+        data = compressor.compress(piece.encode())
+        if data:
+            yield data
+    yield compressor.flush()
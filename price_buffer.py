@@ -0,0 +1,179 @@
+import logging
+import os
+import time
+from datetime import date, datetime
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from rollups import upsert_daily
+
+PRICE_COLUMNS = ("product_id", "retailer_id", "date", "price", "price_per_oz")
+
+INSERT_PRICES_SQL = '''
+    INSERT INTO "prices" (product_id, retailer_id, date, price, price_per_oz)
+    VALUES %s
+'''
+
+UPSERT_LISTINGS_SQL = """
+    INSERT INTO listings (product_id, retailer_id, url, pack_size)
+    VALUES %s
+    ON CONFLICT (product_id, retailer_id) DO UPDATE
+    SET url = EXCLUDED.url, pack_size = EXCLUDED.pack_size
+    WHERE (listings.url, listings.pack_size) IS DISTINCT FROM (EXCLUDED.url, EXCLUDED.pack_size)
+"""
+
+def _dimension_ids(cursor, table, names):
+    """name -> id in a products/retailers dimension table, adding missing names."""
+    names = sorted(set(names))
+    cursor.execute(f"INSERT INTO {table} (name) SELECT unnest(%s::text[]) ON CONFLICT (name) DO NOTHING",
+                   (names,))
+    cursor.execute(f"SELECT name, id FROM {table} WHERE name = ANY(%s)", (names,))
+    return dict(cursor.fetchall())
+
+def resolve_listings(cursor, records):
+    """
+    Map each record's product and company names to their dimension ids,
+    creating products and retailers on first sight and keeping the
+    listing's url and pack size current. Returns {(product, company):
+    (product_id, retailer_id)}.
+    """
+    products = _dimension_ids(cursor, "products", [r['product'] for r in records])
+    retailers = _dimension_ids(cursor, "retailers", [r['company'] for r in records])
+    listings = {}
+    for r in records:  # the last record for a pair wins, as it would row by row
+        listings[(products[r['product']], retailers[r['company']])] = (r['url'], r['pack_size'])
+    execute_values(cursor, UPSERT_LISTINGS_SQL,
+                   [(pid, rid, url, pack) for (pid, rid), (url, pack) in listings.items()])
+    return {(r['product'], r['company']): (products[r['product']], retailers[r['company']])
+            for r in records}
+
+def price_rows(cursor, records, now=None):
+    """Slim prices rows, in PRICE_COLUMNS order, for records stamped now."""
+    now = now or datetime.now()
+    ids = resolve_listings(cursor, records)
+    return [ids[(r['product'], r['company'])] + (now, r['price'], r['price_per_oz']) for r in records]
+
+def insert_keyed(cursor, batch):
+    """
+    Insert the (key, scraped_at, record) items of batch whose idempotency
+    key is new in price_ingest_keys (created by migration 0009), with their
+    daily rollups, on cursor (the caller commits).
+    Returns the records actually inserted; a key already written, or
+    repeated within the batch, is skipped.
+    """
+    new_keys = set(k for (k,) in execute_values(
+        cursor,
+        "INSERT INTO price_ingest_keys (key) VALUES %s ON CONFLICT (key) DO NOTHING RETURNING key",
+        [(key,) for key, _, _ in batch],
+        fetch=True,
+    ))
+    fresh = []
+    for key, scraped_at, record in batch:
+        if key in new_keys:
+            new_keys.discard(key)  # a key repeated within the batch is written once
+            fresh.append((scraped_at, record))
+    if fresh:
+        ids = resolve_listings(cursor, [record for _, record in fresh])
+        rows = [ids[(r['product'], r['company'])] + (scraped_at, r['price'], r['price_per_oz'])
+                for scraped_at, r in fresh]
+        execute_values(cursor, INSERT_PRICES_SQL, rows)
+        upsert_daily(cursor, [dict(zip(PRICE_COLUMNS, row)) for row in rows])
+    return [record for _, record in fresh]
+
+def default_run_key():
+    """
+    Identifies one scraper run for idempotency keys: $SCRAPER_RUN_KEY, else
+    the GitHub Actions run id (stable across re-runs of the same workflow
+    run), else today's date, so a retried daily run doesn't double-insert.
+    """
+    return os.getenv("SCRAPER_RUN_KEY") or os.getenv("GITHUB_RUN_ID") or date.today().isoformat()
+
+class PriceWriteBuffer:
+    """
+    Collects price records during a run and writes them in one transaction:
+    the idempotency keys first (ON CONFLICT DO NOTHING), then, with
+    execute_values, only the rows whose key was new (with their product and
+    retailer ids resolved through resolve_listings), and their daily rollups. A flush that fails on
+    the connection is retried (reconnecting with `connect` if the connection
+    is gone); one that fails on the data falls back to row-by-row inserts
+    so a single bad record can't sink the rest.
+    """
+
+    def __init__(self, conn, run_key=None, connect=None, max_rows=500, retries=3, retry_delay=2.0):
+        self.conn = conn
+        self.run_key = run_key or default_run_key()
+        self.connect = connect
+        self.max_rows = max_rows
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.pending = []   # (key, scraped_at, record)
+        self.failed = []    # (record, error) for rows that could not be written
+        self.duplicates = 0
+
+    def key(self, record):
+        return f"{self.run_key}:{record['product']}:{record['company']}"
+
+    def add(self, record, key=None):
+        """Queue one record; flushes automatically once max_rows are pending."""
+        self.pending.append((key or self.key(record), datetime.now(), record))
+        if len(self.pending) >= self.max_rows:
+            return self.flush()
+        return []
+
+    def _write(self, batch):
+        """Write batch in one transaction; returns the records actually inserted."""
+        with self.conn.cursor() as cursor:
+            fresh = insert_keyed(cursor, batch)
+        self.conn.commit()
+        self.duplicates += len(batch) - len(fresh)
+        return fresh
+
+    def _reset_connection(self):
+        try:
+            self.conn.rollback()
+        except psycopg2.Error:
+            pass
+        if self.conn.closed and self.connect is not None:
+            self.conn = self.connect()
+
+    def _write_rows(self, batch):
+        """Fallback: one transaction per row, logging and skipping bad rows."""
+        written = []
+        for item in batch:
+            try:
+                written += self._write([item])
+            except psycopg2.Error as e:
+                self._reset_connection()
+                self.failed.append((item[2], e))
+                logging.error(f"Failed to insert record for {item[2].get('company')}: {e}")
+        return written
+
+    def flush(self):
+        """Write every pending record; returns the records that were newly inserted."""
+        batch, self.pending = self.pending, []
+        if not batch:
+            return []
+        duplicates_before = self.duplicates
+        for attempt in range(self.retries):
+            try:
+                written = self._write(batch)
+                break
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                self._reset_connection()
+                if attempt == self.retries - 1:
+                    logging.error(f"Price flush failed after {self.retries} attempts: {e}")
+                    self.failed += [(record, e) for _, _, record in batch]
+                    return []
+                wait = self.retry_delay * (2 ** attempt)
+                logging.warning(f"Price flush failed ({attempt + 1}/{self.retries}): {e}; retrying in {wait:.0f}s")
+                time.sleep(wait)
+            except psycopg2.Error as e:
+                self._reset_connection()
+                logging.warning(f"Batch insert of {len(batch)} prices failed ({e}); inserting row by row")
+                written = self._write_rows(batch)
+                break
+        duplicates = self.duplicates - duplicates_before
+        logging.info(f"Inserted {len(written)} of {len(batch)} prices"
+                     + (f", skipped {duplicates} already written" if duplicates else ""))
+        return written
@@ -0,0 +1,153 @@
+"""
+Response and fragment cache for the dashboard.
+
+Entries are keyed by the price data version (Storage.data_version(),
+bumped by every scrape that lands), so nothing is ever invalidated by
+hand: a new version simply misses, and the old entries age out of the
+LRU. Each worker keeps a bounded in-process LRU. Set DASHBOARD_CACHE_DIR
+to also share entries between the gunicorn workers on one host, as one
+small file per entry.
+
+The version itself is re-read from the database at most every
+DASHBOARD_VERSION_TTL seconds (default 5), so a repeat view costs a dict
+lookup, not a query.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """A thread-safe dict that drops its least recently used entry past maxsize."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.counters["misses"] += 1
+                return default
+            self.counters["hits"] += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def __len__(self):
+        return len(self._data)
+
+class FileCache:
+    """
+    JSON values in one file per key under directory, shared by every
+    process on the host. Writes go through a temp file and os.replace,
+    so a reader never sees half an entry. Past max_entries the least
+    recently written files are removed.
+    """
+
+    def __init__(self, directory, max_entries=1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + ".json")
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self.prune()
+
+    def prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class ResponseCache:
+    """The per-worker LRU in front of an optional shared FileCache."""
+
+    def __init__(self, maxsize=256, shared_dir=None, shared_entries=1024):
+        self.local = LRUCache(maxsize)
+        self.shared = FileCache(shared_dir, shared_entries) if shared_dir else None
+
+    def get_or_build(self, key, build):
+        """The cached value for key, building and storing it on a miss. Values must be JSON-able."""
+        missing = object()
+        value = self.local.get(key, missing)
+        if value is not missing:
+            return value
+        if self.shared is not None:
+            value = self.shared.get(key, missing)
+            if value is not missing:
+                self.local.set(key, value)
+                return value
+        value = build()
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+        return value
+
+    def stats(self):
+        return dict(self.local.counters, entries=len(self.local), maxsize=self.local.maxsize,
+                    shared=self.shared.directory if self.shared else None)
+
+class VersionClock:
+    """fetch() -> (version, updated_at), re-read at most every ttl seconds."""
+
+    def __init__(self, fetch, ttl=5.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._value = None
+        self._read_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            if self._value is None or time.monotonic() - self._read_at >= self.ttl:
+                self._value = self.fetch()
+                self._read_at = time.monotonic()
+            return self._value
+
+def from_env(fetch_version):
+    """A (ResponseCache, VersionClock) pair configured from the DASHBOARD_* variables."""
+    cache = ResponseCache(
+        maxsize=int(os.getenv("DASHBOARD_CACHE_SIZE", "256")),
+        shared_dir=os.getenv("DASHBOARD_CACHE_DIR") or None,
+        shared_entries=int(os.getenv("DASHBOARD_CACHE_SHARED_SIZE", "1024")),
+    )
+    return cache, VersionClock(fetch_version, float(os.getenv("DASHBOARD_VERSION_TTL", "5")))
@@ -0,0 +1,123 @@
+"""
+Daily price rollups: min, max, avg, last price and sample count per
+product, retailer and day, in the price_daily table (migration 0004,
+keyed by the product and retailer dimension ids since 0005).
+
+upsert_daily() folds new price rows into the rollup and is called on the
+same cursor, in the same transaction, as the raw inserts. backfill()
+rebuilds days from the raw history. Both keep the market side of the
+savings ledger (savings.py) in step, and bump the "prices" row of
+data_versions (migration 0006) in the same transaction, which is what
+tells the dashboard's response cache the data changed:
+
+    python rollups.py backfill [--since YYYY-MM-DD]
+"""
+from psycopg2.extras import execute_values
+
+from savings import ADD_MARKET_SQL, market_totals, rebuild_ledger
+
+UPSERT_SQL = """
+    INSERT INTO price_daily (product_id, retailer_id, day, min_price_per_oz, max_price_per_oz,
+                             sum_price_per_oz, sample_count, last_price, last_price_per_oz, last_at)
+    VALUES %s
+    ON CONFLICT (product_id, retailer_id, day) DO UPDATE SET
+        min_price_per_oz = LEAST(price_daily.min_price_per_oz, EXCLUDED.min_price_per_oz),
+        max_price_per_oz = GREATEST(price_daily.max_price_per_oz, EXCLUDED.max_price_per_oz),
+        sum_price_per_oz = price_daily.sum_price_per_oz + EXCLUDED.sum_price_per_oz,
+        sample_count = price_daily.sample_count + EXCLUDED.sample_count,
+        last_price = CASE WHEN EXCLUDED.last_at >= price_daily.last_at
+                          THEN EXCLUDED.last_price ELSE price_daily.last_price END,
+        last_price_per_oz = CASE WHEN EXCLUDED.last_at >= price_daily.last_at
+                                 THEN EXCLUDED.last_price_per_oz ELSE price_daily.last_price_per_oz END,
+        last_at = GREATEST(price_daily.last_at, EXCLUDED.last_at)
+"""
+
+BACKFILL_SQL = """
+    INSERT INTO price_daily (product_id, retailer_id, day, min_price_per_oz, max_price_per_oz,
+                             sum_price_per_oz, sample_count, last_price, last_price_per_oz, last_at)
+    SELECT product_id, retailer_id, date::date,
+           min(price_per_oz), max(price_per_oz), sum(price_per_oz), count(*),
+           (array_agg(price ORDER BY date DESC))[1],
+           (array_agg(price_per_oz ORDER BY date DESC))[1],
+           max(date)
+    FROM prices
+    WHERE date >= %(since)s
+    GROUP BY product_id, retailer_id, date::date
+    ON CONFLICT (product_id, retailer_id, day) DO UPDATE SET
+        min_price_per_oz = EXCLUDED.min_price_per_oz,
+        max_price_per_oz = EXCLUDED.max_price_per_oz,
+        sum_price_per_oz = EXCLUDED.sum_price_per_oz,
+        sample_count = EXCLUDED.sample_count,
+        last_price = EXCLUDED.last_price,
+        last_price_per_oz = EXCLUDED.last_price_per_oz,
+        last_at = EXCLUDED.last_at
+"""
+
+BUMP_VERSION_SQL = """
+    UPDATE data_versions SET version = version + 1, updated_at = now() WHERE name = 'prices'
+"""
+
+def aggregate_daily(rows):
+    """
+    Pre-aggregate price rows, given as dicts with product_id, retailer_id,
+    date, price and price_per_oz, into one rollup tuple per product,
+    retailer and day, in UPSERT_SQL column order.
+    """
+    days = {}
+    for row in rows:
+        key = (row['product_id'], row['retailer_id'], row['date'].date())
+        ppo = float(row['price_per_oz'])
+        day = days.get(key)
+        if day is None:
+            days[key] = {"min": ppo, "max": ppo, "sum": ppo, "count": 1,
+                         "last_price": float(row['price']), "last_ppo": ppo, "last_at": row['date']}
+            continue
+        day["min"] = min(day["min"], ppo)
+        day["max"] = max(day["max"], ppo)
+        day["sum"] += ppo
+        day["count"] += 1
+        if row['date'] >= day["last_at"]:
+            day["last_price"], day["last_ppo"], day["last_at"] = float(row['price']), ppo, row['date']
+    return [(product_id, retailer_id, d, v["min"], v["max"], v["sum"], v["count"],
+             v["last_price"], v["last_ppo"], v["last_at"])
+            for (product_id, retailer_id, d), v in days.items()]
+
+def upsert_daily(cursor, rows):
+    """
+    Fold price rows into price_daily. Rows are pre-aggregated per day first,
+    since one upsert statement can't touch the same rollup row twice.
+    """
+    days = aggregate_daily(rows)
+    if days:
+        execute_values(cursor, UPSERT_SQL, days)
+        execute_values(cursor, ADD_MARKET_SQL, market_totals(days))
+        cursor.execute(BUMP_VERSION_SQL)
+
+def backfill(conn, since=None):
+    """Recompute every rollup day on or after since (default: all history). Returns the days written."""
+    with conn.cursor() as cursor:
+        cursor.execute(BACKFILL_SQL, {"since": since or "-infinity"})
+        written = cursor.rowcount
+        rebuild_ledger(cursor)
+        cursor.execute(BUMP_VERSION_SQL)
+    conn.commit()
+    return written
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    from dotenv import load_dotenv
+    from database.connect_db import connect_with_retry
+
+    parser = argparse.ArgumentParser(description="Maintain the price_daily rollup table")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="rebuild rollups from the raw prices table")
+    fill.add_argument("--since", default=None, help="only rebuild days on or after YYYY-MM-DD")
+    args = parser.parse_args()
+
+    load_dotenv()
+    conn = connect_with_retry(os.getenv("DATABASE_URL"))
+    try:
+        print(f"Rebuilt {backfill(conn, args.since)} rollup days.")
+    finally:
+        conn.close()
@@ -0,0 +1,158 @@
+"""
+Savings ledger: running totals per product behind the /savings page, in
+the savings_ledger table (migration 0008).
+
+For every product the ledger keeps the market side (the sum and count of
+every scraped price_per_oz) and the purchase side (purchases, packs,
+ounces bought and amount spent). The market side is folded in by
+rollups.upsert_daily() in the same transaction as each price insert. The
+purchase side is adjusted by the storage backends in the same
+transaction as each expense create, edit and delete: the old row is
+taken out and the new one added. /savings then reads one row per product.
+
+Which expenses are purchases of a product, and how many ounces one pack
+holds, comes from the product's "savings" metadata in catalog.json,
+copied into product_savings by sync (every scrape run does this too).
+An expense counts toward the first product, by id, whose expense_pattern
+its item_name matches (ILIKE), and whose item_type matches if one is
+set. Only expenses with a total_after_cashback count. A change of
+metadata rebuilds the ledger, since it changes what past expenses mean:
+
+    python savings.py sync [--catalog catalog.json]
+    python savings.py rebuild
+"""
+from psycopg2.extras import execute_values
+
+ADD_MARKET_SQL = """
+    INSERT INTO savings_ledger AS l (product_id, market_sum, market_count)
+    VALUES %s
+    ON CONFLICT (product_id) DO UPDATE SET
+        market_sum = l.market_sum + EXCLUDED.market_sum,
+        market_count = l.market_count + EXCLUDED.market_count
+"""
+
+# purchase totals per product for the expenses matching {where}
+PURCHASES_SQL = """
+    SELECT s.product_id, count(*) AS purchase_count, sum(coalesce(e.qty, 1)) AS packs_bought,
+           sum(coalesce(e.qty, 1) * s.pack_count * s.unit_size) AS oz_bought,
+           sum(e.total_after_cashback) AS spent
+    FROM expenses e
+    JOIN product_savings s ON s.product_id = (
+        SELECT m.product_id FROM product_savings m
+        WHERE e.item_name ILIKE m.expense_pattern
+          AND (m.item_type IS NULL OR m.item_type = e.item_type)
+        ORDER BY m.product_id
+        LIMIT 1
+    )
+    WHERE e.total_after_cashback IS NOT NULL {where}
+    GROUP BY s.product_id
+"""
+
+# add (sign 1) or take out (sign -1) one expense's purchase
+APPLY_EXPENSE_SQL = """
+    INSERT INTO savings_ledger AS l (product_id, purchase_count, packs_bought, oz_bought, spent)
+    SELECT product_id, %(sign)s * purchase_count, %(sign)s * packs_bought,
+           %(sign)s * oz_bought, %(sign)s * spent
+    FROM ({purchases}) p
+    ON CONFLICT (product_id) DO UPDATE SET
+        purchase_count = l.purchase_count + EXCLUDED.purchase_count,
+        packs_bought = l.packs_bought + EXCLUDED.packs_bought,
+        oz_bought = l.oz_bought + EXCLUDED.oz_bought,
+        spent = l.spent + EXCLUDED.spent
+""".format(purchases=PURCHASES_SQL.format(where="AND e.id = %(id)s"))
+
+# an expense about to be edited or deleted, locked so two edits can't both take out its old values
+LOCK_EXPENSE_SQL = "SELECT 1 FROM expenses WHERE id = %s FOR UPDATE"
+
+REBUILD_SQL = """
+    INSERT INTO savings_ledger (product_id, market_sum, market_count,
+                                purchase_count, packs_bought, oz_bought, spent)
+    SELECT p.id, coalesce(m.market_sum, 0), coalesce(m.market_count, 0),
+           coalesce(b.purchase_count, 0), coalesce(b.packs_bought, 0),
+           coalesce(b.oz_bought, 0), coalesce(b.spent, 0)
+    FROM products p
+    LEFT JOIN (
+        SELECT product_id, sum(sum_price_per_oz) AS market_sum, sum(sample_count) AS market_count
+        FROM price_daily
+        GROUP BY product_id
+    ) m ON m.product_id = p.id
+    LEFT JOIN ({purchases}) b ON b.product_id = p.id
+""".format(purchases=PURCHASES_SQL.format(where=""))
+
+LEDGER_SQL = """
+    SELECT p.name AS product, s.product_id IS NOT NULL AS counted,
+           coalesce(l.market_sum, 0) AS market_sum, coalesce(l.market_count, 0) AS market_count,
+           coalesce(l.purchase_count, 0) AS purchase_count, coalesce(l.packs_bought, 0) AS packs_bought,
+           coalesce(l.oz_bought, 0) AS oz_bought, coalesce(l.spent, 0) AS spent
+    FROM products p
+    LEFT JOIN savings_ledger l ON l.product_id = p.id
+    LEFT JOIN product_savings s ON s.product_id = p.id
+    ORDER BY p.name
+"""
+
+META_COLUMNS = ("expense_pattern", "item_type", "pack_count", "unit_size")
+
+def market_totals(days):
+    """
+    (product_id, sum, count) per product from aggregate_daily() tuples,
+    sorted by product so concurrent writers lock ledger rows in one order.
+    """
+    totals = {}
+    for day in days:
+        total = totals.setdefault(day[0], [0.0, 0])
+        total[0] += day[5]
+        total[1] += day[6]
+    return [(product_id, s, n) for product_id, (s, n) in sorted(totals.items())]
+
+def meta_rows(meta, ids):
+    """{product_id: metadata tuple in META_COLUMNS order} for {product name: metadata}."""
+    return {ids[name]: (m["expense_pattern"], m.get("item_type"), float(m["pack_count"]), float(m["unit_size"]))
+            for name, m in meta.items()}
+
+def rebuild_ledger(cursor):
+    """Recompute every product's ledger row from price_daily and expenses."""
+    # writers of either side wait until the rebuilt totals are committed
+    cursor.execute("LOCK TABLE savings_ledger IN EXCLUSIVE MODE")
+    cursor.execute("DELETE FROM savings_ledger")
+    cursor.execute(REBUILD_SQL)
+
+def sync_meta(cursor, meta):
+    """
+    Make product_savings match {product name: savings metadata}, adding
+    products not seen yet, and rebuild the ledger if anything changed.
+    Returns whether it did.
+    """
+    from price_buffer import _dimension_ids
+    ids = _dimension_ids(cursor, "products", list(meta)) if meta else {}
+    wanted = meta_rows(meta, ids)
+    cursor.execute(f"SELECT product_id, {', '.join(META_COLUMNS)} FROM product_savings")
+    if {row[0]: tuple(row[1:]) for row in cursor.fetchall()} == wanted:
+        return False
+    cursor.execute("DELETE FROM product_savings")
+    if wanted:
+        execute_values(cursor, f"INSERT INTO product_savings (product_id, {', '.join(META_COLUMNS)}) VALUES %s",
+                       [(product_id,) + row for product_id, row in wanted.items()])
+    rebuild_ledger(cursor)
+    return True
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from catalog import load_catalog, savings_meta
+    from database.storage import get_storage
+
+    parser = argparse.ArgumentParser(description="Maintain the per-product savings ledger")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync = sub.add_parser("sync", help="load savings metadata from the catalog, rebuilding the ledger if it changed")
+    sync.add_argument("--catalog", default=None, help="catalog file (default catalog.json)")
+    sub.add_parser("rebuild", help="recompute the ledger from price_daily and expenses")
+    args = parser.parse_args()
+
+    load_dotenv()
+    storage = get_storage()
+    if args.command == "sync":
+        changed = storage.sync_savings_meta(savings_meta(load_catalog(args.catalog)))
+        print("Savings metadata updated; ledger rebuilt." if changed else "Savings metadata unchanged.")
+    else:
+        storage.rebuild_savings()
+        print("Savings ledger rebuilt.")
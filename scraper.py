@@ -1,16 +1,30 @@
-import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import logging
-import time, random, subprocess, os, re
+import time, os, threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import psycopg2
 from pathlib import Path
 from dotenv import load_dotenv
 from psycopg2 import OperationalError
 from database.connect_db import connect_with_retry
 from send_email import send_price_alert
+from catalog import load_catalog, group_by_retailer, savings_meta
+from pacing import DomainRateLimiter, wait_for_price, wait_for_network_idle
+from http_fetch import fetch_price_http, http_eligible
+from browser import BrowserManager
+from page_profile import apply_load_profile, drain_transfer_bytes
+from parsers import parse_page, build_record, selector_chain
+from health import HealthStore, classify_failure, PROBE, SKIP
+from corpus import save_fixture
+from instrumentation import RunMetrics
+from cdp_engine import scrape_catalog
+from database.storage import get_storage, PostgresStorage
+from database.pool import warm_pool_in_background
+from price_buffer import insert_keyed
+from job_queue import claim_jobs, complete_job, extend_lease, fail_job, worker_id
 
 # Load .env from the script's directory
 dotenv_path = Path(__file__).parent / ".env"
@@ -25,243 +39,395 @@ logging.basicConfig(
     filemode='a'
 )
 
-def get_chrome_major_version():
-    """Return installed Chrome major version (int) or None if not found."""
-    candidates = [
-        "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
-        "/Applications/Google Chrome Beta.app/Contents/MacOS/Google Chrome Beta",
-        "/Applications/Google Chrome Canary.app/Contents/MacOS/Google Chrome Canary",
-    ]
-    for exe in candidates:
-        if os.path.exists(exe):
-            try:
-                out = subprocess.check_output([exe, "--version"], stderr=subprocess.STDOUT).decode()
-                m = re.search(r'(\d+)\.', out)
-                if m:
-                    return int(m.group(1))
-            except Exception:
-                continue
+# Politeness: space out requests to the same retailer. Latency is handled
+# separately by wait_for_price, which returns as soon as the price renders.
+rate_limiter = DomainRateLimiter(
+    interval=float(os.getenv("SCRAPER_DOMAIN_INTERVAL", "8")),
+    burst=int(os.getenv("SCRAPER_DOMAIN_BURST", "1")),
+    jitter=float(os.getenv("SCRAPER_DOMAIN_JITTER", "2")),
+)
+PRICE_TIMEOUT = float(os.getenv("SCRAPER_PRICE_TIMEOUT", "15"))
+PROBE_TIMEOUT = float(os.getenv("SCRAPER_PROBE_TIMEOUT", "3"))
 
-    # fallback to commands on PATH
-    for cmd in (["google-chrome", "--version"], ["chrome", "--version"], ["chromium", "--version"], ["chromium-browser", "--version"]):
-        try:
-            out = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode()
-            m = re.search(r'(\d+)\.', out)
-            if m:
-                return int(m.group(1))
-        except Exception:
-            continue
+# per-retailer failure tracking and circuit breaker, persisted between runs
+health = HealthStore()
 
-    return None
+# bytes fetched and time to price for every browser page this run
+page_stats = []
 
-def scrape_chewy(driver):
-    url = 'https://www.chewy.com/nulo-freestyle-turkey-chicken-recipe/dp/168510'
-    try:
-        driver.get(url)
-        time.sleep(random.uniform(6.0, 10.0))
-        sale_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,"styles_priceNoDeal__JGk8L")))
-        if not sale_price:
-            logging.warning(f"No price found on Chewy page:")
-            return None
-        price = sale_price.text.splitlines()[-1].replace('$', '').strip()
-        pack_size = "12 cans"
-        unit_oz = 12.5
-        price_per_oz = (float(price) / 12.0) / unit_oz
-
-        return {
-            'company': 'Chewy',
-            'price': price,
-            'price_per_oz': round(price_per_oz, 2),
-            'pack_size': pack_size,
-            'url': url
-        }
-    except Exception as e:
-        logging.error(f"Failed to scrape from chewy: {e}")
-        return None
+# per-stage timings for the current run; replaced at the start of run_scraper
+run_metrics = RunMetrics()
 
-def scrape_amazon(driver):
-    url = 'https://www.amazon.com/Nulo-Turkey-Chicken-Canned-Ounce/dp/B06WV774HB'
-    try:
-        driver.get(url)
-        time.sleep(random.uniform(6.0, 10.0))
-        whole_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,"a-price-whole")))
-        fraction_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,"a-price-fraction")))
-
-        if not whole_price or not fraction_price:
-            logging.error(f"Failed to scrape from Amazon:")
-
-        price = int(whole_price.text) + (int(fraction_price.text) * .01)
-        pack_size = "12 cans"
-        unit_oz = 12.5
-        price_per_oz = (price / 12) / unit_oz
-
-        return {
-            'company': 'Amazon',
-            'price': price,
-            'price_per_oz': round(price_per_oz, 2),
-            'pack_size': pack_size,
-            'url': url
-        }
+def timed(stage, entry=None):
+    """Time a block as `stage` for the entry's retailer and product."""
+    if entry is None:
+        return run_metrics.stage(stage)
+    return run_metrics.stage(stage, entry['retailer'], entry['product'])
 
-    except Exception as e:
-        logging.error(f"Failed to scrape from amazon: {e}")
-        return None
+# record mode: save every rendered page into this fixtures directory
+RECORD_DIR = os.getenv("SCRAPER_RECORD_DIR")
 
-def scrape_petco(driver):
-    url = 'https://www.petco.com/shop/en/petcostore/product/nulo-medalseries-grain-free-turkey-and-chicken-wet-cat-food'
+def record_fixture(entry, html, record):
+    """Save a rendered page (and what was parsed from it) to the fixture corpus."""
     try:
-        driver.get(url)
-        time.sleep(random.uniform(6.0, 10.0))
-        # sale_price = WebDriverWait(driver, 10).until(
-        #     EC.presence_of_element_located((By.CLASS_NAME,"purchase-type-selector-styled__PurchaseTypePrice-sc-663c57fc-1")))
-        sale_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,"purchase-type-selector-styled__PurchaseTypePrice-sc-7a1b7620-1")))
-        discount_elems = driver.find_elements(By.ID, "sale-message-red")
-        discount = discount_elems[0] if discount_elems else None
-
-        if not sale_price:
-            logging.warning(f"No price found on Petco page:")
-            return None
-        # parse discount if present (look for "XX%")
-        percent_off = None
-        if discount:
-            discount_text = discount.text
-            m = re.search(r'(\d+)%', discount_text)
-            if m:
-                try:
-                    percent_off = int(m.group(1))
-                except ValueError:
-                    percent_off = None
-
-        if percent_off is not None:
-            logging.info(f"Petco discount: {percent_off}%")
-
-        price_clean = float(sale_price.text.replace('$','').strip())
-        # apply discount if any
-        if percent_off:
-            price_clean = price_clean * (100 - percent_off) / 100.0
-
-        pack_size = "12 cans"
-        unit_oz = 12.5
-        price_per_oz = (price_clean / 12) / unit_oz
-
-        return {
-            'company': 'Petco',
-            'price': price_clean,
-            'price_per_oz': round(price_per_oz, 2),
-            'pack_size': pack_size,
-            'url': url
-        }
+        path = save_fixture(RECORD_DIR, entry, html, record)
+        logging.info(f"Recorded fixture {path}")
+    except OSError as e:
+        logging.warning(f"Could not record fixture for {entry['retailer']}: {e}")
 
-    except Exception as e:
-        logging.error(f"Failed to scrape from Petco: {e}")
-        return None
+# try a plain GET for structured price data before starting the browser
+HTTP_TIER = os.getenv("SCRAPER_HTTP_TIER", "1") != "0"
 
-def scrape_petsmart(driver):
-    url = 'https://www.petsmart.com/cat/food-and-treats/wet-food/nulo-medalseries--all-life-stages-wet-cat-food---grain-free-no-corn-wheat-and-soy-125-oz-36959.html'
-    try:
-        driver.get(url)
-        time.sleep(random.uniform(6.0, 10.0))
-        sale_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,"sparky-c-price--sale")))
-        og_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,"sparky-c-price")))
-        price_str = sale_price.text if sale_price else og_price.text if og_price else None
-
-        if not price_str:
-            logging.warning(f"No price found on Petsmart page")
-            return None
-
-        price_clean = float(price_str.replace('$', '').strip())
-
-        pack_size = "1 can"
-        unit_oz = 12.5
-        price_per_oz = price_clean / unit_oz
-
-        return {
-            'company': 'PetSmart',
-            'price': price_clean,
-            'price_per_oz': round(price_per_oz, 2),
-            'pack_size': pack_size,
-            'url': url
-        }
+# per-thread timing (and failure kind) of the page currently loading in this worker's driver
+_page = threading.local()
 
-    except Exception as e:
-        logging.error(f"Failed to scrape from Petsmart: {e}")
+def throttle(entry):
+    """
+    Wait for the retailer's rate limit. scrape_group calls this once per
+    entry, so a page the HTTP tier fetched and the browser then reloads
+    pays the per-domain delay only once.
+    """
+    url = entry['url']
+    throttled = rate_limiter.acquire(url)
+    if throttled:
+        run_metrics.record("throttle", throttled, entry['retailer'], entry['product'])
+        logging.info(f"Throttled {throttled:.1f}s before {url}")
+
+def open_page(driver, entry):
+    """Load the entry's page in driver with the retailer's resource blocking applied."""
+    apply_load_profile(driver, entry.get('load_profile'))
+    drain_transfer_bytes(driver)  # discard bytes from earlier pages
+    _page.started = time.monotonic()
+    with timed("driver_get", entry):
+        driver.get(entry['url'])
+
+# The scrape_* functions only drive the browser until the price has rendered;
+# reading the price out of the page is done by the pure parsers in parsers.py.
+# They raise on failure so scrape_entry can classify it for the health store.
+
+def _price_locators(entry):
+    return [(By.CLASS_NAME, c) for c in selector_chain(entry)]
+
+def _timeout(entry):
+    # circuit probes pass a short timeout; normal scrapes use PRICE_TIMEOUT
+    return entry.get('timeout', PRICE_TIMEOUT)
+
+def scrape_chewy(driver, entry):
+    open_page(driver, entry)
+    with timed("wait_for_element", entry):
+        wait_for_price(driver, _price_locators(entry), _timeout(entry))
+    with timed("parse", entry):
+        return parse_page(driver.page_source, entry)
+
+def scrape_amazon(driver, entry):
+    open_page(driver, entry)
+    with timed("wait_for_element", entry):
+        wait_for_price(driver, _price_locators(entry), _timeout(entry))
+        # the fraction renders with the whole part, so no second full wait
+        wait_for_price(driver, [(By.CLASS_NAME, entry['fraction_selector'])], 2)
+    with timed("parse", entry):
+        return parse_page(driver.page_source, entry)
+
+def scrape_petco(driver, entry):
+    open_page(driver, entry)
+    with timed("wait_for_element", entry):
+        wait_for_price(driver, _price_locators(entry), _timeout(entry))
+    with timed("parse", entry):
+        return parse_page(driver.page_source, entry)
+
+def scrape_petsmart(driver, entry):
+    open_page(driver, entry)
+    with timed("wait_for_element", entry):
+        if entry.get('size_option'):
+            size_radio = WebDriverWait(driver, _timeout(entry)).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, f"input[name='size'][value='{entry['size_option']}']")))
+            driver.execute_script("arguments[0].click();", size_radio)
+            wait_for_network_idle(driver)  # let the price update for the new size
+        wait_for_price(driver, _price_locators(entry), _timeout(entry))
+    with timed("parse", entry):
+        return parse_page(driver.page_source, entry)
+
+# retailer name (as used in catalog.json) -> scraper
+RETAILER_SCRAPERS = {
+    'PetSmart': scrape_petsmart,
+    'Petco': scrape_petco,
+    'Chewy': scrape_chewy,
+    'Amazon': scrape_amazon,
+}
+
+def _page_source(driver):
+    try:
+        return driver.page_source
+    except Exception:
         return None
 
-def insert_price_record(cursor, product_data):
+def scrape_entry(driver, entry):
+    """
+    Scrape one entry in the browser. Returns the record, or None after
+    logging the failure and recording it (classified) in the health store.
     """
-    Insert a new price record into the database.
+    scrape = RETAILER_SCRAPERS.get(entry['retailer'])
+    if scrape is None:
+        logging.error(f"No scraper registered for retailer {entry['retailer']}")
+        return None
+    _page.started = None
+    try:
+        record = scrape(driver, entry)
+    except Exception as e:
+        kind = classify_failure(e, _page_source(driver), entry)
+        health.record_failure(entry, kind, e)
+        _page.failure = (kind, e)
+        logging.error(f"Failed to scrape {entry['product']} from {entry['retailer']} ({kind}): {e}")
+        record = None
+    else:
+        health.record_success(entry, record.get('selector'))
+    if RECORD_DIR and _page.started is not None:
+        # save failures too: a fixture of a page whose selector broke is
+        # exactly what the offline parser bench needs to catch it (unless
+        # the driver died with it and there is no page to save)
+        html = _page_source(driver)
+        if html is not None:
+            record_fixture(entry, html, record)
+    if _page.started is not None:
+        time_to_price = time.monotonic() - _page.started
+        fetched = drain_transfer_bytes(driver)
+        page_stats.append({
+            'retailer': entry['retailer'],
+            'product': entry['product'],
+            'ok': record is not None,
+            'time_to_price_s': round(time_to_price, 3),
+            'bytes': fetched,
+        })
+        size = f"{fetched / 1024:.0f} KB" if fetched is not None else "unknown size"
+        logging.info(f"{entry['retailer']} page: {size}, price after {time_to_price:.2f}s")
+    return record
+
+def insert_price_record(cursor, product_data, key):
+    """
+    Insert a new price record into the database and fold it into the day's
+    rollup in price_daily, on the same cursor (so the same transaction),
+    unless a price with the same idempotency key was already written.
+    Returns whether it was inserted. Errors propagate to the caller, which
+    rolls the transaction back.
     product_data should be a dict or object with:
     product, company, url, price, price_per_oz, pack_size
     """
-    product = "Nulo Turkey and Chicken Pate Canned Cat Food"
-    try:
-        cursor.execute(
-            '''
-            INSERT INTO "prices" (product, company, url, date, price, price_per_oz, pack_size)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ''',
-            (
-                product,
-                product_data['company'],
-                product_data['url'],
-                datetime.now(),
-                product_data['price'],
-                product_data['price_per_oz'],
-                product_data['pack_size'],
-            )
-        )
+    inserted = bool(insert_keyed(cursor, [(key, datetime.now(), product_data)]))
+    if inserted:
         logging.info(f"Inserted {product_data['company']} at {product_data['price']}")
-    except Exception as e:
-        logging.error(f"Failed to insert record for {product_data.get('company')}: {e}")
+    else:
+        logging.info(f"{product_data['company']} price under {key} already written, skipped")
+    return inserted
 
 
-def run_scraper():
-    options = uc.ChromeOptions()
-    options.add_argument("--incognito")
-    options.add_argument(
-    "user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/142.0.0.0 Safari/537.36")
-    # options.add_argument("--headless=new")  # modern headless mode
+def build_driver(slot=0):
+    """Start (or attach to) the Chrome session for a worker slot."""
+    with timed("driver_startup"):
+        return BrowserManager(slot=slot).start()
 
+def quit_driver(driver):
+    if driver:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+def scrape_http(entry):
+    """HTTP tier: price from a plain GET of the page's structured data, or None."""
+    if not HTTP_TIER or not http_eligible(entry):
+        return None
+    with timed("http_fetch", entry):
+        price = fetch_price_http(entry)
+    if price is None:
+        return None
+    # structured data carries the pack price even where the page shows $/unit
+    return build_record(dict(entry, price_is_per_unit=False), price)
+
+def scrape_group(entries, get_driver):
+    """
+    Scrape entries in order, trying the HTTP tier first and escalating to the
+    browser only when it can't produce a price. get_driver is called lazily,
+    so a group served entirely over HTTP never starts Chrome. Retailers with
+    an open circuit get one short probe and are skipped if it fails.
+    Returns a list of (entry, record) pairs.
+    """
+    results = []
+    for entry in entries:
+        try:
+            record, tier, throttled = None, "http", False
+            if HTTP_TIER and http_eligible(entry):
+                throttle(entry)
+                record, throttled = scrape_http(entry), True
+            if record is None:
+                gate = health.gate(entry['retailer'])
+                if gate == SKIP:
+                    logging.info(f"Skipping {entry['retailer']} {entry['product']}: circuit open")
+                    _page.failure = ("circuit_open", None)
+                    results.append((entry, None))
+                    continue
+                if gate == PROBE:
+                    logging.info(f"Probing {entry['retailer']} with {PROBE_TIMEOUT:.0f}s timeout: circuit open")
+                    entry = dict(entry, timeout=PROBE_TIMEOUT)
+                if not throttled:
+                    throttle(entry)
+                record, tier = scrape_entry(get_driver(), entry), "browser"
+            logging.info(f"{entry['retailer']} {entry['product']} served by {tier} tier")
+            results.append((entry, record))
+        except Exception as e:
+            logging.warning(f"{entry['retailer']} {entry['product']} failed {e}")
+            _page.failure = ("error", e)
+            results.append((entry, None))
+    return results
+
+def scrape_sequential(groups):
+    """Run every catalog entry through at most one driver, one page at a time."""
     driver = None
-    url = os.getenv("DATABASE_URL")
 
-    # detect Chrome major version and pass version_main when available
-    version_main = get_chrome_major_version()
+    def get_driver():
+        nonlocal driver
+        if driver is None:
+            driver = build_driver()
+        return driver
+
     try:
-        if version_main:
-            logging.info(f"Detected Chrome major version: {version_main}")
-            driver = uc.Chrome(options=options, version_main=version_main)
-        else:
-            driver = uc.Chrome(options=options)
-    except Exception as e:
-        logging.warning(f"Failed creating Chrome with version_main={version_main}: {e}; retrying without version_main")
-        driver = uc.Chrome(options=options)
+        for entries in groups.values():
+            yield from scrape_group(entries, get_driver)
+    finally:
+        quit_driver(driver)
+
+def scrape_concurrently(groups, workers):
+    """
+    Fan retailer groups out over a pool of worker threads. Each worker owns
+    its own Chrome session (created lazily the first time a page needs the
+    browser) and walks every page of one retailer on it, so pages from the
+    same site share a warm session while different retailers load in parallel.
+    Yields (entry, record) pairs as retailers complete.
+    """
+    local = threading.local()
+    drivers = []
+    drivers_lock = threading.Lock()
+
+    def get_driver():
+        driver = getattr(local, "driver", None)
+        if driver is None:
+            # each worker gets its own slot, i.e. its own profile directory
+            with drivers_lock:
+                slot = len(drivers)
+                drivers.append(None)
+            driver = build_driver(slot)
+            local.driver = driver
+            with drivers_lock:
+                drivers[slot] = driver
+        return driver
 
     try:
-        pg_conn = connect_with_retry(url)
-        with pg_conn.cursor() as pg_cursor:
-            for scrape in [scrape_petsmart, scrape_petco, scrape_chewy, scrape_amazon]:
-            # for scrape in [scrape_petco]:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scraper") as pool:
+            futures = {pool.submit(scrape_group, entries, get_driver): retailer
+                       for retailer, entries in groups.items()}
+            for future in as_completed(futures):
                 try:
-                    record = scrape(driver)
-                    if record:
-                        insert_price_record(pg_cursor,record)
-                        pg_conn.commit()
-                        if float(record['price_per_oz']) <= .20:
-                            send_price_alert("Nulo Pet Food", record['price_per_oz'], email, record["url"])
-                            logging.info("Email sent!")
-
+                    yield from future.result()
                 except Exception as e:
-                    pg_conn.rollback()
-                    logging.warning(f"{scrape} failed {e}")
+                    logging.warning(f"{futures[future]} failed {e}")
+    finally:
+        for driver in drivers:
+            quit_driver(driver)
+
+def save_record(pg_conn, pg_cursor, entry, record, key, in_transaction=None):
+    """
+    Insert one scraped record under idempotency key `key`, commit it and
+    send an alert if it is a new deal. in_transaction(cursor), if given,
+    runs before the commit so its writes land atomically with the price.
+    Returns whether the commit went through.
+    """
+    try:
+        with timed("insert_price_record", entry):
+            inserted = insert_price_record(pg_cursor, record, key)
+        if in_transaction is not None:
+            in_transaction(pg_cursor)
+        with timed("commit", entry):
+            pg_conn.commit()
+    except Exception as e:
+        pg_conn.rollback()
+        logging.warning(f"Saving {record.get('company')} failed {e}")
+        return False
+    if inserted:
+        alert_if_deal(entry, record)
+    return True
+
+def alert_if_deal(entry, record):
+    """Email a price alert if the record is at or below the entry's threshold."""
+    threshold = entry.get('alert_price_per_oz')
+    if threshold is not None and float(record['price_per_oz']) <= threshold:
+        try:
+            with timed("send_price_alert", entry):
+                send_price_alert(entry['alert_name'], record['price_per_oz'], email, record["url"])
+            logging.info("Email sent!")
+        except Exception as e:
+            logging.warning(f"Price alert for {record.get('company')} failed {e}")
+
+def run_scraper(workers=None, catalog_path=None, engine=None, tabs=None):
+    """
+    Scrape every catalog entry and store the results.
+    workers: number of concurrent browser workers (defaults to the
+    SCRAPER_WORKERS env var, or 1 for a single driver covering the whole catalog).
+    catalog_path: catalog file to load (defaults to catalog.json).
+    engine: "selenium" (default, $SCRAPER_ENGINE) or "cdp" for one headless
+    browser driving up to `tabs` ($SCRAPER_TABS, default 5) tabs at once.
+    """
+    global run_metrics, health
+    run_metrics = RunMetrics()
+    health = HealthStore()
+    page_stats.clear()
+    catalog = load_catalog(catalog_path)
+    groups = group_by_retailer(catalog)
+    engine = engine or os.getenv("SCRAPER_ENGINE", "selenium")
+    if workers is None:
+        workers = int(os.getenv("SCRAPER_WORKERS", "1"))
+    workers = max(1, min(workers, len(groups)))
+    if tabs is None:
+        tabs = int(os.getenv("SCRAPER_TABS", "5"))
+    url = os.getenv("DATABASE_URL")
+
+    try:
+        storage = get_storage(url)
+        if isinstance(storage, PostgresStorage):
+            # wake a cold database while the browsers work
+            warm_pool_in_background(url)
+        start = time.monotonic()
+        if engine == "cdp":
+            entries = [entry for group in groups.values() for entry in group]
+            logging.info(f"Scraping {len(entries)} pages in one browser with up to {tabs} tabs")
+            results = scrape_catalog(entries, max(1, tabs), limiter=rate_limiter,
+                                     http_first=scrape_http, timeout=PRICE_TIMEOUT,
+                                     metrics=run_metrics, health=health,
+                                     probe_timeout=PROBE_TIMEOUT, page_stats=page_stats,
+                                     record_fixture=record_fixture if RECORD_DIR else None)
+        elif workers > 1:
+            logging.info(f"Scraping {len(groups)} retailers with {workers} workers")
+            results = scrape_concurrently(groups, workers)
+        else:
+            results = scrape_sequential(groups)
+        # which expenses /savings counts, and their pack sizes, follow the catalog
+        if storage.sync_savings_meta(savings_meta(catalog)):
+            logging.info("Savings metadata changed; ledger rebuilt")
+        # one batched transaction for the whole run instead of a commit per price
+        scraped = [(entry, record) for entry, record in results if record]
+        with timed("flush_prices"):
+            written = storage.insert_prices([record for _, record in scraped])
+        # alert only on newly written prices, so a retried run doesn't email twice
+        written_ids = {id(record) for record in written}
+        for entry, record in scraped:
+            if id(record) in written_ids:
+                alert_if_deal(entry, record)
+        logging.info(f"Scrape run finished in {time.monotonic() - start:.1f}s")
+        for domain, stats in rate_limiter.stats().items():
+            logging.info(f"Rate limiter {domain}: {stats['requests']} requests, throttled {stats['throttled_s']:.1f}s")
+        if page_stats:
+            total_bytes = sum(p['bytes'] or 0 for p in page_stats)
+            avg_ttp = sum(p['time_to_price_s'] for p in page_stats) / len(page_stats)
+            logging.info(f"Browser pages: {len(page_stats)}, {total_bytes / 1024:.0f} KB fetched, "
+                         f"avg time to price {avg_ttp:.2f}s")
 
     except psycopg2.OperationalError as e:
         print(f"Error connecting to PostgreSQL: {e}")
@@ -271,12 +437,110 @@ def run_scraper():
         print(f"Error : {e}")
 
     finally:
-        if driver:
-            try:
-                driver.quit()
-            except Exception:
-                pass
+        health.save()
+        summary = run_metrics.write()
+        stage_times = ", ".join(f"{k}={v['sum']:.1f}s" for k, v in summary['stages'].items())
+        logging.info(f"Run metrics: {summary['run_seconds']:.1f}s total ({stage_times})")
+
+def run_job(pg_conn, job, entry, worker, get_driver):
+    """Scrape one claimed queue job, store its price and settle the job."""
+    if entry is None:
+        fail_job(pg_conn, job, worker, "unknown_entry", "not in the catalog", retry=False)
+        logging.warning(f"Job {job['id']}: {job['retailer']} {job['product']} is not in the catalog")
+        return
+    started = time.monotonic()
+    _page.failure = None
+    [(entry, record)] = scrape_group([entry], get_driver)
+    seconds = round(time.monotonic() - started, 3)
+    if record is None:
+        kind, error = _page.failure or ("error", "no price")
+        status = fail_job(pg_conn, job, worker, kind, error, seconds)
+        logging.warning(f"Job {job['id']} attempt {job['attempts']} failed ({kind}), now {status}")
+        return
+    # keyed by job, so a retry of a job whose price did get written (say,
+    # after its lease ran out mid-commit) doesn't insert it twice
+    key = f"job-{job['id']}:{record['product']}:{record['company']}"
+    with pg_conn.cursor() as pg_cursor:
+        saved = save_record(pg_conn, pg_cursor, entry, record, key,
+                            lambda cursor: complete_job(cursor, job, worker, record, seconds))
+    if not saved:
+        fail_job(pg_conn, job, worker, "db_error", "price insert failed", seconds)
+
+def run_worker(catalog_path=None, batch=1, exit_when_idle=False, poll=None):
+    """
+    Queue worker: claim (product, retailer) jobs from scrape_jobs and scrape
+    them on one lazily started driver, until the queue is empty
+    (exit_when_idle) or forever, polling every `poll` seconds
+    ($SCRAPE_WORKER_POLL, default 30). Any number of workers can run at
+    once on any number of machines; see job_queue.py.
+    """
+    global run_metrics, health
+    run_metrics = RunMetrics()
+    health = HealthStore()
+    entries = {(e['product'], e['retailer']): e for e in load_catalog(catalog_path)}
+    if poll is None:
+        poll = float(os.getenv("SCRAPE_WORKER_POLL", "30"))
+    worker = worker_id()
+    driver = None
+
+    def get_driver():
+        nonlocal driver
+        if driver is None:
+            driver = build_driver()
+        return driver
+
+    pg_conn = connect_with_retry(os.getenv("DATABASE_URL"))
+    logging.info(f"Worker {worker} started")
+    try:
+        while True:
+            jobs = claim_jobs(pg_conn, worker, batch)
+            if not jobs:
+                if exit_when_idle:
+                    break
+                time.sleep(poll)
+                continue
+            for i, job in enumerate(jobs):
+                # later jobs of a batch waited for the earlier ones; renew their lease
+                if i and not extend_lease(pg_conn, job, worker):
+                    logging.warning(f"Job {job['id']}: lease lost, skipping")
+                    continue
+                try:
+                    run_job(pg_conn, job, entries.get((job['product'], job['retailer'])), worker, get_driver)
+                except psycopg2.Error as e:
+                    # the lease runs out and another worker retries the job
+                    logging.error(f"Job {job['id']}: database error {e}")
+                    pg_conn.rollback()
+    finally:
+        quit_driver(driver)
+        health.save()
+        pg_conn.close()
+        summary = run_metrics.write()
+        logging.info(f"Worker {worker} finished after {summary['run_seconds']:.1f}s")
 
 
 if __name__ == "__main__":
-    run_scraper()
+    import argparse
+    parser = argparse.ArgumentParser(description="Scrape retailer prices")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of concurrent browser workers (default: $SCRAPER_WORKERS or 1)")
+    parser.add_argument("--catalog", default=None,
+                        help="catalog file (default: $CATALOG_PATH or catalog.json)")
+    parser.add_argument("--record", metavar="DIR", default=None,
+                        help="save every rendered page to DIR as a parser fixture")
+    parser.add_argument("--engine", choices=["selenium", "cdp"], default=None,
+                        help="selenium drivers or one headless browser over CDP (default: $SCRAPER_ENGINE or selenium)")
+    parser.add_argument("--tabs", type=int, default=None,
+                        help="concurrent tabs for the cdp engine (default: $SCRAPER_TABS or 5)")
+    parser.add_argument("--worker", action="store_true",
+                        help="claim jobs from the scrape_jobs queue instead of scraping the whole catalog")
+    parser.add_argument("--batch", type=int, default=1,
+                        help="jobs claimed at a time in --worker mode")
+    parser.add_argument("--exit-when-idle", action="store_true",
+                        help="in --worker mode, stop once no job is runnable")
+    args = parser.parse_args()
+    if args.record:
+        RECORD_DIR = args.record
+    if args.worker:
+        run_worker(catalog_path=args.catalog, batch=args.batch, exit_when_idle=args.exit_when_idle)
+    else:
+        run_scraper(workers=args.workers, catalog_path=args.catalog, engine=args.engine, tabs=args.tabs)
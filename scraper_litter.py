@@ -1,310 +0,0 @@
-import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import logging
-import time, random, subprocess, os, re
-from datetime import datetime
-import psycopg2
-from pathlib import Path
-from dotenv import load_dotenv
-from psycopg2 import OperationalError
-from database.connect_db import connect_with_retry
-from send_email import send_price_alert
-
-# Load .env from the script's directory
-dotenv_path = Path(__file__).parent / ".env"
-load_dotenv(dotenv_path)
-email = os.getenv("GMAIL_EMAIL")
-
-# --- Setup logging ---
-logging.basicConfig(
-    filename="price_tracker.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    filemode='a'
-)
-
-def get_chrome_major_version():
-    """Return installed Chrome major version (int) or None if not found."""
-    candidates = [
-        "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
-        "/Applications/Google Chrome Beta.app/Contents/MacOS/Google Chrome Beta",
-        "/Applications/Google Chrome Canary.app/Contents/MacOS/Google Chrome Canary",
-    ]
-    for exe in candidates:
-        if os.path.exists(exe):
-            try:
-                out = subprocess.check_output([exe, "--version"], stderr=subprocess.STDOUT).decode()
-                m = re.search(r'(\d+)\.', out)
-                if m:
-                    return int(m.group(1))
-            except Exception:
-                continue
-
-    # fallback to commands on PATH
-    for cmd in (["google-chrome", "--version"], ["chrome", "--version"], ["chromium", "--version"], ["chromium-browser", "--version"]):
-        try:
-            out = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode()
-            m = re.search(r'(\d+)\.', out)
-            if m:
-                return int(m.group(1))
-        except Exception:
-            continue
-
-    return None
-
-def scrape_chewy(driver):
-    url = 'https://www.chewy.com/dr-elseys-ultra-unscented-clumping/dp/327816'
-    try:
-        driver.get(url)
-        time.sleep(random.uniform(6.0, 10.0))
-        sale_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,"styles_ppuText__KRwon")))
-        if not sale_price:
-            logging.warning(f"No price found on Chewy page:")
-            return None
-
-        price_text = sale_price.text[2:6]
-        # print(price_text)
-        price = float(price_text) * 20.0
-        # print(price)
-        pack_size = "20 lb"
-        # unit_oz = 12.5
-        price_per_oz = float(price_text)
-
-        return {
-            'company': 'Chewy',
-            'price': price,
-            'price_per_oz': round(price_per_oz, 2),
-            'pack_size': pack_size,
-            'url': url
-        }
-    except Exception as e:
-        logging.error(f"Failed to scrape from chewy: {e}")
-        return None
-
-def scrape_amazon(driver):
-    url = 'https://www.amazon.com/Dr-Elseys-Premium-Clumping-Litter/dp/B0009X29WK'
-    try:
-        driver.get(url)
-        time.sleep(random.uniform(6.0, 10.0))
-        whole_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,"a-price-whole")))
-        fraction_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,"a-price-fraction")))
-
-        if not whole_price or not fraction_price:
-            logging.error(f"Failed to scrape from Amazon:")
-
-        price = int(whole_price.text) + (int(fraction_price.text) * .01)
-        pack_size = "40 lb"
-        # unit_oz = 12.5
-        price_per_oz = (price / 40)
-
-        return {
-            'company': 'Amazon',
-            'price': price,
-            'price_per_oz': round(price_per_oz, 2),
-            'pack_size': pack_size,
-            'url': url
-        }
-
-    except Exception as e:
-        logging.error(f"Failed to scrape from amazon: {e}")
-        return None
-
-def scrape_petco(driver):
-    url = 'https://www.petco.com/shop/en/petcostore/product/precious-cat-dr-elseys-ultra-scoopable-multi-cat-cat-litter-20-lbs-2184309'
-    try:
-        driver.get(url)
-        time.sleep(random.uniform(6.0, 10.0))
-        # sale_price = WebDriverWait(driver, 10).until(
-        #     EC.presence_of_element_located((By.CLASS_NAME,"purchase-type-selector-styled__PurchaseTypePrice-sc-663c57fc-1")))
-        sale_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,
-                                            "purchase-type-selector-styled__PurchaseTypePrice-sc-7a1b7620-1")))
-        # discount_elems = driver.find_elements(By.ID, "sale-message-red")
-        # discount = discount_elems[0] if discount_elems else None
-
-        if not sale_price:
-            logging.warning(f"No price found on Petco page:")
-            return None
-        # parse discount if present (look for "XX%")
-        percent_off = None
-        # if discount:
-        #     discount_text = discount.text
-        #     m = re.search(r'(\d+)%', discount_text)
-        #     if m:
-        #         try:
-        #             percent_off = int(m.group(1))
-        #         except ValueError:
-        #             percent_off = None
-
-        # if percent_off is not None:
-        #     logging.info(f"Petco discount: {percent_off}%")
-
-        price_clean = float(sale_price.text.replace('$','').strip())
-        # apply discount if any
-        # if percent_off:
-        #     price_clean = price_clean * (100 - percent_off) / 100.0
-
-        pack_size = "20 lb"
-        # unit_oz = 12.5
-        price_per_oz = (price_clean / 20)
-
-        return {
-            'company': 'Petco',
-            'price': price_clean,
-            'price_per_oz': round(price_per_oz, 2),
-            'pack_size': pack_size,
-            'url': url
-        }
-
-    except Exception as e:
-        logging.error(f"Failed to scrape from Petco: {e}")
-        return None
-
-def scrape_petsmart(driver):
-    url = "https://www.petsmart.com/cat/litter-and-waste-disposal/litter/dr-elseys-precious-cat-ultra-clumping-multi-cat-clay-cat-litter---unscented-low-tracking-13490.html#:~:text=20-,Lb,-40%20Lb"
-    try:
-        
-        driver.get(url)
-        time.sleep(random.uniform(6.0, 10.0))
-        try:
-            size_radio = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input[name='size'][value='20 Lb']")))
-            print(size_radio)
-            driver.execute_script("arguments[0].click();", size_radio)
-            
-            # size_radio.click()
-            time.sleep(3)  # Wait for price to update
-            # price_str = WebDriverWait(driver, 10).until(
-            # EC.presence_of_element_located((By.CLASS_NAME,"optexPrice")))
-            sale_price = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME,"sparky-c-price--sale")))
-            og_price = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CLASS_NAME,"sparky-c-price")))
-            price_str = sale_price.text if sale_price else og_price.text if og_price else None
-
-        except:
-            logging.warning("Could not select 20 Lb size on PetSmart")
-            return None 
-        
-        # sale_price = WebDriverWait(driver, 10).until(
-        #     EC.presence_of_element_located((By.CLASS_NAME,"sparky-c-price--sale")))
-        # og_price = WebDriverWait(driver, 10).until(
-        #     EC.presence_of_element_located((By.CLASS_NAME,"sparky-c-price")))
-        # price_str = sale_price.text if sale_price else og_price.text if og_price else None
-
-        # if not price_str:
-        #     logging.warning(f"No price found on Petsmart page")
-        #     return None
-        
-        price_clean = float(price_str.replace('$', '').strip())
-
-        pack_size = "20 lb"
-        # unit_oz = 12.5
-        price_per_oz = price_clean / 20
-
-        return {
-            'company': 'PetSmart',
-            'price': price_clean,
-            'price_per_oz': round(price_per_oz, 2),
-            'pack_size': pack_size,
-            'url': url
-        }
-
-    except Exception as e:
-        logging.error(f"Failed to scrape from Petsmart: {e}")
-        return None
-
-def insert_price_record(cursor, product_data):
-    """
-    Insert a new price record into the database.
-    product_data should be a dict or object with:
-    product, company, url, price, price_per_oz, pack_size
-    """
-    product = "Dr Elsey's Ultra Unscented Clumping Clay Litter"
-    try:
-        cursor.execute(
-            '''
-            INSERT INTO "prices" (product, company, url, date, price, price_per_oz, pack_size)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ''',
-            (
-                product,
-                product_data['company'],
-                product_data['url'],
-                datetime.now(),
-                product_data['price'],
-                product_data['price_per_oz'],
-                product_data['pack_size'],
-            )
-        )
-        logging.info(f"Inserted {product_data['company']} at {product_data['price']}")
-    except Exception as e:
-        logging.error(f"Failed to insert record for {product_data.get('company')}: {e}")
-
-
-def run_scraper():
-    options = uc.ChromeOptions()
-    options.add_argument("--incognito")
-    options.add_argument(
-    "user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/142.0.0.0 Safari/537.36")
-    # options.add_argument("--headless=new")  # modern headless mode
-
-    driver = None
-    url = os.getenv("DATABASE_URL")
-
-    # detect Chrome major version and pass version_main when available
-    version_main = get_chrome_major_version()
-    try:
-        if version_main:
-            logging.info(f"Detected Chrome major version: {version_main}")
-            driver = uc.Chrome(options=options, version_main=version_main)
-        else:
-            driver = uc.Chrome(options=options)
-    except Exception as e:
-        logging.warning(f"Failed creating Chrome with version_main={version_main}: {e}; retrying without version_main")
-        driver = uc.Chrome(options=options)
-
-    try:
-        pg_conn = connect_with_retry(url)
-        with pg_conn.cursor() as pg_cursor:
-            # for scrape in [scrape_petco, scrape_chewy, scrape_amazon, scrape_petsmart]:
-            # for scrape in [scrape_petco]:
-            # for scrape in [scrape_chewy]:
-            for scrape in [scrape_petsmart]:
-                try:
-                    record = scrape(driver)
-                    if record:
-                        insert_price_record(pg_cursor,record)
-                        pg_conn.commit()
-                        # if float(record['price_per_oz']) <= .20:
-                        #     send_price_alert("Nulo Pet Food", record['price_per_oz'], email, record["url"])
-                        #     logging.info("Email sent!")
-
-                except Exception as e:
-                    pg_conn.rollback()
-                    logging.warning(f"{scrape} failed {e}")
-
-    except psycopg2.OperationalError as e:
-        print(f"Error connecting to PostgreSQL: {e}")
-        raise
-
-    except Exception as e:
-        print(f"Error : {e}")
-
-    finally:
-        if driver:
-            try:
-                driver.quit()
-            except Exception:
-                pass
-
-
-if __name__ == "__main__":
-    run_scraper()
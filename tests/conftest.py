@@ -0,0 +1,85 @@
+"""
+Shared fixtures. Tests that need Postgres use `pg_conn`, `pg_url` or `pg_storage`,
+which run every migration into a scratch schema of $TEST_DATABASE_URL and
+drop it afterwards (`pg_bare_conn` leaves the migrations to the test);
+without that variable they are skipped. Every test
+gets an empty price archive of its own.
+"""
+import contextlib
+import io
+import os
+import uuid
+from urllib.parse import quote
+
+import psycopg2
+import pytest
+
+import archive
+from database.migrate import migrate
+from database.pool import ConnectionPool
+from database.storage import PostgresStorage
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+@pytest.fixture(autouse=True)
+def price_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "_archive", archive.PriceArchive(str(tmp_path / "price_archive")))
+    return archive._archive
+
+@contextlib.contextmanager
+def _scratch_schema(migrated=True):
+    if not TEST_DATABASE_URL:
+        pytest.skip("set TEST_DATABASE_URL to run the Postgres tests")
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = psycopg2.connect(TEST_DATABASE_URL, sslmode=os.getenv("PGSSLMODE", "prefer"))
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA {schema}")
+    try:
+        if migrated:
+            conn = _connect(schema)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    migrate(conn)
+            finally:
+                conn.close()
+        yield schema
+    finally:
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.close()
+
+@pytest.fixture
+def pg_schema():
+    with _scratch_schema() as schema:
+        yield schema
+
+@pytest.fixture
+def pg_bare_conn():
+    """A connection to a scratch schema no migration has run in yet."""
+    with _scratch_schema(migrated=False) as schema:
+        conn = _connect(schema)
+        yield conn
+        conn.close()
+
+def _connect(schema, url=TEST_DATABASE_URL):
+    return psycopg2.connect(url, sslmode=os.getenv("PGSSLMODE", "prefer"),
+                            options=f"-c search_path={schema}")
+
+@pytest.fixture
+def pg_conn(pg_schema):
+    conn = _connect(pg_schema)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def pg_url(pg_schema):
+    """TEST_DATABASE_URL pointed at the scratch schema, for code that connects by URL."""
+    sep = "&" if "?" in TEST_DATABASE_URL else "?"
+    return f"{TEST_DATABASE_URL}{sep}options={quote(f'-c search_path={pg_schema}')}"
+
+@pytest.fixture
+def pg_storage(pg_schema):
+    pool = ConnectionPool(TEST_DATABASE_URL, connect=lambda url: _connect(pg_schema, url))
+    yield PostgresStorage(pool=pool)
+    pool.closeall()
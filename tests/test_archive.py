@@ -0,0 +1,95 @@
+"""Round trips through the columnar price archive."""
+import os
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from archive import COLUMNS, ArchiveError, PriceArchive, archive_prices, merge
+
+def _points(prices, start="2026-01-01T00:00:00"):
+    dates = np.datetime64(start, "s") + np.arange(len(prices)) * np.timedelta64(3600, "s")
+    return {"date": dates, "retailer_id": np.arange(len(prices)) % 3 + 1, "price_per_oz": prices}
+
+def test_archived_prices_read_back_unchanged(tmp_path):
+    archive = PriceArchive(str(tmp_path))
+    # what Postgres DOUBLE PRECISION hands back: per-ounce prices float32 can't hold
+    prices = [0.2872, 0.29, 0.1234567, 1.1000001, 3.49 / 12.5]
+    archive.append({7: _points(prices)}, cutoff=datetime(2026, 2, 1))
+    read = archive.read(7)
+    assert read["price_per_oz"].dtype == np.float64
+    assert read["price_per_oz"].tolist() == prices
+    assert read["date"].tolist() == _points(prices)["date"].tolist()
+
+def test_read_slices_by_date(tmp_path):
+    archive = PriceArchive(str(tmp_path))
+    archive.append({7: _points([0.1, 0.2, 0.3, 0.4])})
+    read = archive.read(7, since=datetime(2026, 1, 1, 1), until=datetime(2026, 1, 1, 3))
+    assert read["price_per_oz"].tolist() == [0.2, 0.3]
+
+def test_float32_generation_is_widened_and_rewritten(tmp_path):
+    archive = PriceArchive(str(tmp_path))
+    archive.append({7: _points([0.25, 0.5])})
+    path = os.path.join(str(tmp_path), "7", "1", "price_per_oz.npy")
+    np.save(path, np.asarray([0.25, 0.5], dtype="float32"))  # as written before float64
+    archive = PriceArchive(str(tmp_path))
+    assert archive.read(7)["price_per_oz"].dtype == np.float64
+    merged = merge(archive.read(7), {"date": [np.datetime64("2026-03-01T00:00:00")], "retailer_id": [1],
+                                     "price_per_oz": [0.2872]})
+    assert {name: col.dtype for name, col in merged.items()} == {k: np.dtype(v) for k, v in COLUMNS.items()}
+    archive.append({7: _points([0.2872], start="2026-03-01T00:00:00")})
+    assert np.load(os.path.join(str(tmp_path), "7", "2", "price_per_oz.npy")).dtype == np.float64
+    assert archive.read(7)["price_per_oz"].tolist() == [0.25, 0.5, 0.2872]
+
+@pytest.fixture
+def old_month(pg_storage, pg_conn):
+    """Four prices moved into the January 2025 partition."""
+    pg_storage.insert_prices([
+        {"product": "Nulo Pate", "company": company, "url": "https://example.com/nulo",
+         "pack_size": "12 x 12.5 oz", "price": 43.09 + i, "price_per_oz": 0.2872 + i / 100}
+        for i, company in enumerate(("Petco", "Chewy", "Amazon", "Walmart"))
+    ], run_key="old")
+    with pg_conn.cursor() as cur:
+        cur.execute("UPDATE prices SET date = TIMESTAMP '2025-01-10' + id * INTERVAL '1 hour'")
+        cur.execute("SELECT ensure_price_partitions(3)")
+    pg_conn.commit()
+    return pg_conn
+
+def _table(conn, name):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT to_regclass(%s) IS NOT NULL,
+                   EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%s))
+        """, (name, name))
+        return cur.fetchone()  # (exists, attached)
+
+def test_partition_is_dropped_after_the_archive_reads_back(old_month, tmp_path):
+    archive = PriceArchive(str(tmp_path))
+    assert archive_prices(old_month, archive, before=date(2025, 3, 1)) == 4
+    assert _table(old_month, "prices_2025_01") == (False, False)
+    assert archive.status()["pending"] == []
+    assert sum(len(PriceArchive(str(tmp_path)).read(p)["date"]) for p in archive.manifest()["products"]) == 4
+
+def test_partition_failing_verification_is_kept_detached(old_month, tmp_path, monkeypatch):
+    archive = PriceArchive(str(tmp_path))
+    read = PriceArchive.read
+    monkeypatch.setattr(PriceArchive, "read", lambda self, *a, **kw: {
+        name: col[:-1] for name, col in read(self, *a, **kw).items()})  # a truncated copy
+    with pytest.raises(ArchiveError):
+        archive_prices(old_month, archive, before=date(2025, 3, 1))
+    assert _table(old_month, "prices_2025_01") == (True, False)
+    assert archive.status()["pending"] == ["prices_2025_01"]
+    with old_month.cursor() as cur:
+        cur.execute("SELECT count(*) FROM prices_2025_01")
+        assert cur.fetchone()[0] == 4
+
+    monkeypatch.setattr(PriceArchive, "read", read)  # the next run only finishes the check
+    assert archive_prices(old_month, archive, before=date(2025, 3, 1)) == 0
+    assert _table(old_month, "prices_2025_01") == (False, False)
+    assert archive.status()["pending"] == []
+
+def test_missing_archive_location_detaches_nothing(old_month, tmp_path):
+    with pytest.raises(ArchiveError):
+        archive_prices(old_month, PriceArchive(str(tmp_path / "unmounted")), before=date(2025, 3, 1))
+    assert _table(old_month, "prices_2025_01") == (True, True)
+    assert not os.path.exists(tmp_path / "unmounted")
@@ -0,0 +1,88 @@
+"""The CDP engine's failure handling and page accounting, with Chrome replaced by fakes."""
+import asyncio
+
+import cdp_engine
+from catalog import load_catalog
+from cdp_engine import CDPError, CDPPage, scrape_catalog, scrape_tab
+from corpus import DEFAULT_FIXTURES_DIR, fixture_paths
+from health import CLOSED
+
+ENTRIES = load_catalog()
+
+class Health:
+    def __init__(self):
+        self.failures, self.successes = [], []
+
+    def gate(self, retailer):
+        return CLOSED
+
+    def record_failure(self, entry, kind, error=None):
+        self.failures.append((entry["retailer"], kind))
+
+    def record_success(self, entry, selector=None):
+        self.successes.append(entry["retailer"])
+
+class FixturePage:
+    """A tab that has already rendered the entry's recorded fixture."""
+
+    def __init__(self, html):
+        self.html = html
+
+    async def goto(self, url, load_profile=None):
+        pass
+
+    async def wait_for_price(self, class_names, timeout=15):
+        pass
+
+    async def content(self):
+        return self.html
+
+    async def transfer_bytes(self):
+        return 2048
+
+    async def close(self):
+        pass
+
+class FixtureBrowser:
+    def __init__(self, html):
+        self.html = html
+
+    async def new_page(self):
+        return FixturePage(self.html)
+
+def test_chrome_failure_keeps_http_results(monkeypatch):
+    async def no_chrome(self, timeout=15):
+        raise RuntimeError("Chrome not found")
+
+    monkeypatch.setattr(cdp_engine.CDPBrowser, "start", no_chrome)
+    health = Health()
+    served = ENTRIES[0]
+    results = scrape_catalog(ENTRIES[:3], http_first=lambda e: {"price": 1.0} if e is served else None,
+                             health=health)
+    assert results == [(served, {"price": 1.0}), (ENTRIES[1], None), (ENTRIES[2], None)]
+    assert health.failures == [(ENTRIES[1]["retailer"], "error"), (ENTRIES[2]["retailer"], "error")]
+
+def test_tab_records_page_stats_and_fixture():
+    entry = next(e for e in ENTRIES if e["retailer"] == "Chewy")
+    html = fixture_paths(DEFAULT_FIXTURES_DIR, entry)[0][1].read_text()
+    stats, fixtures, health = [], [], Health()
+    record = asyncio.run(scrape_tab(FixtureBrowser(html), entry, asyncio.Semaphore(1), health=health,
+                                    page_stats=stats, record_fixture=lambda *page: fixtures.append(page)))
+    assert record["company"] == "Chewy"
+    assert health.successes == ["Chewy"]
+    assert [(s["retailer"], s["ok"], s["bytes"]) for s in stats] == [("Chewy", True, 2048)]
+    assert fixtures == [(entry, html, record)]
+
+def test_network_idle_survives_empty_and_failed_evaluations(monkeypatch):
+    results = iter([None, CDPError("context destroyed"), ["loading", 3], ["complete", 3], ["complete", 3]])
+
+    async def evaluate(self, expression):
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(CDPPage, "evaluate", evaluate)
+    page = CDPPage(browser=None, target_id="t", session_id="s")
+    asyncio.run(page.wait_for_network_idle(quiet=0, poll=0))
+
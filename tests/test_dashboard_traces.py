@@ -0,0 +1,68 @@
+"""Which price data the dashboard chart is drawn from, by zoom level."""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import plot
+from database.storage import SQLITE_BACKFILL_DAILY, SQLiteStorage
+
+PRODUCT = "Nulo Turkey and Chicken Pate Canned Cat Food"
+FIRST_DAY = datetime(2023, 1, 1)
+DAYS = 3 * 365
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / "prices.db"))
+    conn = storage._conn()
+    with conn:
+        conn.execute("INSERT INTO products (name) VALUES (?)", (PRODUCT,))
+        conn.execute("INSERT INTO retailers (name) VALUES ('Petco'), ('Chewy')")
+        rows = []
+        for i in range(DAYS):
+            day = FIRST_DAY + timedelta(days=i)
+            for retailer_id in (1, 2):
+                # a morning scrape at the day's low and an evening one at its high
+                low = 0.25 + (i % 50) / 1000 + retailer_id / 100
+                rows.append((1, retailer_id, (day + timedelta(hours=8)).isoformat(sep=" "), 40, low))
+                rows.append((1, retailer_id, (day + timedelta(hours=20)).isoformat(sep=" "), 40, low + 0.02))
+        rows[1000] = rows[1000][:4] + (0.11,)  # one deal, at 08:00 on day 250
+        conn.executemany("INSERT INTO prices (product_id, retailer_id, date, price, price_per_oz)"
+                         " VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute(SQLITE_BACKFILL_DAILY)
+    monkeypatch.setattr(plot, "storage", storage)
+    yield storage
+    storage.close()
+
+def _refuse(*args, **kwargs):
+    raise AssertionError("read the wrong table")
+
+def test_wide_range_is_drawn_from_the_daily_rollup(storage, monkeypatch):
+    monkeypatch.setattr(storage, "price_points", _refuse)
+    traces = json.loads(plot._traces(PRODUCT, None, None, 800))
+    assert [t["name"] for t in traces] == ["Chewy", "Petco"]
+    for trace in traces:
+        assert all(x.endswith("T00:00:00") for x in trace["x"])
+        assert len(trace["x"]) <= 4 * 400
+    petco = traces[1]
+    assert min(petco["y"]) == 0.11
+    assert max(petco["y"]) == pytest.approx(0.25 + 49 / 1000 + 0.01 + 0.02)
+
+def test_zoomed_in_range_reads_raw_points(storage, monkeypatch):
+    monkeypatch.setattr(storage, "price_history", _refuse)
+    start = FIRST_DAY + timedelta(days=240)
+    traces = json.loads(plot._traces(PRODUCT, start, start + timedelta(days=30), 800))
+    petco = traces[1]
+    assert len(petco["x"]) == 60
+    assert petco["x"][0] == "2023-08-29T08:00:00"
+    assert 0.11 in petco["y"]
+
+def test_unbounded_short_history_reads_raw_points(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / "short.db"))
+    monkeypatch.setattr(plot, "storage", storage)
+    storage.insert_prices([{"product": PRODUCT, "company": "Petco", "url": "u", "pack_size": "12",
+                            "price": 43.09, "price_per_oz": 0.29}], run_key="run-1")
+    [trace] = json.loads(plot._traces(PRODUCT, None, None, 800))
+    assert len(trace["x"]) == 1 and trace["y"] == [0.29]
+    assert plot._traces("No such product", None, None, 800) == "[]"
+    storage.close()
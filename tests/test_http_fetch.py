@@ -0,0 +1,45 @@
+"""The HTTP tier's structured price, read from recorded fixtures with embedded state added."""
+import json
+
+from catalog import load_catalog
+from corpus import DEFAULT_FIXTURES_DIR, fixture_paths
+from http_fetch import extract_structured_price
+
+ENTRIES = load_catalog()
+
+def _entry(retailer):
+    return next(e for e in ENTRIES if e["retailer"] == retailer and e["product"].startswith("Nulo"))
+
+def _with_state(entry, state):
+    html = fixture_paths(DEFAULT_FIXTURES_DIR, entry)[0][1].read_text()
+    script = f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(state)}</script>'
+    return html.replace("</body>", script + "</body>")
+
+def _state(entry, price):
+    """Next.js state listing a cheaper related product and a bundle ahead of the entry's own."""
+    return {"props": {"pageProps": {
+        "recommendations": [{"name": "Nulo Salmon Pate", "url": "https://example.com/nulo-salmon/dp/1",
+                             "price": 9.99}],
+        "bundle": {"price": {"value": 79.98}, "shipping": {"finalPrice": 4.95}},
+        "product": {"name": entry["product"], "url": entry["url"], "pricing": {"salePrice": price}},
+    }}}
+
+def test_state_price_comes_from_the_entry_product_node():
+    entry = _entry("Chewy")  # the selector reads 38.88 from this page
+    assert extract_structured_price(_with_state(entry, _state(entry, 38.88)), entry) == (38.88, "state")
+
+def test_state_without_the_entry_product_has_no_price():
+    entry = _entry("Chewy")
+    state = _state(entry, 38.88)
+    state["props"]["pageProps"]["product"]["url"] = "https://www.chewy.com/some-other-food/dp/999"
+    assert extract_structured_price(_with_state(entry, state), entry) == (None, None)
+
+def test_state_disagreeing_with_the_selector_goes_to_the_browser():
+    entry = _entry("Chewy")
+    assert extract_structured_price(_with_state(entry, _state(entry, 42.99)), entry) == (None, None)
+
+def test_petco_sale_message_goes_to_the_browser():
+    entry = _entry("Petco")  # the page carries a 10% sale message
+    assert entry.get("discount_id")
+    # even agreeing with the discounted selector price, the state can't say the sale applies
+    assert extract_structured_price(_with_state(entry, _state(entry, 43.09)), entry) == (None, None)
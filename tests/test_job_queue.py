@@ -0,0 +1,88 @@
+"""Claims, leases and retries of the scrape job queue, against a local Postgres."""
+from datetime import date
+
+import pytest
+
+import job_queue
+from job_queue import claim_jobs, complete_job, enqueue_catalog, extend_lease, fail_job, queue_status
+from scraper import save_record
+
+ENTRIES = [{"product": "Nulo Pate", "retailer": "Petco", "url": "https://example.com/nulo"},
+           {"product": "Nulo Pate", "retailer": "Chewy"}]
+
+RECORD = {"product": "Nulo Pate", "company": "Petco", "url": "https://example.com/nulo",
+          "price": 43.09, "price_per_oz": 0.29, "pack_size": "12 x 12.5 oz"}
+
+def _expire_lease(conn, job):
+    with conn.cursor() as cursor:
+        cursor.execute("UPDATE scrape_jobs SET lease_expires_at = now() - interval '1 second' WHERE id = %s",
+                       (job["id"],))
+    conn.commit()
+
+def _count(conn, sql):
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return cursor.fetchone()[0]
+
+def test_enqueue_is_idempotent(pg_conn):
+    assert enqueue_catalog(pg_conn, ENTRIES) == 2
+    assert enqueue_catalog(pg_conn, ENTRIES) == 0
+    assert queue_status(pg_conn) == {"queued": 2}
+
+def test_workers_claim_distinct_jobs(pg_conn):
+    enqueue_catalog(pg_conn, ENTRIES)
+    [a] = claim_jobs(pg_conn, "worker-a")
+    [b] = claim_jobs(pg_conn, "worker-b")
+    assert a["id"] != b["id"]
+    assert claim_jobs(pg_conn, "worker-c") == []
+    assert queue_status(pg_conn) == {"running": 2}
+
+def test_expired_lease_is_reclaimed_then_failed(pg_conn):
+    enqueue_catalog(pg_conn, ENTRIES[:1], max_attempts=2)
+    [job] = claim_jobs(pg_conn, "worker-a")
+    assert claim_jobs(pg_conn, "worker-b") == []  # still leased
+    _expire_lease(pg_conn, job)
+    [again] = claim_jobs(pg_conn, "worker-b")
+    assert again["id"] == job["id"] and again["attempts"] == 2
+    assert not extend_lease(pg_conn, job, "worker-a")  # worker-a lost it
+    _expire_lease(pg_conn, again)
+    assert claim_jobs(pg_conn, "worker-c") == []
+    assert queue_status(pg_conn) == {"failed": 1}
+
+def test_failed_attempt_is_retried_until_out_of_attempts(pg_conn, monkeypatch):
+    monkeypatch.setattr(job_queue, "RETRY_DELAY", 0)
+    enqueue_catalog(pg_conn, ENTRIES[:1], max_attempts=2)
+    [job] = claim_jobs(pg_conn, "worker-a")
+    assert fail_job(pg_conn, job, "worker-a", "timeout", "no price") == "queued"
+    [job] = claim_jobs(pg_conn, "worker-a")
+    assert job["attempts"] == 2
+    assert fail_job(pg_conn, job, "worker-a", "timeout", "no price") == "failed"
+    assert claim_jobs(pg_conn, "worker-a") == []
+    assert _count(pg_conn, "SELECT count(*) FROM scrape_results WHERE NOT ok") == 2
+
+def test_retried_job_does_not_insert_its_price_twice(pg_conn):
+    enqueue_catalog(pg_conn, ENTRIES[:1])
+    [job] = claim_jobs(pg_conn, "worker-a")
+    key = f"job-{job['id']}:{RECORD['product']}:{RECORD['company']}"
+    with pg_conn.cursor() as cursor:
+        assert save_record(pg_conn, cursor, ENTRIES[0], RECORD, key)
+    # worker-a's lease ran out before it could settle the job
+    _expire_lease(pg_conn, job)
+    [again] = claim_jobs(pg_conn, "worker-b")
+    with pg_conn.cursor() as cursor:
+        assert save_record(pg_conn, cursor, ENTRIES[0], RECORD, key,
+                           lambda c: complete_job(c, again, "worker-b", RECORD))
+    assert _count(pg_conn, "SELECT count(*) FROM prices") == 1
+    assert _count(pg_conn, "SELECT sum(sample_count) FROM price_daily") == 1
+    assert queue_status(pg_conn) == {"done": 1}
+
+def test_failed_insert_rolls_back_the_job(pg_conn):
+    enqueue_catalog(pg_conn, ENTRIES[:1])
+    [job] = claim_jobs(pg_conn, "worker-a")
+    bad = dict(RECORD, price="not a price")
+    with pg_conn.cursor() as cursor:
+        assert not save_record(pg_conn, cursor, ENTRIES[0], bad, f"job-{job['id']}:x",
+                               lambda c: complete_job(c, job, "worker-a", bad))
+    assert _count(pg_conn, "SELECT count(*) FROM prices") == 0
+    assert _count(pg_conn, "SELECT count(*) FROM price_ingest_keys") == 0
+    assert queue_status(pg_conn) == {"running": 1}
@@ -0,0 +1,26 @@
+"""Migrations applied one at a time over data, as on a database that predates them."""
+import contextlib
+import io
+from datetime import datetime
+
+from database.migrate import migrate
+
+def _migrate(conn, target):
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate(conn, target=target)
+
+def test_dimensions_migration_keeps_rows_outside_the_partition_window(pg_bare_conn):
+    _migrate(pg_bare_conn, 4)
+    dates = [datetime(2024, 11, 5), datetime.now(), datetime(datetime.now().year + 2, 6, 1)]
+    with pg_bare_conn.cursor() as cur:
+        cur.executemany("""
+            INSERT INTO prices (product, company, url, date, price, price_per_oz, pack_size)
+            VALUES ('Nulo Pate', 'Chewy', 'https://example.com/nulo', %s, 38.88, 0.26, '12 x 12.5 oz')
+        """, [(d,) for d in dates])
+    pg_bare_conn.commit()
+    _migrate(pg_bare_conn, 5)
+    with pg_bare_conn.cursor() as cur:
+        cur.execute("SELECT date FROM prices ORDER BY date")
+        assert [d for (d,) in cur.fetchall()] == dates
+        cur.execute("SELECT count(*) FROM prices_default")
+        assert cur.fetchone()[0] == 0
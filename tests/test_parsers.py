@@ -0,0 +1,49 @@
+"""Offline parser checks against the recorded fixtures in fixtures/."""
+import pytest
+
+from catalog import load_catalog
+from corpus import DEFAULT_FIXTURES_DIR, fixture_key, fixture_paths, load_fixtures
+from parsers import SelectorNotFound, parse_page
+
+ENTRIES = load_catalog()
+FIXTURES = list(load_fixtures(ENTRIES))
+
+def _petco_nulo():
+    return next(e for e in ENTRIES if e["retailer"] == "Petco" and e["product"].startswith("Nulo"))
+
+def test_every_catalog_entry_has_a_fixture():
+    missing = [fixture_key(e) for e in ENTRIES if not fixture_paths(DEFAULT_FIXTURES_DIR, e)]
+    assert not missing
+
+@pytest.mark.parametrize("entry,html,expected", FIXTURES,
+                         ids=[f"{e['retailer']}-{e['product'][:12]}-{i}" for i, (e, _, _) in enumerate(FIXTURES)])
+def test_fixture_parses_to_recorded_price(entry, html, expected):
+    record = parse_page(html, entry)
+    assert expected is not None
+    assert record["product"] == entry["product"]
+    assert record["company"] == entry["retailer"]
+    assert record["price"] == pytest.approx(expected["price"], abs=0.005)
+    assert record["price_per_oz"] == pytest.approx(expected["price_per_oz"], abs=0.005)
+
+def test_petco_parses_current_and_old_markup():
+    entry = _petco_nulo()
+    pages = dict(fixture_paths(DEFAULT_FIXTURES_DIR, entry))
+    key = fixture_key(entry)
+    current = parse_page(pages[key].read_text(), entry)
+    old = parse_page(pages[f"{key}--old-markup"].read_text(), entry)
+    assert current["selector"].endswith("sc-7a1b7620-1")
+    assert old["selector"].endswith("sc-663c57fc-1")
+    # the current page carries a 10% sale message, the old one doesn't
+    assert current["price"] == pytest.approx(old["price"] * 0.9, abs=0.01)
+
+def test_renamed_petco_price_class_is_a_selector_failure():
+    entry = _petco_nulo()
+    html = fixture_paths(DEFAULT_FIXTURES_DIR, entry)[0][1].read_text()
+    renamed = html.replace("PurchaseTypePrice-sc-7a1b7620-1", "PurchaseTypePrice-sc-0000000-1")
+    with pytest.raises(SelectorNotFound):
+        parse_page(renamed, entry)
+
+def test_petsmart_falls_back_to_the_regular_price():
+    entry = next(e for e in ENTRIES if e["retailer"] == "PetSmart" and e["product"].startswith("Dr"))
+    html = fixture_paths(DEFAULT_FIXTURES_DIR, entry)[0][1].read_text()
+    assert parse_page(html, entry)["selector"] == "sparky-c-price"
@@ -0,0 +1,121 @@
+"""Keyset paging of /api/prices range reads across the archive and the live table."""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import price_api
+from database.storage import SQLiteStorage
+
+T0 = datetime(2026, 1, 1)
+PRODUCTS = ("Nulo Pate", "Dr Elsey's Litter")
+
+def _rows():
+    """(product_id, retailer_id, date, price_per_oz): a run every 6 hours, all retailers in one second."""
+    rows = []
+    for i in range(120):
+        when = T0 + timedelta(hours=6 * i, microseconds=1000 * i)
+        for product_id in (1, 2):
+            for retailer_id in (3, 1, 2):  # not in id order
+                rows.append((product_id, retailer_id, when, round(0.2 + product_id / 10 + retailer_id / 100 + i / 1e4, 6)))
+    return rows
+
+ROWS = _rows()
+CUTOFF = T0 + timedelta(days=10)  # the first 10 days are archived
+
+def _fill(storage, execute, price_archive):
+    execute("INSERT INTO products (name) VALUES (%s), (%s)", PRODUCTS)
+    execute("INSERT INTO retailers (name) VALUES ('Chewy'), ('Petco'), ('Amazon')", ())
+    batches = {}
+    for product_id, retailer_id, when, ppo in ROWS:
+        if when < CUTOFF:
+            cols = batches.setdefault(product_id, ([], [], []))
+            cols[0].append(np.datetime64(when, "s"))
+            cols[1].append(retailer_id)
+            cols[2].append(ppo)
+        else:
+            execute("INSERT INTO prices (product_id, retailer_id, date, price, price_per_oz)"
+                    " VALUES (%s, %s, %s, 40, %s)", (product_id, retailer_id, when, ppo))
+    price_archive.append({p: {"date": np.array(d, dtype="datetime64[s]"), "retailer_id": r, "price_per_oz": v}
+                          for p, (d, r, v) in batches.items()}, cutoff=CUTOFF)
+
+def _expected(retailer_ids=None, start=None, end=None):
+    rows = [(p, int(np.datetime64(w, "s").astype("int64")), r, v) for p, r, w, v in ROWS
+            if (retailer_ids is None or r in retailer_ids)
+            and (start is None or w >= start) and (end is None or w < end)]
+    return sorted(rows)
+
+def _all_pages(storage, limit, retailer_ids=None, start=None, end=None):
+    got, after, pages = [], None, 0
+    while True:
+        columns, after = price_api.range_page(storage, [1, 2], retailer_ids, start, end, after, limit)
+        assert len(columns["date"]) <= limit
+        got += zip(columns["product_id"].tolist(), columns["date"].tolist(),
+                   columns["retailer_id"].tolist(), columns["price_per_oz"].tolist())
+        pages += 1
+        if after is None:
+            return got, pages
+
+@pytest.fixture
+def sqlite_storage(tmp_path, price_archive):
+    storage = SQLiteStorage(str(tmp_path / "prices.db"))
+    conn = storage._conn()
+
+    def execute(sql, params):
+        params = tuple(p.isoformat(sep=" ") if isinstance(p, datetime) else p for p in params)
+        with conn:
+            conn.execute(sql.replace("%s", "?"), params)
+
+    _fill(storage, execute, price_archive)
+    yield storage
+    storage.close()
+
+@pytest.mark.parametrize("limit", [1, 2, 7, 100, 5000])
+@pytest.mark.parametrize("filters", [
+    {},
+    {"retailer_ids": {2}},
+    {"start": T0 + timedelta(days=5), "end": T0 + timedelta(days=20, hours=3)},
+])
+def test_pages_cover_the_range_exactly_once(sqlite_storage, limit, filters):
+    got, pages = _all_pages(sqlite_storage, limit, **filters)
+    expected = _expected(**filters)
+    assert [g[:3] for g in got] == [e[:3] for e in expected]
+    assert [g[3] for g in got] == pytest.approx([e[3] for e in expected])
+    assert pages == max(1, -(-len(expected) // limit))
+
+def test_a_page_reads_only_what_it_returns(sqlite_storage, price_archive, monkeypatch):
+    read = []
+    live_page, read_page = sqlite_storage.live_page, price_archive.read_page
+
+    def counted(source, fn):
+        def wrapper(*args, **kwargs):
+            result = fn(*args, **kwargs)
+            read.append((source, len(result["date"])))
+            return result
+        return wrapper
+
+    monkeypatch.setattr(sqlite_storage, "live_page", counted("live", live_page))
+    monkeypatch.setattr(price_archive, "read_page", counted("archive", read_page))
+    _, after = price_api.range_page(sqlite_storage, [1, 2], limit=10)
+    for _ in range(20):
+        read.clear()
+        _, after = price_api.range_page(sqlite_storage, [1, 2], after=after, limit=10)
+        assert all(n <= 11 for _, n in read)
+
+def test_postgres_pages_match_sqlite(sqlite_storage, pg_storage, price_archive):
+    def execute(sql, params):
+        with pg_storage.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+            conn.commit()
+
+    # both read the same archive; only the live rows differ by backend
+    execute("INSERT INTO products (name) VALUES (%s), (%s)", PRODUCTS)
+    execute("INSERT INTO retailers (name) VALUES ('Chewy'), ('Petco'), ('Amazon')", ())
+    for product_id, retailer_id, when, ppo in ROWS:
+        if when >= CUTOFF:
+            execute("INSERT INTO prices (product_id, retailer_id, date, price, price_per_oz)"
+                    " VALUES (%s, %s, %s, 40, %s)", (product_id, retailer_id, when, ppo))
+    for limit in (7, 100):
+        assert _all_pages(pg_storage, limit) == _all_pages(sqlite_storage, limit)
+        assert _all_pages(pg_storage, limit, retailer_ids={1, 3}) == _all_pages(sqlite_storage, limit, retailer_ids={1, 3})
@@ -0,0 +1,34 @@
+"""Tier escalation in scrape_group, with the network stubbed at the tier boundaries."""
+import scraper
+from catalog import load_catalog
+from health import CLOSED
+from http_fetch import http_eligible
+
+ENTRY = next(e for e in load_catalog() if http_eligible(e))
+
+def test_browser_fallback_pays_the_rate_limit_once(monkeypatch):
+    acquired = []
+    monkeypatch.setattr(scraper, "HTTP_TIER", True)
+    monkeypatch.setattr(scraper.rate_limiter, "acquire", lambda url: acquired.append(url) or 0)
+    monkeypatch.setattr(scraper.health, "gate", lambda retailer: CLOSED)
+    monkeypatch.setattr(scraper, "fetch_price_http", lambda entry: None)  # no structured price
+    monkeypatch.setattr(scraper.health, "record_success", lambda entry, selector=None: None)
+    monkeypatch.setattr(scraper, "apply_load_profile", lambda driver, profile: None)
+    monkeypatch.setattr(scraper, "drain_transfer_bytes", lambda driver: None)
+    loaded = []
+
+    def scrape(driver, entry):
+        scraper.open_page(driver, entry)
+        return {"price": 1.0}
+
+    class Driver:
+        page_source = "<html></html>"
+
+        def get(self, url):
+            loaded.append(url)
+
+    monkeypatch.setitem(scraper.RETAILER_SCRAPERS, ENTRY["retailer"], scrape)
+    monkeypatch.setattr(scraper, "page_stats", [])
+    assert scraper.scrape_group([ENTRY], Driver) == [(ENTRY, {"price": 1.0})]
+    assert loaded == [ENTRY["url"]]
+    assert acquired == [ENTRY["url"]]
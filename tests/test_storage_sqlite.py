@@ -0,0 +1,192 @@
+"""The Storage interface on the SQLite backend, and its parity with Postgres."""
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from database.storage import SQLiteStorage, Storage
+
+NULO = "Nulo Turkey and Chicken Pate Canned Cat Food"
+ELSEY = "Dr Elsey's Ultra Unscented Clumping Clay Litter"
+
+META = {
+    NULO: {"expense_pattern": "%nulo%", "item_type": "food", "pack_count": 12, "unit_size": 12.5},
+    ELSEY: {"expense_pattern": "%elsey%", "item_type": "litter", "pack_count": 1, "unit_size": 20},
+}
+
+def _record(product, company, price_per_oz, price=None):
+    return {"product": product, "company": company, "url": f"https://example.com/{company}",
+            "pack_size": "12 x 12.5 oz", "price": price or round(price_per_oz * 150, 2),
+            "price_per_oz": price_per_oz}
+
+RUN = [_record(NULO, "Petco", 0.29), _record(NULO, "Chewy", 0.26), _record(ELSEY, "Chewy", 0.95)]
+
+def _expense(item_name, company, after_cashback, day, item_type="food", qty=1):
+    return {"item_name": item_name, "brand": item_name.split()[0], "company": company,
+            "item_type": item_type, "qty": qty, "total_before_tax": after_cashback,
+            "cashback_pct": 0, "total_after_cashback": after_cashback, "date_purchased": day}
+
+EXPENSES = [_expense("Nulo Pate 12pk", "Chewy", 38.88, date(2026, 9, d), qty=1 + d % 2) for d in range(1, 8)] + [
+    _expense("Dr Elsey's Litter", "Petco", 22.99, date(2026, 9, 3), item_type="litter"),
+    _expense("Cat tree", "Amazon", 80.00, date(2026, 9, 4), item_type="toys"),
+]
+
+@pytest.fixture
+def sqlite_storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "prices.db"))
+    yield storage
+    storage.close()
+
+def _tables(path):
+    with sqlite3.connect(path) as conn:
+        return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+def test_schema_is_created_once(tmp_path):
+    path = str(tmp_path / "prices.db")
+    SQLiteStorage(path).close()
+    assert {"products", "retailers", "listings", "prices", "price_daily", "price_ingest_keys",
+            "data_versions", "expenses", "product_savings", "savings_ledger"} <= _tables(path)
+    storage = SQLiteStorage(path)  # reopening an existing file changes nothing
+    assert storage.products() == [] and storage.data_version()[0] == 0
+
+def test_retired_index_is_dropped_on_open(tmp_path):
+    path = str(tmp_path / "prices.db")
+    SQLiteStorage(path).close()
+    with sqlite3.connect(path) as conn:  # as an earlier version left it
+        conn.execute("CREATE INDEX expenses_sort_idx ON expenses (COALESCE(date_purchased, created_at))")
+    SQLiteStorage(path).close()
+    with sqlite3.connect(path) as conn:
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'expenses_sort_idx'").fetchone()
+
+def test_backend_missing_a_method_cannot_be_created():
+    class Partial(Storage):
+        def products(self):
+            return []
+
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_insert_prices_is_idempotent_per_run_key(sqlite_storage):
+    assert len(sqlite_storage.insert_prices(RUN, run_key="run-1")) == 3
+    version = sqlite_storage.data_version()[0]
+    assert sqlite_storage.insert_prices(RUN, run_key="run-1") == []
+    assert sqlite_storage.data_version()[0] == version
+    assert len(sqlite_storage.insert_prices(RUN[:1], run_key="run-2")) == 1
+    assert sqlite_storage.products() == sorted([NULO, ELSEY])
+    assert len(sqlite_storage.price_points(NULO)["date"]) == 3
+
+def test_price_points_agree_with_price_history(sqlite_storage):
+    sqlite_storage.insert_prices(RUN, run_key="run-1")
+    sqlite_storage.insert_prices([_record(NULO, "Petco", 0.31)], run_key="run-2")
+    points = sqlite_storage.price_points(NULO)
+    assert points["date"].dtype == np.dtype("datetime64[s]")
+    assert list(np.diff(points["date"]) >= np.timedelta64(0)) == [True] * (len(points["date"]) - 1)
+    span = {}
+    for retailer_id, ppo in zip(points["retailer_id"], points["price_per_oz"]):
+        low, high = span.get(int(retailer_id), (ppo, ppo))
+        span[int(retailer_id)] = (min(low, ppo), max(high, ppo))
+    history = sqlite_storage.price_history(NULO)
+    assert history["day"].tolist() == [np.datetime64(date.today(), "s").item()] * 2
+    assert {int(r): (lo, hi) for r, lo, hi in zip(history["retailer_id"], history["min_price_per_oz"],
+                                                   history["max_price_per_oz"])} == pytest.approx(span)
+    tomorrow = datetime.now() + timedelta(days=1)
+    assert len(sqlite_storage.price_points(NULO, since=tomorrow)["date"]) == 0
+    assert len(sqlite_storage.price_history(NULO, since=tomorrow)["day"]) == 0
+    # a range ending part-way through today still covers today's rollup
+    assert len(sqlite_storage.price_history(NULO, until=datetime.now())["day"]) == 2
+    assert len(sqlite_storage.price_history(NULO, until=datetime.combine(date.today(), datetime.min.time()))["day"]) == 0
+
+def test_legacy_file_is_upgraded_in_place(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+            CREATE TABLE prices (id INTEGER PRIMARY KEY, product TEXT, company TEXT, url TEXT,
+                                 date DATETIME, price FLOAT, price_per_oz FLOAT, pack_size TEXT)
+        """)
+        conn.executemany("INSERT INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+            (1, NULO, "Petco", "u", "2026-09-01 08:00:00", 45.0, 0.30, "12 x 12.5 oz"),
+            (2, NULO, "Petco", "u", "2026-09-01 20:00:00", 43.5, 0.29, "12 x 12.5 oz"),
+            (3, NULO, "Chewy", "u", "2026-09-02 08:00:00", 39.0, 0.26, "12 x 12.5 oz"),
+        ])
+    storage = SQLiteStorage(path)
+    assert storage.products() == [NULO]
+    assert len(storage.price_points(NULO)["date"]) == 3
+    history = storage.price_history(NULO)
+    names = storage.retailers()
+    assert [(str(d)[:10], names[int(r)], lo, hi) for d, r, lo, hi in zip(*history.values())] == [
+        ("2026-09-01", "Petco", 0.29, 0.30), ("2026-09-02", "Chewy", 0.26, 0.26)]
+    [ledger] = storage.savings_ledger()
+    assert ledger["market_count"] == 3 and ledger["market_sum"] == pytest.approx(0.85)
+    assert storage.latest_price_id() == 3
+    storage.close()
+
+def test_expenses_page_newest_first(sqlite_storage):
+    ids = [sqlite_storage.create_expense(e) for e in EXPENSES]
+    seen, after = [], None
+    while True:
+        page = sqlite_storage.list_expenses(after=after, limit=4)
+        seen += [r["id"] for r in page["expenses"]]
+        assert page["totals"]["count"] == len(page["expenses"])
+        if page["next"] is None:
+            break
+        after = page["next"]
+    assert sorted(seen) == sorted(ids) and len(seen) == len(set(seen))
+    dates = [sqlite_storage.get_expense(i)["date_purchased"] for i in seen]
+    assert dates == sorted(dates, reverse=True)
+    food = sqlite_storage.list_expenses(item_type="food", start=date(2026, 9, 3), end=date(2026, 9, 5))
+    assert [r["date_purchased"] for r in food["expenses"]] == [date(2026, 9, d) for d in (5, 4, 3)]
+
+def test_expense_companies_are_the_ones_entered(sqlite_storage):
+    sqlite_storage.insert_prices(RUN, run_key="run-1")  # Petco and Chewy are retailers too
+    for e in EXPENSES:
+        sqlite_storage.create_expense(e)
+    assert sqlite_storage.expense_companies() == ["Amazon", "Chewy", "Petco"]
+
+def test_savings_ledger_follows_expense_edits(sqlite_storage):
+    sqlite_storage.insert_prices(RUN, run_key="run-1")
+    assert sqlite_storage.sync_savings_meta(META)
+    assert not sqlite_storage.sync_savings_meta(META)
+    nulo_id = sqlite_storage.create_expense(EXPENSES[0])
+    sqlite_storage.create_expense(EXPENSES[-1])  # matches no product
+    ledger = {r["product"]: r for r in sqlite_storage.savings_ledger()}
+    assert ledger[NULO]["purchase_count"] == 1 and ledger[NULO]["packs_bought"] == 2
+    assert ledger[NULO]["oz_bought"] == pytest.approx(2 * 12 * 12.5)
+    assert ledger[NULO]["market_count"] == 2
+    sqlite_storage.update_expense(nulo_id, dict(EXPENSES[0], qty=3))
+    sqlite_storage.create_expense(EXPENSES[-2])
+    incremental = sqlite_storage.savings_ledger()
+    sqlite_storage.rebuild_savings()
+    assert sqlite_storage.savings_ledger() == incremental
+    sqlite_storage.delete_expense(nulo_id)
+    ledger = {r["product"]: r for r in sqlite_storage.savings_ledger()}
+    assert ledger[NULO]["purchase_count"] == 0 and ledger[ELSEY]["spent"] == pytest.approx(22.99)
+
+def _fill(storage):
+    storage.sync_savings_meta(META)
+    storage.insert_prices(RUN, run_key="run-1")
+    storage.insert_prices([_record(NULO, "Petco", 0.31)], run_key="run-2")
+    for expense in EXPENSES:
+        storage.create_expense(expense)
+
+def _snapshot(storage):
+    names = storage.retailers()
+    points = storage.price_points(NULO)
+    page = storage.list_expenses(limit=5)
+    return {
+        "products": storage.products(),
+        # rows of one run share a timestamp, so compare them unordered
+        "points": sorted((names[int(r)], round(float(p), 6)) for r, p in zip(points["retailer_id"], points["price_per_oz"])),
+        "history": sorted((names[int(r)], round(float(lo), 6), round(float(hi), 6))
+                          for _, r, lo, hi in zip(*storage.price_history(NULO).values())),
+        "expenses": [(r["item_name"], r["date_purchased"], r["qty"]) for r in page["expenses"]],
+        "totals": page["totals"],
+        "next": page["next"][0],
+        "ledger": [{k: round(v, 6) if isinstance(v, float) else v for k, v in row.items()}
+                   for row in storage.savings_ledger()],
+    }
+
+def test_sqlite_matches_postgres(sqlite_storage, pg_storage):
+    _fill(sqlite_storage)
+    _fill(pg_storage)
+    assert _snapshot(sqlite_storage) == _snapshot(pg_storage)
@@ -0,0 +1,98 @@
+"""Copying SQLite price history into a Postgres that already has prices."""
+import csv
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import transfer_db
+
+ROWS = 50
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """A SQLite file in the layout transfer_db reads, with ids 1..ROWS."""
+    path = str(tmp_path / "pricetracker.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+            CREATE TABLE prices (id INTEGER PRIMARY KEY, product TEXT, company TEXT, url TEXT,
+                                 date DATETIME, price FLOAT, price_per_oz FLOAT, pack_size TEXT)
+        """)
+        start = datetime(2025, 1, 1)
+        conn.executemany("INSERT INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+            (i, "Nulo Pate", ("Petco", "Chewy")[i % 2], "https://example.com/nulo",
+             (start + timedelta(days=i)).isoformat(sep=" "), 40 + i / 10, round(0.25 + i / 1000, 4), "12 x 12.5 oz")
+            for i in range(1, ROWS + 1)
+        ])
+    return path
+
+@pytest.fixture
+def live(pg_storage):
+    """Three prices already in production, holding ids 1..3."""
+    pg_storage.insert_prices([
+        {"product": "Nulo Pate", "company": company, "url": "https://example.com/live",
+         "pack_size": "12 x 12.5 oz", "price": 43.09, "price_per_oz": 0.29}
+        for company in ("Petco", "Chewy", "Amazon")
+    ], run_key="live")
+    return pg_storage
+
+def _prices(pg_conn):
+    with pg_conn.cursor() as cur:
+        cur.execute("SELECT id, price FROM prices ORDER BY id")
+        rows = cur.fetchall()
+    pg_conn.commit()
+    return rows
+
+def test_copy_into_non_empty_database_gets_fresh_ids(legacy_db, live, pg_url, pg_conn, capsys):
+    before = _prices(pg_conn)
+    assert [i for i, _ in before] == [1, 2, 3]
+    assert transfer_db.run(legacy_db, pg_url)
+    rows = _prices(pg_conn)
+    ids = [i for i, _ in rows]
+    assert len(rows) == 3 + ROWS and len(set(ids)) == len(ids)
+    assert rows[:3] == before  # production rows untouched
+    assert min(ids[3:]) > 3
+    with pg_conn.cursor() as cur:
+        cur.execute("SELECT count(*), min(source_id), max(source_id) FROM transfer_ids")
+        assert cur.fetchone() == (ROWS, 1, ROWS)
+        # new ids follow the source order, so the since cursor sees them in order
+        cur.execute("SELECT new_id FROM transfer_ids ORDER BY source_id")
+        new_ids = [r[0] for r in cur.fetchall()]
+    assert new_ids == sorted(new_ids)
+    assert "verified 50 rows" in capsys.readouterr().out
+
+def test_interrupted_copy_resumes_without_duplicates(legacy_db, live, pg_url, pg_conn, monkeypatch):
+    writer, calls = csv.writer, []
+
+    def failing_writer(buf):
+        calls.append(1)
+        if len(calls) == 3:
+            raise ConnectionError("network dropped")
+        return writer(buf)
+
+    monkeypatch.setattr(transfer_db.csv, "writer", failing_writer)
+    with pytest.raises(ConnectionError):
+        transfer_db.run(legacy_db, pg_url, chunk_size=10)
+    assert len(_prices(pg_conn)) == 3 + 20  # two chunks committed with their checkpoint
+
+    monkeypatch.setattr(transfer_db.csv, "writer", writer)
+    assert transfer_db.run(legacy_db, pg_url, chunk_size=10)
+    assert len(_prices(pg_conn)) == 3 + ROWS
+    assert transfer_db.run(legacy_db, pg_url, chunk_size=10)  # a finished copy is a no-op
+    assert len(_prices(pg_conn)) == 3 + ROWS
+
+def test_verify_reads_only_copied_rows(legacy_db, live, pg_url, pg_conn):
+    transfer = transfer_db.Transfer(legacy_db, pg_url)
+    assert transfer_db.run(legacy_db, pg_url)
+    expected, actual = transfer.verify("prices", 1, ROWS)
+    assert expected == actual and expected[0] == ROWS
+    # a copied row changed in Postgres is caught; the production rows sharing
+    # its source ids never are
+    with pg_conn.cursor() as cur:
+        cur.execute("""
+            UPDATE prices SET price = price + 1
+            WHERE id = (SELECT new_id FROM transfer_ids WHERE source_id = 2)
+        """)
+    pg_conn.commit()
+    expected, actual = transfer.verify("prices", 1, ROWS)
+    assert expected[0] == actual[0] and expected[1] != actual[1]